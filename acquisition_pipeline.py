@@ -0,0 +1,216 @@
+"""
+   Acquisition/processing pipeline for repeated captures.
+
+   A dedicated thread keeps the instrument capturing into buffers taken from a
+   fixed pool; filled buffers go through a bounded queue to processing worker
+   threads and come back to the pool when processed. The capture loop never
+   runs analysis code, so the device is re-armed as soon as a buffer is free.
+
+   When all buffers are in use the overflow policy decides what happens:
+       "block"        capture waits for a free buffer (backpressure)
+       "drop_oldest"  the oldest capture not yet picked up by a worker is
+                      discarded and its buffer reused
+
+       ad3.AI.configure_scope_single(0, 1e6)
+       with scope_pipeline(ad3, analyze, channel=0, on_result=lambda seq, result: results.append(result)) as pipeline:
+           time.sleep(10)
+       print(pipeline.stats())
+"""
+
+import queue
+import threading
+import time
+from ctypes import *
+
+from event_log import eventLog
+
+POLICIES = ("block", "drop_oldest")
+
+
+class AcquisitionPipeline():
+    """
+    acquire(buffer): fills buffer with one capture (runs on the capture thread)
+    process(buffer): analyzes a filled buffer, the return value goes to on_result(seq, result)
+    make_buffer(): allocates one pool buffer, called n_buffers times up front
+
+    process must not keep a reference to the buffer, it is reused once process returns.
+    """
+    def __init__(self, acquire, process, make_buffer, n_buffers=3, policy="block", workers=1,
+                 on_result=None, max_captures=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        if n_buffers < 2:
+            raise ValueError("The pipeline needs at least two buffers")
+
+        self._acquire = acquire
+        self._process = process
+        self._onResult = on_result
+        self._maxCaptures = max_captures
+        self.Policy = policy
+
+        self._free = queue.Queue()
+        for _ in range(n_buffers):
+            self._free.put(make_buffer())
+        # filled buffers, bounded by the pool size
+        self._ready = queue.Queue(maxsize=n_buffers)
+
+        self._workers = workers
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        self.Acquired = 0
+        self.Processed = 0
+        self.Dropped = 0
+        self.Errors = 0
+        self.BackpressureWaits = 0
+        self.BackpressureTime = 0.0
+        self.QueueHighWater = 0
+
+    #region Lifecycle
+    def start(self):
+        if self._threads:
+            return self
+        self._stop.clear()
+
+        self._threads.append(threading.Thread(target=self._capture_loop, name="Acquisition", daemon=True))
+        for i in range(self._workers):
+            self._threads.append(threading.Thread(target=self._process_loop, name=f"Processing-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+        return self
+
+    def stop(self, timeout=None):
+        """Stop capturing, let the workers finish what is queued, then return."""
+        self._stop.set()
+        if not self._threads:
+            return
+        capture, workers = self._threads[0], self._threads[1:]
+        capture.join(timeout)
+        for _ in workers:
+            self._ready.put(None)
+        for thread in workers:
+            thread.join(timeout)
+        self._threads = []
+
+    def wait(self, timeout=None):
+        """Wait for max_captures to be acquired and processed."""
+        if self._threads:
+            self._threads[0].join(timeout)
+        self.stop(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+    #endregion
+
+    #region Threads
+    def _take_buffer(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self.Policy == "drop_oldest":
+            try:
+                seq, buffer = self._ready.get_nowait()
+                with self._lock:
+                    self.Dropped += 1
+                eventLog.debug("Pipeline dropped capture %d", seq)
+                return buffer
+            except queue.Empty:
+                pass  # every buffer is being processed, nothing to drop
+
+        t0 = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                buffer = self._free.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            return None
+
+        with self._lock:
+            self.BackpressureWaits += 1
+            self.BackpressureTime += time.perf_counter() - t0
+        return buffer
+
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            if self._maxCaptures is not None and seq >= self._maxCaptures:
+                break
+
+            buffer = self._take_buffer()
+            if buffer is None:
+                break
+
+            try:
+                self._acquire(buffer)
+            except Exception as e:
+                eventLog.error("Pipeline acquisition failed: %s", e)
+                self._free.put(buffer)
+                with self._lock:
+                    self.Errors += 1
+                break
+
+            self._ready.put((seq, buffer))
+            with self._lock:
+                self.Acquired += 1
+                self.QueueHighWater = max(self.QueueHighWater, self._ready.qsize())
+            seq += 1
+
+    def _process_loop(self):
+        while True:
+            item = self._ready.get()
+            if item is None:
+                break
+
+            seq, buffer = item
+            try:
+                result = self._process(buffer)
+                if self._onResult is not None:
+                    self._onResult(seq, result)
+                with self._lock:
+                    self.Processed += 1
+            except Exception as e:
+                eventLog.error("Pipeline processing of capture %d failed: %s", seq, e)
+                with self._lock:
+                    self.Errors += 1
+            finally:
+                self._free.put(buffer)
+    #endregion
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "acquired": self.Acquired,
+                "processed": self.Processed,
+                "dropped": self.Dropped,
+                "errors": self.Errors,
+                "backpressure_waits": self.BackpressureWaits,
+                "backpressure_time": self.BackpressureTime,
+                "queue_high_water": self.QueueHighWater,
+                "queued": self._ready.qsize(),
+            }
+
+
+def scope_pipeline(ad3, process, channel=0, **kwargs) -> AcquisitionPipeline:
+    """Repeated single-channel scope captures, configure the scope with AI.configure_scope_single first."""
+    ai = ad3.AI
+    n = ai._numSamples
+
+    return AcquisitionPipeline(lambda buffer: ai.scope_capture_1ch_single(channel, buffer), process,
+                               lambda: (c_double*n)(), **kwargs)
+
+
+def record_pipeline(dd, process, sample_rate, n_samples, **kwargs) -> AcquisitionPipeline:
+    """Repeated Digital Discovery record captures."""
+    n = int(n_samples)
+
+    return AcquisitionPipeline(lambda buffer: dd.configureDI_and_DAQ(sample_rate, n, buffer), process,
+                               lambda: (c_uint16*n)(), **kwargs)
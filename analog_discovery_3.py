@@ -1,7 +1,11 @@
 from ctypes import *
-from dwfconstants import *  # Import all constants from dwfconstants
+import dwf_enums as dwfe
 import time
+import threading
 from base_digilent import BaseDigilentDevice
+from event_log import eventLog
+from device_locks import locked
+from buffer_pool import bufferPool
 from collections import namedtuple
 
 ### BLAH BLAH BLAH
@@ -16,6 +20,8 @@ class AnalogDiscovery3(BaseDigilentDevice):
         self.AI = AI(self)
         self.AO = AO(self)
         self.I2C = I2C(self)
+        self.SPI = SPI(self)
+        self.UART = UART(self)
 
         self.logger = None
 
@@ -38,8 +44,26 @@ class AnalogDiscovery3(BaseDigilentDevice):
 class AI():
     def __init__(self, ad3: AnalogDiscovery3):
         self._ad3 = ad3       
-        self._dwf = type(ad3)._dwf       # API Interface ???         
+
+        # status argument reused by every poll of the read loops
+        self._sts = c_ubyte()
+        self._pSts = byref(self._sts)
+
+        # trigger position in seconds from the buffer middle, as last set by configure_trigger
+        self._triggerPosition = 0.0
+
+        # range in volts of each configured channel, as last set by configure_scope_single
+        self._channelRanges = {}
+
+        # capture buffers not passed by the caller are leased from this pool (None allocates them)
+        self.Pool = bufferPool
+
+    # API Interface, resolved on the device class so profiling can be switched on at any time
+    @property
+    def _dwf(self):
+        return type(self._ad3)._dwf
     
+    @locked("AnalogIn")
     def configure_scope_single(self, channel, sampling_frequency, range=25, n_samples=16384):
         """
         Configure the oscilloscope for single shot mode
@@ -56,97 +80,205 @@ class AI():
 
         n_samples: number of samples to capture, 16384 max when using two channels, 32768 max when using one channel
         """
-        self._dwf.FDwfAnalogInFrequencySet(self._ad3._hdwf, c_double(sampling_frequency))
-        self._dwf.FDwfAnalogInBufferSizeSet(self._ad3._hdwf, c_int(n_samples))
-        self._dwf.FDwfAnalogInChannelEnableSet(self._ad3._hdwf, c_int(channel), c_int(True))
-        self._dwf.FDwfAnalogInChannelRangeSet(self._ad3._hdwf, c_int(channel), c_double(range))
-        self._dwf.FDwfAnalogInChannelFilterSet(self._ad3._hdwf, c_int(channel), filterDecimate)
+        self._dwf.FDwfAnalogInFrequencySet(self._ad3._hdwf, sampling_frequency)
+        self._dwf.FDwfAnalogInBufferSizeSet(self._ad3._hdwf, n_samples)
+        self._dwf.FDwfAnalogInChannelEnableSet(self._ad3._hdwf, channel, True)
+        self._dwf.FDwfAnalogInChannelRangeSet(self._ad3._hdwf, channel, range)
+        self._dwf.FDwfAnalogInChannelFilterSet(self._ad3._hdwf, channel, dwfe.filterDecimate)
 
         self._numSamples = n_samples
         self._samplingFrequency = sampling_frequency
+        for ch in ((0, 1) if channel == -1 else (channel,)):
+            self._channelRanges[ch] = range
+
+        return True
+
+    @locked("AnalogIn")
+    def set_sampling(self, sampling_frequency, n_samples):
+        """
+        Change only the sample rate and buffer size of a configured scope
+
+        Returns: the sample rate the device actually uses
+        """
+        hzActual = c_double()
+        self._dwf.FDwfAnalogInFrequencySet(self._ad3._hdwf, sampling_frequency)
+        self._dwf.FDwfAnalogInBufferSizeSet(self._ad3._hdwf, n_samples)
+        self._dwf.FDwfAnalogInFrequencyGet(self._ad3._hdwf, byref(hzActual))
+
+        self._numSamples = n_samples
+        self._samplingFrequency = hzActual.value
+
+        return hzActual.value
+
+    @locked("AnalogIn")
+    def configure_trigger(self, source=dwfe.trigsrcDetectorAnalogIn, channel=0, type=dwfe.trigtypeEdge, level=0.0,
+                          condition=dwfe.DwfTriggerSlopeRise, hysteresis=None, position=0.0, holdoff=0.0, auto_timeout=0.0,
+                          length=None, length_condition=dwfe.triglenMore):
+        """
+        Configure the oscilloscope trigger, call after configure_scope_single
+
+        source: dwfe.trigsrc*, DetectorAnalogIn for the scope's own detector, or another instrument
+                (trigsrcDigitalIn, trigsrcExternal1..4 for the trigger pins, trigsrcNone to capture immediately)
+
+        type: dwfe.trigtype* Edge, Pulse, Transition or Window (detector only)
+
+        level: trigger level in volts, hysteresis in volts (None keeps the device default)
+
+        condition: dwfe.DwfTriggerSlope* Rise, Fall or Either
+
+        position: trigger position in seconds relative to the middle of the buffer, so
+                  n_samples/2/sampling_frequency puts the whole buffer after the trigger
+
+        holdoff: seconds after a trigger during which the next one is ignored
+
+        auto_timeout: seconds to wait for a trigger before capturing anyway, 0 waits forever
+
+        length, length_condition: pulse/transition length in seconds and dwfe.triglen* Less, Timeout or More
+        """
+        hdwf = self._ad3._hdwf
+        dwf = self._dwf
+
+        # dwfconstants passes ctypes values, dwf_enums plain ints
+        source = getattr(source, "value", source)
+        type = getattr(type, "value", type)
+        condition = getattr(condition, "value", condition)
+        length_condition = getattr(length_condition, "value", length_condition)
+
+        dwf.FDwfAnalogInTriggerSourceSet(hdwf, source)
+        dwf.FDwfAnalogInTriggerAutoTimeoutSet(hdwf, auto_timeout)
+        dwf.FDwfAnalogInTriggerPositionSet(hdwf, position)
+        self._triggerPosition = position
+        dwf.FDwfAnalogInTriggerHoldOffSet(hdwf, holdoff)
+
+        if source == dwfe.trigsrcDetectorAnalogIn:
+            dwf.FDwfAnalogInTriggerTypeSet(hdwf, type)
+            dwf.FDwfAnalogInTriggerChannelSet(hdwf, channel)
+            dwf.FDwfAnalogInTriggerLevelSet(hdwf, level)
+            dwf.FDwfAnalogInTriggerConditionSet(hdwf, condition)
+            if hysteresis is not None:
+                dwf.FDwfAnalogInTriggerHysteresisSet(hdwf, hysteresis)
+            if length is not None:
+                dwf.FDwfAnalogInTriggerLengthSet(hdwf, length)
+                dwf.FDwfAnalogInTriggerLengthConditionSet(hdwf, length_condition)
 
         return True
 
-    def scope_capture_1ch_single(self, channel=0):
+    @locked("AnalogIn")
+    def scope_capture_1ch_single(self, channel=0, buffer=None, poll_interval=0.1):
         """
         Capture the oscilloscope data
 
+        buffer: optional c_double array of n_samples to fill instead of leasing one from Pool
+
+        poll_interval: seconds between status polls while waiting for the capture
+
         Returns: c type of doubles
         """
         self.start_scope()
 
-        return self.read_single_scope_1ch(channel)
+        return self.read_single_scope_1ch(channel, buffer, poll_interval)
 
-    def scope_capture_2ch_single(self):
+    @locked("AnalogIn")
+    def scope_capture_2ch_single(self, buffers=None, poll_interval=0.1):
         """
         Captures both channels of oscilloscope data
 
+        buffers: optional pair of c_double arrays of n_samples to fill instead of leasing them from Pool
+
+        poll_interval: seconds between status polls while waiting for the capture
+
         Returns: c type of doubles, c type of doubles
         """
         self.start_scope()
-        data1, data2 = self.read_single_scope_2ch()
+        data1, data2 = self.read_single_scope_2ch(buffers, poll_interval)
         return data1, data2
 
+    @locked("AnalogIn")
     def start_scope(self):
         """
         Start the oscilloscope
         """
-        self._dwf.FDwfAnalogInConfigure(self._ad3._hdwf, c_int(1), c_int(1))
+        self._dwf.FDwfAnalogInConfigure(self._ad3._hdwf, 1, 1)
 
         return True
 
+    @locked("AnalogIn")
     def stop_scope(self):
         """
         Stop the oscilloscope
         """
-        self._dwf.FDwfAnalogInConfigure(self._ad3._hdwf, c_int(0), c_int(0))
+        self._dwf.FDwfAnalogInConfigure(self._ad3._hdwf, 0, 0)
 
         return True
 
-    def read_single_scope_1ch(self, channel=0):
+    @locked("AnalogIn")
+    def read_single_scope_1ch(self, channel=0, buffer=None, poll_interval=0.1):
         """
         Wait for the oscilloscope to finish capturing data
         """
 
-        sts = c_byte()
-        rgdSamples = (c_double * self._numSamples)()
+        rgdSamples = self._new_buffer() if buffer is None else buffer
 
-        while True:
-            self._dwf.FDwfAnalogInStatus(self._ad3._hdwf, c_int(1), byref(sts))
-            if sts.value == DwfStateDone.value :
-                break
-            time.sleep(0.1)
+        self._wait_done(poll_interval)
             
         self._dwf.FDwfAnalogInStatusData(self._ad3._hdwf, channel, rgdSamples, self._numSamples) # get data
         
         return rgdSamples
 
-    def read_single_scope_2ch(self):
+    @locked("AnalogIn")
+    def read_single_scope_2ch(self, buffers=None, poll_interval=0.1):
         """
         Wait for the oscilloscope to finish capturing data
         """
 
-        sts = c_byte()
-        rgdSamples1 = (c_double * self._numSamples)()
-        rgdSamples2 = (c_double * self._numSamples)()
+        if buffers is None:
+            rgdSamples1 = self._new_buffer()
+            rgdSamples2 = self._new_buffer()
+        else:
+            rgdSamples1, rgdSamples2 = buffers
 
-        while True:
-            self._dwf.FDwfAnalogInStatus(self._ad3._hdwf, c_int(1), byref(sts))
-            if sts.value == DwfStateDone.value :
-                break
-            time.sleep(0.1)
+        self._wait_done(poll_interval)
 
         self._dwf.FDwfAnalogInStatusData(self._ad3._hdwf, 0, rgdSamples1, self._numSamples) # get data
         self._dwf.FDwfAnalogInStatusData(self._ad3._hdwf, 1, rgdSamples2, self._numSamples) # get data
 
         return rgdSamples1, rgdSamples2
 
+    def _new_buffer(self):
+        """
+        Sample buffer for one channel, leased from Pool: hand it back with Pool.release when done with it
+        """
+        if self.Pool is None:
+            return (c_double * self._numSamples)()
+        # cleared like a new array, so samples a short capture does not fill are not from an earlier one
+        return self.Pool.lease(c_double, self._numSamples, zero=True)
+
+    def _wait_done(self, poll_interval=0.1):
+        """
+        Poll the acquisition status until the capture is done
+        """
+        dwf = self._dwf
+        hdwf = self._ad3._hdwf
+        sts = self._sts
+        pSts = self._pSts
+        done = dwfe.DwfStateDone
+
+        while True:
+            dwf.FDwfAnalogInStatus(hdwf, 1, pSts)
+            if sts.value == done:
+                break
+            time.sleep(poll_interval)
+
 class AO():
     def __init__(self, ad3: AnalogDiscovery3):
         self._ad3 = ad3
-        self._dwf = type(ad3)._dwf       # API Interface ???    
+
+    @property
+    def _dwf(self):
+        return type(self._ad3)._dwf
 
     # AD3 - Function Generator 
+    @locked("AnalogOut")
     def generate_pattern_fgen(self, channel, function, offset, frequency=2e06, amplitude=2, symmetry=50, wait=0, run_time=0, repeat=0, data=[]):
         """
             generate an analog signal
@@ -162,44 +294,56 @@ class AO():
                         - repeat count, default is infinite (0)
                         - data - list of voltages, used only if function=custom, default is empty
         """
+        # accept dwfconstants c_ubyte values as well as dwf_enums ints
+        function = getattr(function, "value", function)
+
         # enable channel
-        channel = c_int(channel)
-        self._dwf.FDwfAnalogOutNodeEnableSet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, c_bool(True))
+        self._dwf.FDwfAnalogOutNodeEnableSet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, True)
         # set function type
-        self._dwf.FDwfAnalogOutNodeFunctionSet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, function)
+        self._dwf.FDwfAnalogOutNodeFunctionSet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, function)
         # load data if the function type is custom
-        if function == funcCustom:
+        if function == dwfe.funcCustom:
             data_length = len(data)
-            buffer = (c_double * data_length)()
-            for index in range(0, len(buffer)):
-                buffer[index] = c_double(data[index])
-            self._dwf.FDwfAnalogOutNodeDataSet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, buffer, c_int(data_length))
+            buffer = (c_double * data_length)(*data)
+            self._dwf.FDwfAnalogOutNodeDataSet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, buffer, data_length)
 
         # set frequency
-        self._dwf.FDwfAnalogOutNodeFrequencySet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, c_double(frequency))
+        self._dwf.FDwfAnalogOutNodeFrequencySet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, frequency)
         # set amplitude or DC voltage
-        self._dwf.FDwfAnalogOutNodeAmplitudeSet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, c_double(amplitude))
+        self._dwf.FDwfAnalogOutNodeAmplitudeSet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, amplitude)
         # set offset
-        self._dwf.FDwfAnalogOutNodeOffsetSet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, c_double(offset))
+        self._dwf.FDwfAnalogOutNodeOffsetSet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, offset)
         # set symmetry
-        self._dwf.FDwfAnalogOutNodeSymmetrySet(self._ad3._hdwf, channel, AnalogOutNodeCarrier, c_double(symmetry))
+        self._dwf.FDwfAnalogOutNodeSymmetrySet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, symmetry)
         # set running time limit
-        self._dwf.FDwfAnalogOutRunSet(self._ad3._hdwf, channel, c_double(run_time))
+        self._dwf.FDwfAnalogOutRunSet(self._ad3._hdwf, channel, run_time)
         # set wait time before start
-        self._dwf.FDwfAnalogOutWaitSet(self._ad3._hdwf, channel, c_double(wait))
+        self._dwf.FDwfAnalogOutWaitSet(self._ad3._hdwf, channel, wait)
         # set number of repeating cycles
-        self._dwf.FDwfAnalogOutRepeatSet(self._ad3._hdwf, channel, c_int(repeat))
+        self._dwf.FDwfAnalogOutRepeatSet(self._ad3._hdwf, channel, repeat)
         # start
-        self._dwf.FDwfAnalogOutConfigure(self._ad3._hdwf, channel, c_int(1))
+        self._dwf.FDwfAnalogOutConfigure(self._ad3._hdwf, channel, 1)
         return
     
+    @locked("AnalogOut")
+    def set_frequency(self, channel, frequency):
+        """
+        Change the frequency of a running wavegen channel without restarting it
+        """
+        self._dwf.FDwfAnalogOutNodeFrequencySet(self._ad3._hdwf, channel, dwfe.AnalogOutNodeCarrier, frequency)
+        # 3 applies the new settings to the running instrument
+        self._dwf.FDwfAnalogOutConfigure(self._ad3._hdwf, channel, 3)
+
+        return True
+
+    @locked("AnalogOut")
     def disable_fgen(self, channel=-1):
         """
         Disables the waveform generator
         
         channel: -1 for all channels, 0 for first channel, 1 for second channel
         """
-        self._dwf.FDwfAnalogOutConfigure(self._ad3._hdwf, c_int(channel), c_int(False))
+        self._dwf.FDwfAnalogOutConfigure(self._ad3._hdwf, channel, False)
 
         return True
     
@@ -216,11 +360,11 @@ class I2C():
     
     @Rate.setter
     @AnalogDiscovery3.LogPropertySet
+    @locked("I2C")
     def Rate(self, bitRate: float):
         self._rate = bitRate
 
-        rate = c_double(bitRate)
-        self._dwf.FDwfDigitalI2cRateSet(self._ad3._hdwf, rate)
+        self._dwf.FDwfDigitalI2cRateSet(self._ad3._hdwf, bitRate)
     #endregion
 
     #region Timeout
@@ -230,11 +374,11 @@ class I2C():
     
     @Timeout.setter
     @AnalogDiscovery3.LogPropertySet
+    @locked("I2C")
     def Timeout(self, duration_sec: float):
         self._timeout = duration_sec
 
-        timeout_sec = c_double(duration_sec)
-        self._dwf.FDwfDigitalI2cTimeoutSet(self._ad3._hdwf, timeout_sec)
+        self._dwf.FDwfDigitalI2cTimeoutSet(self._ad3._hdwf, duration_sec)
     #endregion
 
     #region EnNakOnRead
@@ -244,11 +388,11 @@ class I2C():
     
     @EnNakOnRead.setter
     @AnalogDiscovery3.LogPropertySet
+    @locked("I2C")
     def EnNakOnRead(self, value: bool):
         self._enNakOnRead = value
 
-        val = c_int(value)
-        self._dwf.FDwfDigitalI2cReadNakSet(self._ad3._hdwf, val)
+        self._dwf.FDwfDigitalI2cReadNakSet(self._ad3._hdwf, value)
     #endregion
 
     #region EnableClockStretching
@@ -258,11 +402,11 @@ class I2C():
     
     @EnableClockStretching.setter
     @AnalogDiscovery3.LogPropertySet
+    @locked("I2C")
     def EnableClockStretching(self, value: bool):
         self._enClockStretching = value
 
-        val = c_int(value)
-        self._dwf.FDwfDigitalI2cStretchSet(self._ad3._hdwf, val)
+        self._dwf.FDwfDigitalI2cStretchSet(self._ad3._hdwf, value)
     #endregion
 
     #region SCL
@@ -272,11 +416,11 @@ class I2C():
     
     @SCL.setter
     @AnalogDiscovery3.LogPropertySet
+    @locked("I2C")
     def SCL(self, dioChannel: int):
         self._scl = dioChannel
 
-        channel = c_int(dioChannel)
-        self._dwf.FDwfDigitalI2cSclSet(self._ad3._hdwf, channel)
+        self._dwf.FDwfDigitalI2cSclSet(self._ad3._hdwf, dioChannel)
     #endregion
 
     #region SDA
@@ -286,11 +430,11 @@ class I2C():
     
     @SDA.setter
     @AnalogDiscovery3.LogPropertySet
+    @locked("I2C")
     def SDA(self, dioChannel: int):
         self._sda = dioChannel
         
-        channel = c_int(dioChannel)
-        self._dwf.FDwfDigitalI2cSdaSet(self._ad3._hdwf, channel)
+        self._dwf.FDwfDigitalI2cSdaSet(self._ad3._hdwf, dioChannel)
     #endregion
 
 
@@ -298,13 +442,18 @@ class I2C():
     #endregion
 
     I2cMessage = namedtuple('I2cMessage', ['ACK', 'Readback', 'Details'])
+    I2cTransfer = namedtuple('I2cTransfer', ['ACK', 'Bytes', 'Seconds', 'BytesPerSecond'])
 
     def __init__(self, ad3: AnalogDiscovery3):
         self.name = "I2C"
 
         self._ad3 = ad3                 
-        self._dwf = type(ad3)._dwf       # API Interface ???
 
+        # NAK flag and receive buffer reused by every transfer
+        self._nak = c_int()
+        self._pNak = byref(self._nak)
+        self._rxBuffer = (c_ubyte * 64)()
+        self._txBuffer = (c_ubyte * 64)()
 
         self._scl = None
         self._sda = None
@@ -313,6 +462,10 @@ class I2C():
         self._enNakOnRead = None
         self._enClockStretching = None
 
+    @property
+    def _dwf(self):
+        return type(self._ad3)._dwf
+
     def LogI2C(func):
         def wrapper(*args, **kwargs):
             obj = args[0]
@@ -327,6 +480,7 @@ class I2C():
         return wrapper
 
 
+    @locked("I2C")
     def Reset(self):
         self._dwf.FDwfDigitalI2cReset(self._ad3._hdwf)
         self._scl = None
@@ -336,6 +490,7 @@ class I2C():
         self._enNakOnRead = None
         self._enClockStretching = None
     
+    @locked("I2C")
     def Clear(self) -> bool:
         iNak = c_int()
         self._dwf.FDwfDigitalI2cClear(self._ad3._hdwf, byref(iNak))
@@ -344,6 +499,7 @@ class I2C():
     
 
     @LogI2C
+    @locked("I2C")
     def Write(self, address: int, register: int = None, values: int | list[int] = None) -> I2cMessage:
         """I2C write.
             - Single
@@ -365,32 +521,25 @@ class I2C():
         
 
         ### Basic setup
-        pNak = c_int()
-        cAddress = c_ubyte(address)
-
         if register is None:
-            cTx = c_int(0)
-            rgTx = (cTx.value * c_ubyte)()
+            rgTx = b""
 
         else:
             if values is None:
-                cTx = c_int(1)
-                rgTx = (cTx.value * c_ubyte)(register)
+                rgTx = bytes((register,))
 
             elif isinstance(values, int):
-                cTx = c_int(2)
-                rgTx = (cTx.value * c_ubyte)(register, values)
+                rgTx = bytes((register, values))
 
             elif isinstance(values, list):
-                cTx = c_int(1 + len(values))
-                rgTx = (cTx.value * c_ubyte)(register, *values)
+                rgTx = bytes((register, *values))
 
 
         ### Perform the write
-        self._dwf.FDwfDigitalI2cWrite(self._ad3._hdwf, cAddress, rgTx, cTx, byref(pNak))
+        self._dwf.FDwfDigitalI2cWrite(self._ad3._hdwf, address, rgTx, len(rgTx), self._pNak)
 
         readback = None
-        notAck = bool(pNak)
+        notAck = bool(self._nak)
         ack = not notAck
 
         addressStr = f"0x{format(address, '02x')}"
@@ -411,6 +560,7 @@ class I2C():
         return msg
 
     @LogI2C
+    @locked("I2C")
     def Read(self, address: int, register: int, count=1) -> I2cMessage:
         """I2C Read
         - Single
@@ -427,26 +577,21 @@ class I2C():
         
         
 
-        ### Basic setup
-        pNak = c_int()
-        cAddress = c_ubyte(address)
-
         ### Repeated start reads (https://www.i2c-bus.org/auto-increment/)
         if register is None:
-            cTx = c_int(0)
-            rgTx = (cTx.value * c_ubyte)()
+            rgTx = b""
         else:
-            cTx = c_int(1)
-            rgTx = (cTx.value * c_ubyte)(register)
+            rgTx = bytes((register,))
 
-        cRx = c_int(count)
-        rgRx = (cRx.value * c_ubyte)()
+        if count > len(self._rxBuffer):
+            self._rxBuffer = (c_ubyte * count)()
+        rgRx = self._rxBuffer
 
         ### Write to the register and readback
-        self._dwf.FDwfDigitalI2cWriteRead(self._ad3._hdwf, address, rgTx, cTx, rgRx, cRx, byref(pNak))
+        self._dwf.FDwfDigitalI2cWriteRead(self._ad3._hdwf, address, rgTx, len(rgTx), rgRx, count, self._pNak)
 
-        readback = list(rgRx)
-        notAck = bool(pNak)
+        readback = rgRx[:count]
+        notAck = bool(self._nak)
         ack = not notAck
 
         addressStr = f"0x{format(address, '02x')}"
@@ -461,7 +606,138 @@ class I2C():
         msg = self.I2cMessage(ack, readback, textMsg)
         return msg
 
+    #region Block transfers
+    def _tx(self, prefix: bytes, data) -> tuple:
+        """Prefix and data in the reusable transmit buffer, returns (buffer, length)"""
+        data = memoryview(data).cast("B")
+        size = len(prefix) + len(data)
+        if size > len(self._txBuffer):
+            self._txBuffer = (c_ubyte * size)()
+
+        view = memoryview(self._txBuffer).cast("B")
+        view[:len(prefix)] = prefix
+        view[len(prefix):size] = data
+        return self._txBuffer, size
+
+    @locked("I2C")
+    def WriteBlock(self, address: int, data, register: int | bytes = None) -> bool:
+        """
+        Write a bytes-like block in one transfer, optionally after a register (int) or memory address (bytes)
+
+        Returns: ACK
+        """
+        prefix = b"" if register is None else bytes((register,)) if isinstance(register, int) else bytes(register)
+        rgTx, size = self._tx(prefix, data)
+
+        self._dwf.FDwfDigitalI2cWrite(self._ad3._hdwf, address, rgTx, size, self._pNak)
+        return not self._nak.value
+
+    @locked("I2C")
+    def ReadBlock(self, address: int, count: int, register: int | bytes = None, out=None):
+        """
+        Read count bytes in one transfer, optionally after writing a register (int) or memory address (bytes)
+
+        out: writable bytes-like object (bytearray, memoryview) of at least count bytes to read into
+
+        Returns: out, or new bytes when out is None; None on NAK
+        """
+        prefix = b"" if register is None else bytes((register,)) if isinstance(register, int) else bytes(register)
+
+        if out is not None:
+            rgRx = (c_ubyte * count).from_buffer(memoryview(out).cast("B"))
+        else:
+            if count > len(self._rxBuffer):
+                self._rxBuffer = (c_ubyte * count)()
+            rgRx = self._rxBuffer
+
+        self._dwf.FDwfDigitalI2cWriteRead(self._ad3._hdwf, address, prefix, len(prefix), rgRx, count, self._pNak)
+        if self._nak.value:
+            return None
+
+        return out if out is not None else bytes(memoryview(rgRx).cast("B")[:count])
+
+    @locked("I2C")
+    def PollAck(self, address: int, timeout=0.05) -> bool:
+        """Address the device until it ACKs (an EEPROM NAKs while its write cycle runs)"""
+        dwf = self._dwf
+        hdwf = self._ad3._hdwf
+        nak = self._nak
+        pNak = self._pNak
+        deadline = time.perf_counter() + timeout
+
+        while True:
+            dwf.FDwfDigitalI2cWrite(hdwf, address, None, 0, pNak)
+            if not nak.value:
+                return True
+            if time.perf_counter() > deadline:
+                return False
+
+    @locked("I2C")
+    def WriteEEPROM(self, address: int, start: int, data, page_size=128, address_bytes=2, timeout=0.05) -> I2cTransfer:
+        """
+        Program data at memory address start, one page write per page and ACK polling for the write cycle
+
+        address_bytes: memory address width of the part, 2 for 24xx32 and larger, 1 for the small ones
+        """
+        data = memoryview(data).cast("B")
+        written = 0
+        ack = True
+        t0 = time.perf_counter()
+
+        while written < len(data):
+            memAddress = start + written
+            # never cross a page boundary, the part would wrap within the page
+            size = min(page_size - memAddress % page_size, len(data) - written)
+
+            if not self.WriteBlock(address, data[written:written + size], memAddress.to_bytes(address_bytes, "big")):
+                ack = False
+                break
+            written += size
+
+            if not self.PollAck(address, timeout):
+                eventLog.error("EEPROM 0x%02x did not finish the write at 0x%04x", address, memAddress)
+                ack = False
+                break
+
+        return self._transfer(ack, written, time.perf_counter() - t0, "Wrote", address)
+
+    @locked("I2C")
+    def ReadEEPROM(self, address: int, start: int, count: int, address_bytes=2, chunk=4096, out=None) -> tuple:
+        """
+        Read count bytes from memory address start in chunks of at most chunk bytes
+
+        Returns: (data, I2cTransfer) with data the filled out buffer or a new bytearray
+        """
+        out = bytearray(count) if out is None else out
+        view = memoryview(out).cast("B")
+        done = 0
+        ack = True
+        t0 = time.perf_counter()
+
+        while done < count:
+            size = min(chunk, count - done)
+            if self.ReadBlock(address, size, (start + done).to_bytes(address_bytes, "big"), view[done:done + size]) is None:
+                ack = False
+                break
+            done += size
+
+        return out, self._transfer(ack, done, time.perf_counter() - t0, "Read", address)
+
+    def _transfer(self, ack, size, seconds, verb, address) -> I2cTransfer:
+        rate = size / seconds if seconds > 0 else 0.0
+        eventLog.info("%s %d bytes at 0x%02x in %.3f s (%.0f B/s)", verb, size, address, seconds, rate)
+
+        return self.I2cTransfer(ack, size, seconds, rate)
+    #endregion
+
+    def Spy(self, **kwargs):
+        """Passive bus monitor on the configured SCL/SDA pins, see i2c_spy.I2CSpy for the arguments"""
+        from i2c_spy import I2CSpy
+
+        return I2CSpy(self, **kwargs)
+
     # configure the DIO pins for I2C communication
+    @locked("I2C")
     def Configure(self, sclPin, sdaPin, clockFreq, enClkStretch):
         iNak = c_int()
         self.Reset()
@@ -476,6 +752,7 @@ class I2C():
         return isBusFree
 
 
+    @locked("I2C")
     def FindDevices(self, addresses: range = None):
         addresses = list(range(0, 0x7F)) if addresses is None else addresses
         addresses = [address << 1 for address in addresses]
@@ -490,6 +767,522 @@ class I2C():
         return validAddresses
 
 
+class SPI():
+    #region Properties
+
+    #region Frequency
+    @property
+    def Frequency(self) -> float:
+        return self._frequency
+
+    @Frequency.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def Frequency(self, hz: float):
+        self._frequency = hz
+
+        self._dwf.FDwfDigitalSpiFrequencySet(self._ad3._hdwf, hz)
+    #endregion
+
+    #region Mode
+    @property
+    def Mode(self) -> int:
+        return self._mode
+
+    @Mode.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def Mode(self, mode: int):
+        """SPI mode 0-3: bit 1 is CPOL, bit 0 is CPHA"""
+        self._mode = mode
+
+        self._dwf.FDwfDigitalSpiModeSet(self._ad3._hdwf, mode)
+    #endregion
+
+    #region MsbFirst
+    @property
+    def MsbFirst(self) -> bool:
+        return self._msbFirst
+
+    @MsbFirst.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def MsbFirst(self, value: bool):
+        self._msbFirst = value
+
+        self._dwf.FDwfDigitalSpiOrderSet(self._ad3._hdwf, 1 if value else 0)
+    #endregion
+
+    #region SCK
+    @property
+    def SCK(self) -> int:
+        return self._sck
+
+    @SCK.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def SCK(self, dioChannel: int):
+        self._sck = dioChannel
+
+        self._dwf.FDwfDigitalSpiClockSet(self._ad3._hdwf, dioChannel)
+    #endregion
+
+    #region MOSI
+    @property
+    def MOSI(self) -> int:
+        return self._mosi
+
+    @MOSI.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def MOSI(self, dioChannel: int):
+        self._mosi = dioChannel
+
+        # DQ0 is MOSI in standard (cDQ = 1) transfers
+        self._dwf.FDwfDigitalSpiDataSet(self._ad3._hdwf, 0, dioChannel)
+    #endregion
+
+    #region MISO
+    @property
+    def MISO(self) -> int:
+        return self._miso
+
+    @MISO.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def MISO(self, dioChannel: int):
+        self._miso = dioChannel
+
+        # DQ1 is MISO in standard (cDQ = 1) transfers
+        self._dwf.FDwfDigitalSpiDataSet(self._ad3._hdwf, 1, dioChannel)
+    #endregion
+
+    #region CS
+    @property
+    def CS(self) -> int:
+        return self._cs
+
+    @CS.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("SPI")
+    def CS(self, dioChannel: int):
+        self._cs = dioChannel
+
+        # idle high, chip select is active low
+        self._dwf.FDwfDigitalSpiSelect(self._ad3._hdwf, dioChannel, 1)
+    #endregion
+
+    #endregion
+
+    def __init__(self, ad3: AnalogDiscovery3):
+        self.name = "SPI"
+
+        self._ad3 = ad3
+
+        # transmit/receive buffers reused by every transfer, grown when needed
+        self._txBuffer = (c_ubyte * 256)()
+        self._rxBuffer = (c_ubyte * 256)()
+        self._queue = []
+
+        self._frequency = None
+        self._mode = None
+        self._msbFirst = None
+        self._sck = None
+        self._mosi = None
+        self._miso = None
+        self._cs = None
+
+    @property
+    def _dwf(self):
+        return type(self._ad3)._dwf
+
+    @locked("SPI")
+    def Reset(self):
+        self._dwf.FDwfDigitalSpiReset(self._ad3._hdwf)
+        self._frequency = None
+        self._mode = None
+        self._msbFirst = None
+        self._sck = None
+        self._mosi = None
+        self._miso = None
+        self._cs = None
+        self._queue = []
+
+    # configure the DIO pins for SPI communication
+    @locked("SPI")
+    def Configure(self, sckPin, mosiPin, misoPin, csPin, frequency, mode=0, msbFirst=True):
+        self.Reset()
+
+        self.SCK = sckPin
+        self.MOSI = mosiPin
+        self.MISO = misoPin
+        self.CS = csPin
+        self.Frequency = frequency
+        self.Mode = mode
+        self.MsbFirst = msbFirst
+
+        # a zero bit write starts driving the clock and data lines
+        self._dwf.FDwfDigitalSpiWriteOne(self._ad3._hdwf, 1, 0, 0)
+
+        return True
+
+    @locked("SPI")
+    def Select(self, active: bool):
+        """Assert (True) or release (False) chip select"""
+        self._dwf.FDwfDigitalSpiSelect(self._ad3._hdwf, self._cs, 0 if active else 1)
+
+    def _buffers(self, size):
+        if size > len(self._txBuffer):
+            self._txBuffer = (c_ubyte * size)()
+            self._rxBuffer = (c_ubyte * size)()
+        return self._txBuffer, self._rxBuffer
+
+    @locked("SPI")
+    def Transfer(self, data, select=True) -> bytes:
+        """
+        Full duplex transfer, as many bytes are read as are written
+
+        data: bytes-like object to send
+
+        select: assert chip select around the transfer
+
+        Returns: received bytes
+        """
+        data = memoryview(data).cast("B")
+        size = len(data)
+        rgTx, rgRx = self._buffers(size)
+        memoryview(rgTx).cast("B")[:size] = data
+
+        if select:
+            self.Select(True)
+        self._dwf.FDwfDigitalSpiWriteRead(self._ad3._hdwf, 1, 8, rgTx, size, rgRx, size)
+        if select:
+            self.Select(False)
+
+        return bytes(memoryview(rgRx).cast("B")[:size])
+
+    @locked("SPI")
+    def Write(self, data, select=True):
+        """Write a bytes-like object, received data is discarded"""
+        data = memoryview(data).cast("B")
+        rgTx, rgRx = self._buffers(len(data))
+        memoryview(rgTx).cast("B")[:len(data)] = data
+
+        if select:
+            self.Select(True)
+        self._dwf.FDwfDigitalSpiWrite(self._ad3._hdwf, 1, 8, rgTx, len(data))
+        if select:
+            self.Select(False)
+
+    @locked("SPI")
+    def Read(self, count: int, select=True, out=None):
+        """
+        Read count bytes (MOSI idles)
+
+        out: writable bytes-like object to read into instead of returning new bytes
+        """
+        if out is not None:
+            rgRx = (c_ubyte * count).from_buffer(memoryview(out).cast("B"))
+        else:
+            rgTx, rgRx = self._buffers(count)
+
+        if select:
+            self.Select(True)
+        self._dwf.FDwfDigitalSpiRead(self._ad3._hdwf, 1, 8, rgRx, count)
+        if select:
+            self.Select(False)
+
+        return out if out is not None else bytes(memoryview(rgRx).cast("B")[:count])
+
+    #region Batched transfers
+    @locked("SPI")
+    def Queue(self, data=b"", read=0):
+        """
+        Queue one chip-select framed transaction: write data, then read read bytes
+
+        Returns: index of the transaction in the list Flush returns
+        """
+        self._queue.append((bytes(data), read))
+        return len(self._queue) - 1
+
+    @locked("SPI")
+    def Flush(self) -> list:
+        """
+        Run the queued transactions back to back
+
+        All transmit data is packed into one buffer and all replies land in one receive buffer, so the batch
+        allocates once however many transactions it has.
+
+        Returns: list of memoryviews of the read bytes, one per transaction
+        """
+        # taken under the SPI lock, so a transaction queued by another thread lands in this batch or the next
+        queue, self._queue = self._queue, []
+        total = sum(len(data) + read for data, read in queue)
+        rgTx, rgRx = self._buffers(total)
+        tx = memoryview(rgTx).cast("B")
+        rx = bytearray(total)
+
+        dwf = self._dwf
+        hdwf = self._ad3._hdwf
+        cs = self._cs
+        results = []
+        offset = 0
+
+        for data, read in queue:
+            size = len(data) + read
+            tx[offset:offset + len(data)] = data
+            tx[offset + len(data):offset + size] = bytes(read)
+
+            dwf.FDwfDigitalSpiSelect(hdwf, cs, 0)
+            dwf.FDwfDigitalSpiWriteRead(hdwf, 1, 8, byref(rgTx, offset), size, byref(rgRx, offset), size)
+            dwf.FDwfDigitalSpiSelect(hdwf, cs, 1)
+
+            offset += size
+
+        memoryview(rx)[:] = memoryview(rgRx).cast("B")[:total]
+        offset = 0
+        for data, read in queue:
+            results.append(memoryview(rx)[offset + len(data):offset + len(data) + read])
+            offset += len(data) + read
+
+        return results
+    #endregion
+
+
+class UART():
+    #region Properties
+
+    #region Rate
+    @property
+    def Rate(self) -> float:
+        return self._rate
+
+    @Rate.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("UART")
+    def Rate(self, baudRate: float):
+        self._rate = baudRate
+
+        self._dwf.FDwfDigitalUartRateSet(self._ad3._hdwf, baudRate)
+    #endregion
+
+    #region Bits
+    @property
+    def Bits(self) -> int:
+        return self._bits
+
+    @Bits.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("UART")
+    def Bits(self, bits: int):
+        self._bits = bits
+
+        self._dwf.FDwfDigitalUartBitsSet(self._ad3._hdwf, bits)
+    #endregion
+
+    #region Parity
+    @property
+    def Parity(self) -> int:
+        return self._parity
+
+    @Parity.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("UART")
+    def Parity(self, parity: int):
+        """0 none, 1 odd, 2 even"""
+        self._parity = parity
+
+        self._dwf.FDwfDigitalUartParitySet(self._ad3._hdwf, parity)
+    #endregion
+
+    #region Stop
+    @property
+    def Stop(self) -> float:
+        return self._stop
+
+    @Stop.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("UART")
+    def Stop(self, stopBits: float):
+        self._stop = stopBits
+
+        self._dwf.FDwfDigitalUartStopSet(self._ad3._hdwf, stopBits)
+    #endregion
+
+    #region TX
+    @property
+    def TX(self) -> int:
+        return self._tx
+
+    @TX.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("UART")
+    def TX(self, dioChannel: int):
+        self._tx = dioChannel
+
+        self._dwf.FDwfDigitalUartTxSet(self._ad3._hdwf, dioChannel)
+    #endregion
+
+    #region RX
+    @property
+    def RX(self) -> int:
+        return self._rx
+
+    @RX.setter
+    @AnalogDiscovery3.LogPropertySet
+    @locked("UART")
+    def RX(self, dioChannel: int):
+        self._rx = dioChannel
+
+        self._dwf.FDwfDigitalUartRxSet(self._ad3._hdwf, dioChannel)
+    #endregion
+
+    #endregion
+
+    def __init__(self, ad3: AnalogDiscovery3):
+        self.name = "UART"
+
+        self._ad3 = ad3
+
+        # receive buffer and counters reused by every poll
+        self._rxBuffer = (c_ubyte * 4096)()
+        self._cRx = c_int()
+        self._pCRx = byref(self._cRx)
+        self._parityError = c_int()
+        self._pParityError = byref(self._parityError)
+        self._txQueue = bytearray()
+
+        self._streamThread = None
+        self._streamStop = None
+        self.ParityErrors = 0
+
+        self._rate = None
+        self._bits = None
+        self._parity = None
+        self._stop = None
+        self._tx = None
+        self._rx = None
+
+    @property
+    def _dwf(self):
+        return type(self._ad3)._dwf
+
+    @locked("UART")
+    def Reset(self):
+        self.StopStream()
+        self._dwf.FDwfDigitalUartReset(self._ad3._hdwf)
+        self._rate = None
+        self._bits = None
+        self._parity = None
+        self._stop = None
+        self._tx = None
+        self._rx = None
+        self._txQueue = bytearray()
+
+    # configure the DIO pins for UART communication
+    @locked("UART")
+    def Configure(self, txPin, rxPin, rate, bits=8, parity=0, stop=1):
+        self.Reset()
+
+        self.TX = txPin
+        self.RX = rxPin
+        self.Rate = rate
+        self.Bits = bits
+        self.Parity = parity
+        self.Stop = stop
+
+        # zero length calls initialize the transmitter and start the receiver
+        self._dwf.FDwfDigitalUartTx(self._ad3._hdwf, None, 0)
+        self._dwf.FDwfDigitalUartRx(self._ad3._hdwf, None, 0, self._pCRx, self._pParityError)
+
+        return True
+
+    @locked("UART")
+    def Write(self, data):
+        """Send a bytes-like object in one call"""
+        data = bytes(data) if not isinstance(data, bytes) else data
+        self._dwf.FDwfDigitalUartTx(self._ad3._hdwf, data, len(data))
+
+    def Queue(self, data):
+        """Append data to the transmit batch sent by Flush"""
+        self._txQueue += data
+
+    @locked("UART")
+    def Flush(self):
+        """Send every queued write in a single transmit call"""
+        if not self._txQueue:
+            return
+        data, self._txQueue = bytes(self._txQueue), bytearray()
+        self._dwf.FDwfDigitalUartTx(self._ad3._hdwf, data, len(data))
+
+    @locked("UART")
+    def _poll(self) -> memoryview:
+        """Bytes received since the last poll, a view of the reusable receive buffer"""
+        self._dwf.FDwfDigitalUartRx(self._ad3._hdwf, self._rxBuffer, len(self._rxBuffer), self._pCRx, self._pParityError)
+        if self._parityError.value:
+            self.ParityErrors += 1
+            eventLog.warning("UART parity error")
+
+        return memoryview(self._rxBuffer).cast("B")[:self._cRx.value]
+
+    def Read(self, count: int = None, timeout=1.0, poll_interval=0.001) -> bytes:
+        """
+        Receive count bytes, or whatever is pending when count is None
+
+        Returns: the bytes received before the timeout
+        """
+        if count is None:
+            return bytes(self._poll())
+
+        received = bytearray()
+        deadline = time.perf_counter() + timeout
+        while len(received) < count:
+            chunk = self._poll()
+            if chunk:
+                received += chunk
+            elif time.perf_counter() > deadline:
+                break
+            else:
+                time.sleep(poll_interval)
+
+        return bytes(received)
+
+    #region Streaming receive
+    def StartStream(self, on_data, poll_interval=0.001):
+        """
+        Receive continuously on a background thread
+
+        on_data: called with a memoryview of each received chunk, valid only during the call
+        """
+        if self._streamThread is not None:
+            return
+        self._streamStop = threading.Event()
+
+        def run(stop):
+            while not stop.is_set():
+                chunk = self._poll()
+                if chunk:
+                    on_data(chunk)
+                else:
+                    time.sleep(poll_interval)
+
+        self._streamThread = threading.Thread(target=run, args=(self._streamStop,), name="UARTStream", daemon=True)
+        self._streamThread.start()
+
+    def StopStream(self):
+        thread = self._streamThread
+        if thread is None:
+            return
+        self._streamStop.set()
+        self._streamThread = None
+        if thread is threading.current_thread():
+            return      # called from on_data, the loop ends when the callback returns
+
+        # the stream thread may be waiting in _poll for the UART lock this thread holds (Configure, Reset)
+        with self._ad3.Locks["UART"].released():
+            thread.join()
+    #endregion
+
 
 
 if __name__ == "__main__":
@@ -1,117 +1,217 @@
 import sys
 from ctypes import *
 from abc import ABC, abstractmethod
+from event_log import eventLog
+from dwf_prototypes import DwfError, apply_prototypes
+from device_locks import DeviceLocks
+
+# Stand-in for the DWF library until the first FDwf* call, so constructing a device
+# (or importing a module that does) does not pay for loading libdwf
+class _LazyLibrary():
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(BaseDigilentDevice.load_library(), name)
+
 
 class BaseDigilentDevice(ABC):
-    _dwf = None
+    _dwf = _LazyLibrary()
+    _lib = None
     LibraryLoaded = False
 
+    # Optional device_enum.DeviceEnumerator, when set open_by_sn resolves the serial from its cache
+    Enumerator = None
+
     def __init__(self):
         self._hdwf = None
         self.SerialNumber = ""
-        
-        # Load the DWF library
-        self.load_library()
+
+        # per-subsystem locks for threads sharing this handle
+        self.Locks = DeviceLocks()
     
-    # Load the DWF library
+    # Load the DWF library, called automatically on the first library call
     @classmethod
     def load_library(cls):
-        if cls.LibraryLoaded:
-            return
+        base = BaseDigilentDevice
+        if base.LibraryLoaded:
+            return base._lib
         
         if sys.platform.startswith("win"):
-            cls._dwf = cdll.dwf
+            lib = cdll.dwf
         elif sys.platform.startswith("darwin"):
-            cls._dwf = cdll.LoadLibrary("/Library/Frameworks/dwf.framework/dwf")
+            lib = cdll.LoadLibrary("/Library/Frameworks/dwf.framework/dwf")
         else:
-            cls._dwf = cdll.LoadLibrary("libdwf.so")
-        if cls._dwf is None:
-            print("Failed to load dwf library")
-            # utils.log_to_file("Failed to load dwf library")
+            lib = cdll.LoadLibrary("libdwf.so")
+        if lib is None:
+            eventLog.error("Failed to load dwf library")
+            eventLog.close()
             quit()  
-        else:
-            cls.LibraryLoaded = True
+
+        base._lib = apply_prototypes(lib)
+        base.LibraryLoaded = True
+        if isinstance(base._dwf, _LazyLibrary):
+            base._dwf = lib
+
+        return lib
+
+    # Wrap the DWF library in a DwfProfiler, all subsystems of this device class go through it
+    @classmethod
+    def enable_profiling(cls, trace=False, max_samples=4096):
+        from dwf_profiler import DwfProfiler
+
+        cls.load_library()
+        if not isinstance(cls._dwf, DwfProfiler):
+            cls._dwf = DwfProfiler(cls._dwf, max_samples=max_samples, trace=trace)
+
+        return cls._dwf
+
+    # Remove the profiling proxy, returns the profiler so its results can still be exported
+    @classmethod
+    def disable_profiling(cls):
+        from dwf_profiler import DwfProfiler
+
+        profiler = cls._dwf
+        if isinstance(profiler, DwfProfiler):
+            cls._dwf = profiler._lib
+            return profiler
+
+        return None
+
+    # Record every DWF call of this device class to a trace file (dwf_trace.DwfRecorder)
+    @classmethod
+    def enable_tracing(cls, path):
+        from dwf_trace import DwfRecorder
+
+        cls.load_library()
+        if not isinstance(cls._dwf, DwfRecorder):
+            cls._dwf = DwfRecorder(cls._dwf, path)
+
+        return cls._dwf
+
+    # Close the trace file and remove the recorder (or the replayer installed by replay_trace)
+    @classmethod
+    def disable_tracing(cls):
+        from dwf_trace import DwfRecorder, DwfReplayer
+
+        tracer = cls._dwf
+        if isinstance(tracer, DwfRecorder):
+            tracer.close()
+            cls._dwf = tracer._lib
+            return tracer
+        if isinstance(tracer, DwfReplayer):
+            if tracer._previous is None:
+                del cls._dwf    # the class used its base class library
+            else:
+                cls._dwf = tracer._previous
+            return tracer
+
+        return None
+
+    # Answer DWF calls from a recorded trace instead of the library, no device or libdwf needed
+    @classmethod
+    def replay_trace(cls, path, speed=1.0, strict=False):
+        from dwf_trace import DwfReplayer
+
+        replayer = DwfReplayer(path, speed=speed, strict=strict)
+        current = vars(cls).get("_dwf")
+        replayer._previous = current._previous if isinstance(current, DwfReplayer) else current
+        cls._dwf = replayer
+
+        return replayer
     
 
+    # Open a device with one of the FDwfDeviceOpen* functions, hdwf is passed by reference as the last argument
+    def _open(self, description, openFunc, *args):
+        hdwf = c_int()
+
+        try:
+            openFunc(*args, byref(hdwf))
+        except DwfError as e:
+            eventLog.error("Failed to open device: %s: %s", description, e.Message)
+            return False
+
+        type(self)._dwf.FDwfDeviceAutoConfigureSet(hdwf, 0)# 0 = the device will be configured only when calling FDwf###Configure
+        self._hdwf = hdwf
+
+        return True
+
     # Open device by serial number
     def open_by_sn(self, sn):
         cls = type(self)
 
-        hdwf = c_int()
-        cSN = c_char_p(sn.encode('utf-8')) # convert string to c_char_p        
-
-        version = create_string_buffer(16)
-        cls._dwf.FDwfGetVersion(version)
-        cls._dwf.FDwfDeviceOpenEx(byref(cSN), byref(hdwf))
-
-        if hdwf.value == 0:
-            print(f"Failed to open device: {sn}")
-            szerr = create_string_buffer(512)
-            cls._dwf.FDwfGetLastErrorMsg(szerr)
-            print(str(szerr.value))
+        opened = self._open_enumerated(sn)
+        if opened is None:
+            opened = self._open(sn, cls._dwf.FDwfDeviceOpenEx, sn.encode('utf-8'))
+        if not opened:
             return False
 
-        cls._dwf.FDwfDeviceAutoConfigureSet(hdwf, c_int(0))# 0 = the device will be configured only when calling FDwf###Configure
-
-        self._hdwf = hdwf
         self.SerialNumber = sn
 
         return True
 
+    # Open by the index cached in Enumerator, without the scan FDwfDeviceOpenEx does for a serial number.
+    # Returns None when the serial number is not enumerated, so the caller falls back to FDwfDeviceOpenEx
+    def _open_enumerated(self, sn):
+        enumerator = BaseDigilentDevice.Enumerator
+        if enumerator is None:
+            return None
+
+        with enumerator.Lock:
+            info = enumerator.get(sn)
+            if info is None:
+                return None
+            if info.IsOpened:
+                eventLog.error("Failed to open device: %s: already opened", sn)
+                return False
+
+            if not self._open(sn, type(self)._dwf.FDwfDeviceOpen, info.Index):
+                return False
+
+            enumerator.set_opened(sn)
+            return True
+
     # Open device by device index
     def open_by_device_index(self, device_index):
         cls = type(self)
-    
-        hdwf = c_int()
-        cDeviceIndex = c_int(device_index)    
 
         version = create_string_buffer(16)
         cls._dwf.FDwfGetVersion(version)
-        print("DWF Version: "+str(version.value))
-
-        print(f"Opening device with device index {device_index}")
-        cls._dwf.FDwfDeviceOpen(byref(cDeviceIndex), byref(hdwf))
+        eventLog.info("DWF Version: %s", version.value)
 
-        if hdwf.value == 0:
-            print("failed to open device")
-            szerr = create_string_buffer(512)
-            cls._dwf.FDwfGetLastErrorMsg(szerr)
-            print(str(szerr.value))
-            return False
-
-        cls._dwf.FDwfDeviceAutoConfigureSet(hdwf, c_int(0))# 0 = the device will be configured only when calling FDwf###Configure
-        self._hdwf = hdwf
-        
-        return True
+        eventLog.info("Opening device with device index %d", device_index)
+        return self._open(f"index {device_index}", cls._dwf.FDwfDeviceOpen, device_index)
 
     # Open first available device
     def open_by_default(self):
         cls = type(self)
 
-        hdwf = c_int()
-
         version = create_string_buffer(16)
         cls._dwf.FDwfGetVersion(version)
-        print("DWF Version: "+str(version.value))
+        eventLog.info("DWF Version: %s", version.value)
 
-        print(f"Opening first available device")
-        cls._dwf.FDwfDeviceOpen(c_int(-1), byref(hdwf))
+        eventLog.info("Opening first available device")
+        return self._open("first available", cls._dwf.FDwfDeviceOpen, -1)
 
-        if hdwf.value == 0:
-            print("failed to open device")
-            szerr = create_string_buffer(512)
-            cls._dwf.FDwfGetLastErrorMsg(szerr)
-            print(str(szerr.value))
-            return False
+    # Drive a trigger I/O pin (0 = T1, 1 = T2 on the Analog Discovery) from a trigger source, e.g.
+    # dwfe.trigsrcAnalogIn, so another instrument can trigger on it. Returns the number of trigger pins.
+    def set_trigger_pin(self, pin, source):
+        cls = type(self)
 
-        cls._dwf.FDwfDeviceAutoConfigureSet(hdwf, c_int(0))# 0 = the device will be configured only when calling FDwf###Configure
-        self.hdwf = hdwf
+        count = c_int()
+        cls._dwf.FDwfDeviceTriggerInfo(self._hdwf, byref(count))
+        if pin >= count.value:
+            eventLog.error("Trigger pin %d not available, the device has %d", pin, count.value)
+            return 0
 
-        return True
+        cls._dwf.FDwfDeviceTriggerSet(self._hdwf, pin, getattr(source, "value", source))
+        return count.value
 
     # Close device
     def close(self):
         cls = type(self)
 
-        cls._dwf.FDwfDeviceClose(self._hdwf)
+        with self.Locks.all():
+            cls._dwf.FDwfDeviceClose(self._hdwf)
+        if BaseDigilentDevice.Enumerator is not None and self.SerialNumber:
+            BaseDigilentDevice.Enumerator.set_opened(self.SerialNumber, False)
         return
\ No newline at end of file
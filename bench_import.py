@@ -0,0 +1,44 @@
+"""
+Import/startup benchmark for the device modules.
+
+Runs every statement in a fresh interpreter (so module caches do not hide the
+cost) and reports the median wall time of the statement itself.
+
+    python bench_import.py [runs]
+"""
+import statistics
+import subprocess
+import sys
+
+CASES = [
+    ("import dwfconstants", "import dwfconstants"),
+    ("import dwf_enums", "import dwf_enums"),
+    ("dwf_enums first constant", "import dwf_enums; dwf_enums.DwfStateDone"),
+    ("dwf_enums first enum", "import dwf_enums; dwf_enums.DwfState.Done"),
+    ("import analog_discovery_3", "import analog_discovery_3"),
+    ("import digital_discovery", "import digital_discovery"),
+    ("AnalogDiscovery3()", "import analog_discovery_3; analog_discovery_3.AnalogDiscovery3()"),
+]
+
+_TIMER = """
+import time
+_t0 = time.perf_counter()
+{stmt}
+print(time.perf_counter() - _t0)
+"""
+
+
+def run_case(stmt, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _TIMER.format(stmt=stmt)], capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for name, stmt in CASES:
+        print(f"{name:<30} {run_case(stmt, runs) * 1e3:8.3f} ms")
@@ -0,0 +1,161 @@
+"""
+   Frequency response (Bode) sweep with the Analog Discovery 3.
+
+   Wavegen channel drives the DUT, scope channel 1 measures the stimulus and
+   channel 2 the response. The sweep is planned up front: every point gets a
+   sample rate from a ladder of rates (one per octave) and all points share
+   one buffer size, so consecutive points mostly share the scope setup and
+   only the wavegen frequency changes between them. Gain and phase of
+   point N are computed on a worker thread while point N+1 is captured.
+
+       sweep = BodeSweep(ad3, amplitude=1.0)
+       for point in sweep.run(sweep.plan(10, 1e6, 200)):
+           print(point.Frequency, point.GainDb, point.Phase)
+"""
+
+import cmath
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import *
+
+import dwf_enums as dwfe
+from event_log import eventLog
+
+BodePoint = namedtuple("BodePoint", ["Frequency", "Gain", "GainDb", "Phase"])
+
+# One planned point: stimulus frequency, scope rate and buffer size, and the samples analyzed (whole periods)
+SweepStep = namedtuple("SweepStep", ["Frequency", "SampleRate", "BufferSize", "Samples"])
+
+
+def tone(samples, n, frequency, sample_rate) -> complex:
+    """Single-bin DFT of the first n samples at frequency (Goertzel recurrence), DC removed."""
+    mean = sum(samples[:n]) / n
+    w = 2 * math.pi * frequency / sample_rate
+    coeff = 2 * math.cos(w)
+    s1 = s2 = 0.0
+    for i in range(n):
+        s0 = samples[i] - mean + coeff * s1 - s2
+        s2 = s1
+        s1 = s0
+
+    # the recurrence leaves the bin phase referenced to the last sample, rotate it back to sample 0
+    return (s1 - s2 * cmath.exp(-1j * w)) * cmath.exp(-1j * w * (n - 1))
+
+
+def analyze(step, stimulus, response) -> BodePoint:
+    x = tone(stimulus, step.Samples, step.Frequency, step.SampleRate)
+    y = tone(response, step.Samples, step.Frequency, step.SampleRate)
+    h = y / x if x else 0j
+    gain = abs(h)
+
+    return BodePoint(step.Frequency, gain, 20 * math.log10(gain) if gain else -math.inf, math.degrees(cmath.phase(h)))
+
+
+class BodeSweep():
+    """
+    ad3: opened AnalogDiscovery3
+    wavegen: wavegen channel driving the DUT
+    amplitude, offset: stimulus in volts
+    range: scope range in volts for both channels
+    max_rate: highest scope rate used, max_samples: largest buffer (two channels)
+    periods: minimum whole stimulus periods per capture, samples_per_period: minimum samples per period
+    settle_periods: periods to wait after a frequency change before capturing
+    """
+    def __init__(self, ad3, wavegen=0, amplitude=1.0, offset=0.0, range=5.0, max_rate=100e6, max_samples=16384,
+                 periods=8, samples_per_period=32, settle_periods=2):
+        self._ad3 = ad3
+        self.Wavegen = wavegen
+        self.Amplitude = amplitude
+        self.Offset = offset
+        self.Range = range
+        self.MaxRate = max_rate
+        self.MaxSamples = max_samples
+        self.Periods = periods
+        self.SamplesPerPeriod = samples_per_period
+        self.SettlePeriods = settle_periods
+
+    def plan(self, start, stop, points, log=True) -> list:
+        """Frequencies from start to stop with a sample rate and buffer size per point."""
+        if points == 1:
+            frequencies = [start]
+        elif log:
+            ratio = (stop / start) ** (1 / (points - 1))
+            frequencies = [start * ratio ** i for i in range(points)]
+        else:
+            frequencies = [start + (stop - start) * i / (points - 1) for i in range(points)]
+
+        # The buffer size is the same for every point and rates come from max_rate / 2**k, the lowest one
+        # giving samples_per_period, so the scope is only reconfigured once per octave. Each capture then
+        # holds between periods and 2*periods periods, of which the whole ones are analyzed.
+        bufferSize = min(self.MaxSamples, 2 * self.SamplesPerPeriod * self.Periods)
+
+        steps = []
+        for frequency in frequencies:
+            rate = self.MaxRate
+            while rate / 2 >= frequency * self.SamplesPerPeriod:
+                rate /= 2
+            if rate < frequency * 2:
+                eventLog.warning("%g Hz is above the Nyquist limit of %g Hz", frequency, rate / 2)
+
+            cycles = max(1, math.floor(bufferSize * frequency / rate))
+            samples = min(bufferSize, round(cycles * rate / frequency))
+            steps.append(SweepStep(frequency, rate, bufferSize, samples))
+
+        return steps
+
+    def run(self, steps, poll_interval=None) -> list:
+        """
+        Measure every planned step. Returns a list of BodePoint in step order.
+
+        poll_interval: scope status poll period, default a tenth of the capture time
+        """
+        ad3 = self._ad3
+        ai = ad3.AI
+        ao = ad3.AO
+        if not steps:
+            return []
+
+        for channel in (0, 1):
+            ai.configure_scope_single(channel, steps[0].SampleRate, self.Range, self.MaxSamples)
+        ao.generate_pattern_fgen(self.Wavegen, dwfe.funcSine, self.Offset, steps[0].Frequency, self.Amplitude)
+
+        # two buffer pairs: one is captured into while the other is analyzed
+        size = max(step.BufferSize for step in steps)
+        buffers = [((c_double*size)(), (c_double*size)()) for _ in range(2)]
+        pending = [None, None]
+        futures = []
+        setup = None
+        reconfigurations = 0
+        t0 = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for index, step in enumerate(steps):
+                slot = index % 2
+                if pending[slot] is not None:
+                    pending[slot].result()
+
+                if (step.SampleRate, step.BufferSize) != setup:
+                    setup = (step.SampleRate, step.BufferSize)
+                    rate = ai.set_sampling(*setup)
+                    reconfigurations += 1
+                # analyze with the rate the device actually uses
+                step = step._replace(SampleRate=rate)
+                if index:
+                    ao.set_frequency(self.Wavegen, step.Frequency)
+
+                time.sleep(self.SettlePeriods / step.Frequency)
+
+                captureTime = step.BufferSize / step.SampleRate
+                interval = captureTime / 10 if poll_interval is None else poll_interval
+                stimulus, response = ai.scope_capture_2ch_single(buffers[slot], poll_interval=interval)
+
+                pending[slot] = pool.submit(analyze, step, stimulus, response)
+                futures.append(pending[slot])
+
+            results = [future.result() for future in futures]
+
+        eventLog.info("Bode sweep: %d points in %.3f s, %d scope reconfigurations",
+                      len(steps), time.perf_counter() - t0, reconfigurations)
+        return results
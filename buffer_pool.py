@@ -0,0 +1,229 @@
+"""
+   Size-classed pool of ctypes sample buffers.
+
+   Buffers are raw memory blocks of a fixed set of sizes (eight classes per
+   power of two, so at most 1/8 is wasted) handed out as ctypes arrays of the
+   requested type and length. A released block goes back to the free list of
+   its class and serves the next lease of any type that fits, so repeated
+   captures reuse the same memory instead of allocating per capture.
+
+       buf = bufferPool.lease(c_double, 16384)
+       ...
+       bufferPool.release(buf)
+
+       with bufferPool.leased(c_uint16, n) as buf:
+           ...
+
+   A leased array that is dropped without release() goes back to the pool
+   when it is garbage collected. Leased memory is not cleared. With max_bytes
+   set, free blocks are dropped to make room and a lease that still does not
+   fit waits for a release (up to timeout) or raises PoolExhausted.
+"""
+
+import itertools
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from ctypes import c_char, memset, sizeof
+
+
+MIN_CLASS = 256
+_STEP_BITS = 3     # 2**3 size classes per power of two
+
+# lease keys, unique across pools; id() of a collected array can be reused by the next lease
+_tokens = itertools.count()
+
+
+class PoolExhausted(MemoryError):
+    """A lease would take the pool over max_bytes."""
+
+
+def size_class(nbytes: int) -> int:
+    """Block size serving nbytes"""
+    if nbytes <= MIN_CLASS:
+        return MIN_CLASS
+    step = 1 << max(0, (nbytes - 1).bit_length() - 1 - _STEP_BITS)
+    return -(-nbytes // step) * step
+
+
+class BufferPool():
+    """
+    max_bytes: cap on memory held by the pool (leased and free), None for no cap
+    max_free_per_class: free blocks kept per size class, extra releases are freed
+    """
+    def __init__(self, max_bytes=None, max_free_per_class=8):
+        self.MaxBytes = max_bytes
+        self.MaxFreePerClass = max_free_per_class
+
+        self._free = {}         # size class -> [block]
+        self._leased = {}       # lease token -> (block, finalizer)
+        self._collected = []    # tokens of leased arrays collected while the lock was held
+        self._cond = threading.Condition(threading.Lock())
+
+        self.AllocatedBytes = 0     # leased and free blocks
+        self.LeasedBytes = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.Leases = 0
+        self.Hits = 0
+        self.Allocations = 0
+        self.Releases = 0
+        self.Collected = 0
+        self.Evictions = 0
+        self.Waits = 0
+        self.HighWaterBytes = self.AllocatedBytes
+        self.HighWaterLeasedBytes = self.LeasedBytes
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "leases": self.Leases,
+                "hits": self.Hits,
+                "hit_rate": self.Hits / self.Leases if self.Leases else 0.0,
+                "allocations": self.Allocations,
+                "releases": self.Releases,
+                "collected": self.Collected,
+                "evictions": self.Evictions,
+                "waits": self.Waits,
+                "allocated_bytes": self.AllocatedBytes,
+                "leased_bytes": self.LeasedBytes,
+                "free_bytes": self.AllocatedBytes - self.LeasedBytes,
+                "high_water_bytes": self.HighWaterBytes,
+                "high_water_leased_bytes": self.HighWaterLeasedBytes,
+                "leased": len(self._leased),
+                "free": {size: len(blocks) for size, blocks in sorted(self._free.items()) if blocks},
+            }
+
+    #region Lease
+    def lease(self, ctype, length: int, timeout=0.0, zero=False):
+        """
+        ctypes array of length items of ctype from the pool
+
+        timeout: seconds to wait for a release when the lease does not fit under max_bytes, None waits forever
+        zero: clear the memory (reused blocks hold old data)
+        """
+        nbytes = sizeof(ctype) * length
+        size = size_class(nbytes)
+
+        with self._cond:
+            self._reap()
+            self.Leases += 1
+            block = self._take(size, timeout)
+            self.LeasedBytes += size
+            self.HighWaterLeasedBytes = max(self.HighWaterLeasedBytes, self.LeasedBytes)
+
+            array = (ctype * length).from_buffer(block)
+            token = next(_tokens)
+            array._poolToken = token
+            # an array dropped without release() returns its block when collected
+            finalizer = weakref.finalize(array, self._collect, token)
+            self._leased[token] = (block, finalizer)
+
+        if zero:
+            memset(array, 0, nbytes)
+        return array
+
+    def release(self, array):
+        """Return a leased array's memory to the pool. The array must not be used afterwards."""
+        with self._cond:
+            self._reap()
+            entry = self._leased.pop(getattr(array, "_poolToken", None), None)
+            if entry is None:
+                raise ValueError("Buffer was not leased from this pool")
+            block, finalizer = entry
+            finalizer.detach()
+            self.Releases += 1
+            self._give(block)
+
+    @contextmanager
+    def leased(self, ctype, length: int, timeout=0.0, zero=False):
+        array = self.lease(ctype, length, timeout, zero)
+        try:
+            yield array
+        finally:
+            self.release(array)
+
+    def owns(self, array) -> bool:
+        with self._cond:
+            return getattr(array, "_poolToken", None) in self._leased
+    #endregion
+
+    def trim(self):
+        """Free every unleased block."""
+        with self._cond:
+            for size, blocks in self._free.items():
+                self.AllocatedBytes -= size * len(blocks)
+                blocks.clear()
+            # leases waiting for room under max_bytes can allocate now
+            self._cond.notify_all()
+
+    def _take(self, size, timeout):
+        free = self._free.get(size)
+        if free:
+            self.Hits += 1
+            return free.pop()
+
+        if self.MaxBytes is not None and size > self.MaxBytes:
+            raise PoolExhausted(f"{size} byte buffer exceeds the pool cap of {self.MaxBytes} bytes")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.MaxBytes is not None and self.AllocatedBytes + size > self.MaxBytes:
+            if self._evict(size):
+                continue
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise PoolExhausted(f"{size} byte buffer does not fit: {self.LeasedBytes} of {self.MaxBytes} bytes leased")
+            self.Waits += 1
+            self._cond.wait(remaining)
+            self._reap()
+            free = self._free.get(size)
+            if free:
+                self.Hits += 1
+                return free.pop()
+
+        self.Allocations += 1
+        self.AllocatedBytes += size
+        self.HighWaterBytes = max(self.HighWaterBytes, self.AllocatedBytes)
+        return (c_char * size)()
+
+    def _evict(self, size):
+        """Free one unleased block of another class, False when there is none"""
+        for other, blocks in self._free.items():
+            if blocks and other != size:
+                blocks.pop()
+                self.AllocatedBytes -= other
+                self.Evictions += 1
+                return True
+        return False
+
+    def _give(self, block):
+        size = sizeof(block)
+        self.LeasedBytes -= size
+        free = self._free.setdefault(size, [])
+        if len(free) < self.MaxFreePerClass:
+            free.append(block)
+        else:
+            self.AllocatedBytes -= size
+        self._cond.notify_all()
+
+    def _collect(self, token):
+        # runs wherever the array is freed, possibly inside a pool method on this thread: never block on the lock
+        self._collected.append(token)
+        if self._cond.acquire(False):
+            try:
+                self._reap()
+            finally:
+                self._cond.release()
+
+    def _reap(self):
+        while self._collected:
+            entry = self._leased.pop(self._collected.pop(), None)
+            if entry is not None:
+                self.Collected += 1
+                self._give(entry[0])
+
+
+# Pool shared by the device classes
+bufferPool = BufferPool()
@@ -0,0 +1,412 @@
+"""
+   Chunked, compressed archive of capture data.
+
+   Samples are appended as they arrive and collected into fixed-size chunks
+   (only the last chunk of a capture is shorter). Each chunk is compressed
+   with zlib on a thread pool (zlib releases the GIL) and written in order by
+   a writer thread, so append() only copies the samples and returns: a
+   streaming capture loop is never held up by compression or disk I/O. An
+   index of every chunk's sample range and file offset is written when the
+   archive is closed, so any sample or time range is read back by
+   decompressing only the chunks that cover it.
+
+   An archive holds any number of captures (streams), each with its own
+   sample format and metadata (rate, ranges, channels, serial, ...).
+
+       archive = CaptureArchive("run.dwfcap")
+       stream = archive.begin_capture(scope_metadata(ad3, 0))
+       with scope_pipeline(ad3, archive.writer(stream), channel=0):
+           time.sleep(10)
+       archive.close()
+
+       reader = ArchiveReader("run.dwfcap")
+       samples = reader.read_time(stream, 2.5, 2.6)
+
+   File format: b"DWFCAP1\\n", then records with header
+   <c (type) I (capture) Q (first sample) I (sample count) I (payload length)
+   followed by the payload: b"M" JSON metadata of a capture, b"C" a zlib
+   compressed chunk. A closed archive ends with the JSON index and the
+   trailer <Q (index offset) 8s (b"DWFIDX1\\n"); archives that were not closed
+   are recovered by scanning the records.
+"""
+
+import bisect
+import json
+import math
+import queue
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from event_log import eventLog
+
+MAGIC = b"DWFCAP1\n"
+INDEX_MAGIC = b"DWFIDX1\n"
+_RECORD = struct.Struct("<cIQII")
+_TRAILER = struct.Struct("<Q8s")
+_METADATA = b"M"
+_CHUNK = b"C"
+
+
+def _format(samples) -> str:
+    """struct format character of a buffer's items, without byte order"""
+    return memoryview(samples).format.lstrip("<>=@!")
+
+
+def scope_metadata(ad3, channel) -> dict:
+    """Metadata of a scope channel as configured with configure_scope_single/configure_trigger."""
+    ai = ad3.AI
+    rate = ai._samplingFrequency
+    return {
+        "device": type(ad3).__name__,
+        "serial": ad3.SerialNumber,
+        "instrument": "AnalogIn",
+        "channel": channel,
+        "range": ai._channelRanges.get(channel),
+        "rate": rate,
+        "samples": ai._numSamples,
+        # time of the first sample relative to the trigger
+        "start": ai._triggerPosition - ai._numSamples / 2 / rate,
+    }
+
+
+# Digital Discovery pins in sample bit order per DigitalIn sample format
+RECORD_CHANNELS = {
+    8: [f"DIO{pin}" for pin in range(24, 32)],
+    16: [f"DIO{pin}" for pin in range(24, 40)],
+    32: [f"DIO{pin}" for pin in range(24, 40)] + [f"DIN{pin}" for pin in range(16)],
+}
+
+
+def record_metadata(dd, sample_rate, sample_format=16) -> dict:
+    """Metadata of a DigitalDiscovery.configureDI_and_DAQ recording; channels lists the pin of each sample bit."""
+    return {
+        "device": type(dd).__name__,
+        "serial": dd.SerialNumber,
+        "instrument": "DigitalIn",
+        "channels": RECORD_CHANNELS[sample_format],
+        "rate": sample_rate,
+        "sample_format": sample_format,
+        "start": 0.0,
+    }
+
+
+class CaptureArchive():
+    """
+    path: archive file, overwritten
+    chunk_samples: samples per compressed chunk, the granularity of random access
+    level: zlib compression level, 1 keeps up with fast streams
+    workers: compression threads
+    max_pending: chunks queued for compression/writing before append() blocks
+    """
+    def __init__(self, path, chunk_samples=1 << 16, level=1, workers=2, max_pending=64):
+        self.Path = path
+        self.ChunkSamples = chunk_samples
+        self.Level = level
+
+        self._file = open(path, "wb", buffering=1 << 20)
+        self._file.write(MAGIC)
+        self._captures = {}
+        self._tails = {}        # capture id -> [samples not yet in a chunk, index of the first one]
+        self._lock = threading.Lock()
+        self._appendLock = threading.Lock()
+        self._error = None
+        self._closed = False
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CaptureArchiveZlib")
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._writer = threading.Thread(target=self._write_loop, name="CaptureArchiveWriter", daemon=True)
+        self._writer.start()
+
+        self.RawBytes = 0
+        self.CompressedBytes = 0
+        self.Chunks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #region Captures
+    def begin_capture(self, metadata=None, format=None) -> int:
+        """
+        Start a new capture stream, returns its id.
+
+        metadata: JSON serializable dict, "rate" and "start" (seconds of the first sample) enable read_time
+        format: struct format of the samples ("d", "B", "H", "I", ...), default taken from the first append
+        """
+        self._check()
+        with self._lock:
+            captureId = len(self._captures)
+            self._captures[captureId] = {"metadata": dict(metadata or {}), "format": format, "samples": 0, "chunks": []}
+        if metadata or format is not None:
+            self._pending.put((_METADATA, captureId, None))
+        return captureId
+
+    def update_metadata(self, capture_id, **metadata):
+        """Add metadata only known after the capture (lost samples, actual rate, ...)."""
+        self._check()
+        with self._lock:
+            self._captures[capture_id]["metadata"].update(metadata)
+        self._pending.put((_METADATA, capture_id, None))
+
+    def append(self, capture_id, samples, count=None) -> int:
+        """
+        Queue samples (ctypes array or any buffer) for compression and writing. The samples are copied,
+        so the buffer can be reused as soon as append returns. Returns the index of the first appended sample.
+        Samples are held until a chunk is full; end_capture() or close() writes the last partial chunk.
+
+        count: number of samples to take from the start of the buffer, default all
+        """
+        self._check()
+        view = memoryview(samples)
+        itemsize = view.itemsize
+        view = view.cast("B") if view.format != "B" else view
+        if count is not None:
+            view = view[:count * itemsize]
+        chunkBytes = self.ChunkSamples * itemsize
+
+        with self._appendLock:
+            with self._lock:
+                capture = self._captures[capture_id]
+                formatSet = capture["format"] is None
+                if formatSet:
+                    capture["format"] = _format(samples)
+                first = capture["samples"]
+                capture["samples"] += len(view) // itemsize
+            if formatSet:
+                # a metadata record written before this append has no format, an archive recovered
+                # without its index takes the format from this one
+                self._pending.put((_METADATA, capture_id, None))
+
+            tail = self._tails.setdefault(capture_id, [bytearray(), first])
+            offset = 0
+            if tail[0]:
+                offset = min(len(view), chunkBytes - len(tail[0]))
+                tail[0] += view[:offset]
+                if len(tail[0]) == chunkBytes:
+                    self._queue_chunk(capture_id, tail, bytes(tail[0]), itemsize)
+            # whole chunks straight from the caller's buffer, one copy each
+            while len(view) - offset >= chunkBytes:
+                self._queue_chunk(capture_id, tail, bytes(view[offset:offset + chunkBytes]), itemsize)
+                offset += chunkBytes
+            tail[0] += view[offset:]
+        return first
+
+    def end_capture(self, capture_id):
+        """Write the partial chunk held for a capture."""
+        self._check()
+        with self._appendLock:
+            tail = self._tails.pop(capture_id, None)
+            if tail is not None and tail[0]:
+                with self._lock:
+                    itemsize = struct.calcsize(self._captures[capture_id]["format"])
+                self._queue_chunk(capture_id, tail, bytes(tail[0]), itemsize)
+
+    def _queue_chunk(self, capture_id, tail, data, itemsize):
+        count = len(data) // itemsize
+        future = self._pool.submit(zlib.compress, data, self.Level)
+        self._pending.put((_CHUNK, capture_id, (tail[1], count, len(data), future)))
+        tail[0] = bytearray()
+        tail[1] += count
+
+    def writer(self, capture_id):
+        """process(buffer) for AcquisitionPipeline that appends every capture to the stream."""
+        return lambda buffer: self.append(capture_id, buffer)
+    #endregion
+
+    def close(self):
+        """Wait for queued chunks, write the index and close the file."""
+        if self._closed:
+            return
+        if self._error is None:
+            for captureId in list(self._tails):
+                self.end_capture(captureId)
+        self._closed = True
+        self._pending.put(None)
+        self._writer.join()
+        self._pool.shutdown()
+
+        try:
+            if self._error is None:
+                indexOffset = self._file.tell()
+                self._file.write(json.dumps({"captures": self._captures}).encode())
+                self._file.write(_TRAILER.pack(indexOffset, INDEX_MAGIC))
+        finally:
+            self._file.close()
+
+        eventLog.info("Capture archive %s: %d chunks, %d -> %d bytes", self.Path, self.Chunks, self.RawBytes, self.CompressedBytes)
+        if self._error is not None:
+            raise self._error
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.Chunks,
+            "raw_bytes": self.RawBytes,
+            "compressed_bytes": self.CompressedBytes,
+            "ratio": self.RawBytes / self.CompressedBytes if self.CompressedBytes else 0.0,
+            "pending": self._pending.qsize(),
+        }
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError("Capture archive is closed")
+
+    def _write_loop(self):
+        f = self._file
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+
+            kind, captureId, chunk = item
+            try:
+                if kind == _METADATA:
+                    with self._lock:
+                        capture = self._captures[captureId]
+                        payload = json.dumps({"metadata": capture["metadata"], "format": capture["format"]}).encode()
+                    f.write(_RECORD.pack(_METADATA, captureId, 0, 0, len(payload)))
+                    f.write(payload)
+                    continue
+
+                first, count, rawLength, future = chunk
+                payload = future.result()
+                offset = f.tell()
+                f.write(_RECORD.pack(_CHUNK, captureId, first, count, len(payload)))
+                f.write(payload)
+            except Exception as e:
+                eventLog.error("Capture archive write failed: %s", e)
+                self._error = e
+                continue
+
+            with self._lock:
+                self._captures[captureId]["chunks"].append([offset, first, count, len(payload)])
+            self.Chunks += 1
+            self.RawBytes += rawLength
+            self.CompressedBytes += len(payload)
+
+
+class ArchiveReader():
+    """Random access to the captures of a CaptureArchive file."""
+    def __init__(self, path):
+        self.Path = path
+        self._file = open(path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a capture archive")
+
+        self._captures = self._load_index()
+        if self._captures is None:
+            eventLog.warning("Capture archive %s has no index, scanning records", path)
+            self._captures = self._scan()
+        for capture in self._captures.values():
+            capture["chunks"].sort(key=lambda chunk: chunk[1])
+            capture["firsts"] = [chunk[1] for chunk in capture["chunks"]]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _load_index(self):
+        f = self._file
+        end = f.seek(0, 2)
+        if end < len(MAGIC) + _TRAILER.size:
+            return None
+        f.seek(end - _TRAILER.size)
+        indexOffset, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != INDEX_MAGIC:
+            return None
+        f.seek(indexOffset)
+        index = json.loads(f.read(end - _TRAILER.size - indexOffset))
+        return {int(captureId): capture for captureId, capture in index["captures"].items()}
+
+    def _scan(self):
+        f = self._file
+        size = f.seek(0, 2)
+        f.seek(len(MAGIC))
+        captures = {}
+        while True:
+            offset = f.tell()
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                break
+            kind, captureId, first, count, length = _RECORD.unpack(header)
+            capture = captures.setdefault(captureId, {"metadata": {}, "format": None, "samples": 0, "chunks": []})
+            if kind == _METADATA:
+                payload = f.read(length)
+                if len(payload) < length:
+                    break
+                record = json.loads(payload)
+                capture["metadata"] = record["metadata"]
+                capture["format"] = capture["format"] or record["format"]
+                continue
+
+            if offset + _RECORD.size + length > size:
+                # chunk cut short when the writer stopped
+                break
+            f.seek(length, 1)
+            capture["chunks"].append([offset, first, count, length])
+            capture["samples"] = max(capture["samples"], first + count)
+        return captures
+
+    #region Captures
+    def captures(self) -> dict:
+        """capture id -> metadata"""
+        return {captureId: capture["metadata"] for captureId, capture in self._captures.items()}
+
+    def metadata(self, capture_id) -> dict:
+        return self._captures[capture_id]["metadata"]
+
+    def samples(self, capture_id) -> int:
+        return self._captures[capture_id]["samples"]
+    #endregion
+
+    def read(self, capture_id, start=0, stop=None) -> memoryview:
+        """Samples start..stop of a capture, as a memoryview of the capture's format."""
+        capture = self._captures[capture_id]
+        format = capture["format"] or "B"
+        itemsize = struct.calcsize(format)
+        total = capture["samples"]
+        stop = total if stop is None else min(stop, total)
+        start = max(0, start)
+        if stop <= start:
+            return memoryview(b"").cast("B").cast(format)
+
+        chunks = capture["chunks"]
+        i = max(0, bisect.bisect_right(capture["firsts"], start) - 1)
+        out = bytearray((stop - start) * itemsize)
+        f = self._file
+        while i < len(chunks) and chunks[i][1] < stop:
+            offset, first, count, length = chunks[i]
+            i += 1
+            if first + count <= start:
+                continue
+            f.seek(offset + _RECORD.size)
+            data = zlib.decompress(f.read(length))
+            lo = max(start, first)
+            hi = min(stop, first + count)
+            out[(lo - start) * itemsize:(hi - start) * itemsize] = data[(lo - first) * itemsize:(hi - first) * itemsize]
+
+        return memoryview(out).cast(format)
+
+    def read_time(self, capture_id, t0, t1) -> memoryview:
+        """Samples with times in [t0, t1) seconds, using the capture's "rate" and "start" metadata."""
+        metadata = self._captures[capture_id]["metadata"]
+        rate = metadata["rate"]
+        start = metadata.get("start", 0.0)
+        return self.read(capture_id, math.ceil((t0 - start) * rate), math.ceil((t1 - start) * rate))
+
+    def time_of(self, capture_id, index) -> float:
+        metadata = self._captures[capture_id]["metadata"]
+        return metadata.get("start", 0.0) + index / metadata["rate"]
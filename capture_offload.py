@@ -0,0 +1,153 @@
+"""
+   Process-pool offload for capture post-processing.
+
+   Analysis of large captures holds the GIL and stalls device polling on the
+   capture thread. CaptureOffload runs analysis functions in worker processes;
+   the samples are handed over in multiprocessing.shared_memory blocks, so
+   only the block name and a few arguments are pickled.
+
+   Capture straight into shared memory (no copy at all):
+       offload = CaptureOffload()
+       buffer = offload.allocate(c_double, 16384)
+       ad3.AI.scope_capture_1ch_single(0, buffer)
+       future = offload.submit("run42/ch0", analyze, buffer)
+       ...
+       offload.free(buffer)
+
+   Or submit any ctypes array; it is copied once into a block that is
+   released when the job finishes.
+
+   func is called in the worker as func(samples, *args, **kwargs) where samples
+   is a memoryview of the block with the array's element format. It must be a
+   module level function so the pool can pickle it, and must not keep the view.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ctypes import *
+from multiprocessing import shared_memory
+import struct
+import threading
+
+from event_log import eventLog
+
+
+def _attach(name):
+    # Workers share the submitting process's resource tracker, which keeps one entry per block
+    # name, so attaching here adds nothing and the block stays owned by the submitter
+    return shared_memory.SharedMemory(name=name)
+
+
+def _run(func, name, format, length, args, kwargs):
+    shm = _attach(name)
+    samples = shm.buf[:length * struct.calcsize(format)].cast(format)
+    try:
+        return func(samples, *args, **kwargs)
+    finally:
+        samples.release()
+        shm.close()
+
+
+def _format(array):
+    return memoryview(array).format.lstrip("<>=@!")
+
+
+class CaptureOffload():
+    """
+    Runs capture analysis in a process pool, results come back as futures keyed by capture id.
+
+    max_workers: pool size, defaults to the number of CPUs
+    """
+    def __init__(self, max_workers=None):
+        self._pool = ProcessPoolExecutor(max_workers=max_workers)
+        self._owned = {}       # block name -> SharedMemory for blocks from allocate()
+        self._lock = threading.Lock()
+
+        self.Futures = {}      # capture id -> Future, until collected by result() or as_completed()
+
+    #region Shared buffers
+    def allocate(self, ctype, length):
+        """A ctypes array of length ctype elements backed by shared memory, usable as a capture buffer."""
+        size = sizeof(ctype) * length
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        # map the array by address rather than through a buffer export, then let the array own the
+        # block so the mapping is closed when the array is collected and not before
+        array = (ctype * length).from_address(addressof(c_char.from_buffer(shm.buf)))
+        array._shm = shm
+        with self._lock:
+            self._owned[shm.name] = shm
+
+        return array
+
+    def free(self, array):
+        """Release a buffer from allocate(). Jobs using it must have finished; the array stays valid in this process until dropped."""
+        shm = getattr(array, "_shm", None)
+        with self._lock:
+            if shm is None or self._owned.pop(shm.name, None) is None:
+                return
+
+        shm.unlink()
+    #endregion
+
+    def submit(self, capture_id, func, samples, *args, **kwargs):
+        """Queue func(samples, *args, **kwargs) in the pool. Returns a Future, also kept in Futures[capture_id]."""
+        shm = getattr(samples, "_shm", None)
+
+        temporary = shm is None
+        if temporary:
+            view = memoryview(samples).cast("B")
+            shm = shared_memory.SharedMemory(create=True, size=max(view.nbytes, 1))
+            shm.buf[:view.nbytes] = view
+
+        future = self._pool.submit(_run, func, shm.name, _format(samples), len(samples), args, kwargs)
+        future.CaptureId = capture_id
+
+        if temporary:
+            def release(future, shm=shm):
+                shm.close()
+                shm.unlink()
+            future.add_done_callback(release)
+
+        def report(future):
+            if not future.cancelled() and future.exception() is not None:
+                eventLog.error("Analysis of capture %s failed: %s", capture_id, future.exception())
+        future.add_done_callback(report)
+
+        with self._lock:
+            self.Futures[capture_id] = future
+        return future
+
+    def result(self, capture_id, timeout=None):
+        """Wait for the job of capture_id and return its result, the future is dropped from Futures."""
+        with self._lock:
+            future = self.Futures[capture_id]
+        result = future.result(timeout)
+        self._forget(future)
+        return result
+
+    def as_completed(self, timeout=None):
+        """Yield (capture_id, future) as jobs finish, each is dropped from Futures once yielded."""
+        with self._lock:
+            futures = list(self.Futures.values())
+        for future in as_completed(futures, timeout):
+            self._forget(future)
+            yield future.CaptureId, future
+
+    def _forget(self, future):
+        # a newer job may have been submitted under the same capture id, keep that one
+        with self._lock:
+            if self.Futures.get(future.CaptureId) is future:
+                del self.Futures[future.CaptureId]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait)
+        with self._lock:
+            owned = list(self._owned.values())
+            self._owned.clear()
+        for shm in owned:
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
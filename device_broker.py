@@ -0,0 +1,438 @@
+"""
+   Long-lived local broker that owns open Digilent devices.
+
+   Opening a device takes seconds, so a test sequencer that spawns a process
+   per DUT should not open the instrument itself. The broker keeps every
+   BaseDigilentDevice it has opened and serves capture/DIO/I2C calls over a
+   Unix socket. Captures are recorded straight into shared memory blocks
+   passed as the capture buffer, so the client maps the samples without any
+   copy or unpickling.
+
+   Run the broker:
+       python device_broker.py --socket /tmp/dwf_broker.sock
+
+   Use it from a DUT process:
+       client = BrokerClient("/tmp/dwf_broker.sock")
+       ad3 = client.device("SN:210321B0F505", "AnalogDiscovery3")
+       ad3.AI.configure_scope_single(0, 1e6)
+       with ad3.AI.scope_capture_1ch_single(0) as samples:
+           print(samples.data[0])
+"""
+
+import inspect
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from ctypes import Array, addressof, c_char, c_double, sizeof
+from multiprocessing import shared_memory
+
+from event_log import eventLog
+
+_HEADER = struct.Struct("<I")
+
+# Callable targets per device class. Anything else is rejected.
+ALLOWED_TARGETS = {
+    "AnalogDiscovery3": {
+        "AI.configure_scope_single", "AI.scope_capture_1ch_single", "AI.scope_capture_2ch_single",
+        "AI.start_scope", "AI.stop_scope", "AI.read_single_scope_1ch", "AI.read_single_scope_2ch",
+        "AO.generate_pattern_fgen", "AO.disable_fgen",
+        "I2C.Configure", "I2C.Reset", "I2C.Clear", "I2C.Write", "I2C.Read", "I2C.FindDevices",
+    },
+    "DigitalDiscovery": {
+        "configureDO_clock", "configureDI_and_DAQ",
+        "initialize_dio_pins", "read_dio_status", "stop_running_processes", "set_relay_pin",
+    },
+}
+
+# DigitalDiscovery DIO helpers are classmethods that take (hdwf, dwf) first, the broker supplies them
+_HANDLE_TARGETS = {"initialize_dio_pins", "read_dio_status", "stop_running_processes", "set_relay_pin"}
+
+
+def _record_type(arguments):
+    from digital_discovery import SAMPLE_TYPES
+    return SAMPLE_TYPES[arguments["sample_format"]]
+
+# Capture targets that accept a buffer argument: parameter -> ((ctype, length) per array) from the device
+# and the bound call arguments. The broker passes shared memory arrays there so results need no copy.
+_SHARED_BUFFERS = {
+    "AI.scope_capture_1ch_single": ("buffer", lambda device, a: [(c_double, device.AI._numSamples)]),
+    "AI.read_single_scope_1ch": ("buffer", lambda device, a: [(c_double, device.AI._numSamples)]),
+    "AI.scope_capture_2ch_single": ("buffers", lambda device, a: [(c_double, device.AI._numSamples)] * 2),
+    "AI.read_single_scope_2ch": ("buffers", lambda device, a: [(c_double, device.AI._numSamples)] * 2),
+    "configureDI_and_DAQ": ("buffer", lambda device, a: [(_record_type(a), int(a["samples_to_acquire"]))]),
+}
+
+
+class BrokerError(RuntimeError):
+    """The broker rejected a request or the call raised on the broker side."""
+
+
+#region Wire format
+def _send(sock, message):
+    body = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Broker connection closed")
+        received += n
+
+    return buffer
+
+
+def _recv(sock):
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+#endregion
+
+
+def _device_class(model):
+    if model == "AnalogDiscovery3":
+        from analog_discovery_3 import AnalogDiscovery3
+        return AnalogDiscovery3
+    if model == "DigitalDiscovery":
+        from digital_discovery import DigitalDiscovery
+        return DigitalDiscovery
+
+    raise BrokerError(f"Unknown device model: {model}")
+
+
+class DeviceBroker():
+    """
+    Owns open devices and serves calls on them over a Unix socket.
+
+    Calls to the same device are serialized; calls to different devices run
+    concurrently, one thread per client connection.
+    """
+    def __init__(self, socket_path):
+        self.SocketPath = socket_path
+
+        self._devices = {}           # serial -> (device, lock)
+        self._opening = {}           # serial -> lock held while that device is opened
+        self._devicesLock = threading.Lock()
+        self._buffers = {}           # shared memory name -> SharedMemory
+        self._buffersLock = threading.Lock()
+        self._server = None
+
+    #region Devices
+    def get_device(self, serial, model):
+        with self._devicesLock:
+            entry = self._devices.get(serial)
+            if entry is None:
+                opening = self._opening.setdefault(serial, threading.Lock())
+
+        if entry is None:
+            # opening takes seconds: only callers for this serial wait for it, not those of open devices
+            with opening:
+                with self._devicesLock:
+                    entry = self._devices.get(serial)
+                if entry is None:
+                    device = _device_class(model)()
+                    if not device.open_by_sn(serial):
+                        raise BrokerError(f"Failed to open device {serial}")
+                    with self._devicesLock:
+                        entry = self._devices[serial] = (device, threading.Lock())
+                        self._opening.pop(serial, None)
+                    eventLog.info("Broker opened %s %s", model, serial)
+
+        device, lock = entry
+        if type(device).__name__ != model:
+            raise BrokerError(f"Device {serial} is a {type(device).__name__}, not a {model}")
+
+        return device, lock
+
+    def call(self, serial, model, target, args, kwargs):
+        if target not in ALLOWED_TARGETS.get(model, ()):
+            raise BrokerError(f"Target not allowed: {model}.{target}")
+
+        device, lock = self.get_device(serial, model)
+
+        func = device
+        for part in target.split("."):
+            func = getattr(func, part)
+
+        if target in _HANDLE_TARGETS:
+            args = [device._hdwf, type(device)._dwf, *args]
+
+        with lock:
+            if target not in _SHARED_BUFFERS:
+                return func(*args, **kwargs)
+
+            parameter, arrays = _SHARED_BUFFERS[target]
+            bound = inspect.signature(func).bind(*args, **kwargs)
+            bound.apply_defaults()
+            if bound.arguments[parameter] is not None:
+                return func(*bound.args, **bound.kwargs)
+
+            buffers = [self._allocate(ctype, length) for ctype, length in arrays(device, bound.arguments)]
+            bound.arguments[parameter] = buffers[0] if parameter == "buffer" else buffers
+            try:
+                return func(*bound.args, **bound.kwargs)
+            except Exception:
+                for buffer in buffers:
+                    self.release_buffer(buffer._shm.name)
+                raise
+
+    def close_all(self):
+        with self._devicesLock:
+            for serial, (device, lock) in self._devices.items():
+                with lock:
+                    device.close()
+            self._devices.clear()
+    #endregion
+
+    #region Shared memory results
+    def _allocate(self, ctype, length):
+        """Capture buffer of length ctype elements in a new shared memory block, see CaptureOffload.allocate"""
+        shm = shared_memory.SharedMemory(create=True, size=max(sizeof(ctype) * length, 1))
+        array = (ctype * length).from_address(addressof(c_char.from_buffer(shm.buf)))
+        array._shm = shm
+        with self._buffersLock:
+            self._buffers[shm.name] = shm
+
+        return array
+
+    def _encode(self, value):
+        """Convert a call result to JSON, ctypes sample arrays not already in shared memory are copied there."""
+        if isinstance(value, Array):
+            view = memoryview(value)
+            shm = getattr(value, "_shm", None)
+            if shm is not None and shm.name in self._buffers:
+                return {"__shm__": shm.name, "format": view.format.lstrip("<>=@!"), "length": len(value)}
+
+            size = view.nbytes
+            shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            shm.buf[:size] = view.cast("B")
+            with self._buffersLock:
+                self._buffers[shm.name] = shm
+
+            return {"__shm__": shm.name, "format": view.format.lstrip("<>=@!"), "length": len(value)}
+
+        if hasattr(value, "_asdict"):
+            return {key: self._encode(val) for key, val in value._asdict().items()}
+        if isinstance(value, (list, tuple)):
+            return [self._encode(val) for val in value]
+        if isinstance(value, dict):
+            return {str(key): self._encode(val) for key, val in value.items()}
+        if hasattr(value, "value"):  # ctypes scalar
+            return value.value
+
+        return value
+
+    def release_buffer(self, name):
+        with self._buffersLock:
+            shm = self._buffers.pop(name, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+    #endregion
+
+    #region Server
+    def handle(self, request):
+        op = request.get("op")
+
+        if op == "call":
+            result = self.call(request["serial"], request["model"], request["target"],
+                               request.get("args", []), request.get("kwargs", {}))
+            return {"ok": True, "result": self._encode(result)}
+
+        if op == "attach":
+            device, lock = self.get_device(request["serial"], request["model"])
+            return {"ok": True, "result": {"serial": request["serial"], "model": type(device).__name__}}
+
+        if op == "release":
+            self.release_buffer(request["name"])
+            return {"ok": True, "result": None}
+
+        if op == "list":
+            with self._devicesLock:
+                devices = {serial: type(device).__name__ for serial, (device, lock) in self._devices.items()}
+            return {"ok": True, "result": devices}
+
+        raise BrokerError(f"Unknown op: {op}")
+
+    def serve_forever(self):
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                owned = []
+                try:
+                    while True:
+                        try:
+                            request = _recv(self.request)
+                        except ConnectionError:
+                            break
+
+                        try:
+                            response = broker.handle(request)
+                            owned.extend(_shm_names(response.get("result")))
+                        except Exception as e:
+                            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                        _send(self.request, response)
+                finally:
+                    # buffers the client never released die with its connection
+                    for name in owned:
+                        broker.release_buffer(name)
+
+        if os.path.exists(self.SocketPath):
+            os.unlink(self.SocketPath)
+
+        self._server = socketserver.ThreadingUnixStreamServer(self.SocketPath, Handler)
+        self._server.daemon_threads = True
+        eventLog.info("Broker listening on %s", self.SocketPath)
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.close_all()
+            if os.path.exists(self.SocketPath):
+                os.unlink(self.SocketPath)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+    #endregion
+
+
+def _shm_names(value):
+    if isinstance(value, dict):
+        if "__shm__" in value:
+            return [value["__shm__"]]
+        return [name for val in value.values() for name in _shm_names(val)]
+    if isinstance(value, list):
+        return [name for val in value for name in _shm_names(val)]
+
+    return []
+
+
+class SharedSamples():
+    """
+    Samples returned by the broker, mapped from shared memory without copying.
+
+    data: memoryview of the samples with the original element format ('d' for scope data, 'H' for 16 bit records)
+    Call release() (or use as a context manager) when done so the broker can free the block.
+    """
+    def __init__(self, client, name, format, length):
+        self._client = client
+        self.Name = name
+        self._shm = shared_memory.SharedMemory(name=name)
+        _untrack(self._shm)
+        self.data = self._shm.buf[:length * struct.calcsize(format)].cast(format)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def release(self):
+        if self._shm is None:
+            return
+        self.data.release()
+        self._shm.close()
+        self._shm = None
+        self._client._request({"op": "release", "name": self.Name})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _untrack(shm):
+    # The broker owns the block; without this the client's resource tracker would unlink it at exit
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class BrokerClient():
+    """Connection to a DeviceBroker. Cheap to create, one per DUT process."""
+    def __init__(self, socket_path):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self._lock = threading.Lock()
+
+    def _request(self, message):
+        with self._lock:
+            _send(self._sock, message)
+            response = _recv(self._sock)
+
+        if not response["ok"]:
+            raise BrokerError(response["error"])
+
+        return response["result"]
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if "__shm__" in value:
+                return SharedSamples(self, value["__shm__"], value["format"], value["length"])
+            return {key: self._decode(val) for key, val in value.items()}
+        if isinstance(value, list):
+            return [self._decode(val) for val in value]
+
+        return value
+
+    def call(self, serial, model, target, *args, **kwargs):
+        result = self._request({"op": "call", "serial": serial, "model": model, "target": target,
+                                "args": list(args), "kwargs": kwargs})
+        return self._decode(result)
+
+    def device(self, serial, model):
+        """Attach to a device (the broker opens it if needed) and return a proxy for its methods."""
+        self._request({"op": "attach", "serial": serial, "model": model})
+        return RemoteDevice(self, serial, model)
+
+    def devices(self) -> dict:
+        return self._request({"op": "list"})
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RemoteDevice():
+    """Attribute proxy: remote.AI.scope_capture_1ch_single(0) calls AI.scope_capture_1ch_single on the broker."""
+    def __init__(self, client, serial, model, path=""):
+        self._client = client
+        self._serial = serial
+        self._model = model
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        path = f"{self._path}.{name}" if self._path else name
+        return RemoteDevice(self._client, self._serial, self._model, path)
+
+    def __call__(self, *args, **kwargs):
+        return self._client.call(self._serial, self._model, self._path, *args, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Digilent device broker")
+    parser.add_argument("--socket", default="/tmp/dwf_broker.sock")
+    options = parser.parse_args()
+
+    DeviceBroker(options.socket).serve_forever()
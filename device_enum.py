@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import namedtuple
+from ctypes import *
+
+import dwf_enums as dwfe
+from base_digilent import BaseDigilentDevice
+from event_log import eventLog
+
+DeviceInfo = namedtuple("DeviceInfo", ["SerialNumber", "Index", "DeviceId", "DeviceVersion", "Name", "IsOpened"])
+
+# DWF device id -> device class name in this package
+MODELS = {
+    dwfe.devidDDiscovery: "DigitalDiscovery",
+    dwfe.devidDiscovery3: "AnalogDiscovery3",
+}
+
+
+def normalize_sn(sn: str) -> str:
+    """'sn:210321b0f505', 'SN:210321B0F505' and '210321B0F505' all map to the same key."""
+    sn = sn.strip()
+    if sn[:3].upper() == "SN:":
+        sn = sn[3:]
+    return sn.upper()
+
+
+class DeviceEnumerator():
+    """
+    Cached view of the devices reported by FDwfEnum, indexed by serial number.
+
+    refresh() runs one FDwfEnum scan and updates the cache in place; only
+    devices that were not seen before have their name read. With
+    start(interval) the scan repeats on a background thread and registered
+    callbacks get (added, removed) lists of DeviceInfo whenever the set of
+    devices changes.
+
+    Enumeration indices are only valid until the next FDwfEnum call, so hold
+    Lock while opening a device by the index from get().
+    """
+    def __init__(self, enum_filter=dwfe.enumfilterAll):
+        self._filter = enum_filter
+        self._devices = {}         # normalized serial -> DeviceInfo
+        self._names = {}           # normalized serial -> device name, read once per device
+        self._callbacks = []
+        self._thread = None
+        self._stop = threading.Event()
+        self.LastRefresh = None
+
+        self.Lock = threading.RLock()
+
+    @property
+    def _dwf(self):
+        return BaseDigilentDevice._dwf
+
+    def refresh(self):
+        """Scan once. Returns (added, removed) lists of DeviceInfo."""
+        dwf = self._dwf
+        cDevice = c_int()
+        devId = c_int()
+        devVer = c_int()
+        isOpened = c_int()
+        szSN = create_string_buffer(32)
+
+        with self.Lock:
+            dwf.FDwfEnum(self._filter, byref(cDevice))
+
+            devices = {}
+            for index in range(cDevice.value):
+                dwf.FDwfEnumSN(index, szSN)
+                dwf.FDwfEnumDeviceType(index, byref(devId), byref(devVer))
+                dwf.FDwfEnumDeviceIsOpened(index, byref(isOpened))
+
+                sn = normalize_sn(szSN.value.decode())
+                name = self._names.get(sn)
+                if name is None:
+                    szName = create_string_buffer(32)
+                    dwf.FDwfEnumDeviceName(index, szName)
+                    name = self._names[sn] = szName.value.decode()
+
+                devices[sn] = DeviceInfo(sn, index, devId.value, devVer.value, name, bool(isOpened.value))
+
+            added = [info for sn, info in devices.items() if sn not in self._devices]
+            removed = [info for sn, info in self._devices.items() if sn not in devices]
+            for info in removed:
+                self._names.pop(info.SerialNumber, None)
+
+            self._devices = devices
+            self.LastRefresh = time.monotonic()
+
+        if added or removed:
+            eventLog.info("Devices changed: added %s, removed %s",
+                          [info.SerialNumber for info in added], [info.SerialNumber for info in removed])
+            for callback in list(self._callbacks):
+                callback(added, removed)
+
+        return added, removed
+
+    def get(self, sn) -> DeviceInfo:
+        """Cached entry for a serial number, None if it was not seen in the last scan."""
+        return self._devices.get(normalize_sn(sn))
+
+    def set_opened(self, sn, opened=True):
+        """Update the cached open state after this process opened or closed the device."""
+        with self.Lock:
+            info = self.get(sn)
+            if info is not None:
+                self._devices[info.SerialNumber] = info._replace(IsOpened=opened)
+
+    def devices(self) -> list:
+        return list(self._devices.values())
+
+    def model(self, sn) -> str:
+        info = self.get(sn)
+        return None if info is None else MODELS.get(info.DeviceId)
+
+    def on_change(self, callback):
+        """Register callback(added, removed), called from the refresh thread."""
+        self._callbacks.append(callback)
+
+    #region Background refresh
+    def start(self, interval=2.0):
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="DeviceEnumerator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                eventLog.error("Device enumeration failed: %s", e)
+    #endregion
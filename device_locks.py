@@ -0,0 +1,144 @@
+"""
+   Locking model for sharing one device handle between threads.
+
+   Every instrument of a device (scope, wavegen, each protocol engine, ...) has
+   its own reentrant lock, taken for the whole sequence of DWF calls one
+   method makes, so configure/start/status sequences of one instrument are
+   never interleaved while different instruments run side by side: a thread
+   can update the wavegen or talk I2C while another waits on a scope capture.
+   Operations on the whole handle (close) take every lock.
+
+   Each lock counts acquisitions, contention, time spent waiting and time held.
+
+       ad3.Locks.stats()["AnalogIn"]["max_hold"]
+"""
+
+import functools
+import time
+import threading
+from contextlib import contextmanager
+
+# Instruments with independent state in the DWF API, one lock each
+SUBSYSTEMS = ("AnalogIn", "AnalogOut", "AnalogIO", "DigitalIn", "DigitalOut", "DigitalIO", "I2C", "SPI", "UART")
+
+
+class TimedLock():
+    """Reentrant lock that records how long it is waited for and held (outermost acquisition only)."""
+    def __init__(self, name):
+        self.Name = name
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._owner = None
+        self._acquiredAt = 0.0
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.Acquisitions = 0
+        self.Contended = 0
+        self.WaitTime = 0.0
+        self.HoldTime = 0.0
+        self.MaxHold = 0.0
+
+    def acquire(self):
+        if not self._lock.acquire(False):
+            t0 = time.perf_counter()
+            self._lock.acquire()
+            self.Contended += 1
+            self.WaitTime += time.perf_counter() - t0
+
+        self._depth += 1
+        if self._depth == 1:
+            self._owner = threading.get_ident()
+            self.Acquisitions += 1
+            self._acquiredAt = time.perf_counter()
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            held = time.perf_counter() - self._acquiredAt
+            self.HoldTime += held
+            if held > self.MaxHold:
+                self.MaxHold = held
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def released(self):
+        """Give up every level this thread holds for the block, e.g. to join a thread waiting for the lock"""
+        if self._owner != threading.get_ident():
+            yield
+            return
+
+        depth = self._depth
+        for _ in range(depth):
+            self.release()
+        try:
+            yield
+        finally:
+            for _ in range(depth):
+                self.acquire()
+
+    def stats(self) -> dict:
+        return {
+            "acquisitions": self.Acquisitions,
+            "contended": self.Contended,
+            "wait_time": self.WaitTime,
+            "hold_time": self.HoldTime,
+            "max_hold": self.MaxHold,
+            "mean_hold": self.HoldTime / self.Acquisitions if self.Acquisitions else 0.0,
+        }
+
+
+class DeviceLocks():
+    """One TimedLock per subsystem of a device handle."""
+    def __init__(self, subsystems=SUBSYSTEMS):
+        self._locks = {name: TimedLock(name) for name in subsystems}
+
+    def __getitem__(self, name) -> TimedLock:
+        return self._locks[name]
+
+    def all(self):
+        """Context manager holding every lock, for operations on the whole handle."""
+        return _AllLocks(list(self._locks.values()))
+
+    def stats(self) -> dict:
+        return {name: lock.stats() for name, lock in self._locks.items()}
+
+    def reset_stats(self):
+        for lock in self._locks.values():
+            lock.reset_stats()
+
+
+class _AllLocks():
+    def __init__(self, locks):
+        self._locks = locks
+
+    def __enter__(self):
+        # always the same order, so two whole-handle operations cannot deadlock
+        for lock in self._locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        for lock in reversed(self._locks):
+            lock.release()
+
+
+def locked(subsystem):
+    """Method decorator: hold the subsystem lock of the device (self, or self._ad3 for AD3 subsystems)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            device = getattr(self, "_ad3", self)
+            with device.Locks[subsystem]:
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
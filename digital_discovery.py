@@ -1,15 +1,27 @@
 from ctypes import *
+from collections import namedtuple
+import time
 from base_digilent import BaseDigilentDevice
-from dwfconstants import *
+import dwf_enums as dwfe
+from event_log import eventLog
+from device_locks import locked
+from buffer_pool import bufferPool
+
+# DigitalIn sample format (bits) -> sample type
+SAMPLE_TYPES = {8: c_uint8, 16: c_uint16, 32: c_uint32}
+
+# Outcome of the last configureDI_and_DAQ run: actual rate in Hz, sample format, lost and corrupted sample counts
+RecordStatus = namedtuple("RecordStatus", ["Rate", "SampleFormat", "Lost", "Corrupted", "Duration", "Aborted"])
 
 
 class DigitalDiscovery(BaseDigilentDevice):
     def __init__(self):
         super().__init__()
         self.model = "Digital Discovery"
+        self.LastRecord = None
 
-        ### Temporary 
-        self._dwf = type(self)._dwf
+        # record buffers not passed by the caller are leased from this pool (None allocates them)
+        self.Pool = bufferPool
         
 
 
@@ -27,98 +39,183 @@ class DigitalDiscovery(BaseDigilentDevice):
 
 
     # configure the Digital Out for clock generation
+    @locked("DigitalOut")
     def configureDO_clock(self, clock_rate, do_pin, duty_cycle=50):
         hzSys = c_double()
-        dividerGet = c_uint()
         self._dwf.FDwfDigitalOutInternalClockInfo(self._hdwf, byref(hzSys))
 
-        print(f'Clock rate: {clock_rate} Hz, internal clock: {hzSys.value} Hz')
+        eventLog.debug("Clock rate: %s Hz, internal clock: %s Hz", clock_rate, hzSys.value)
 
-        self._dwf.FDwfDigitalOutEnableSet(self._hdwf, c_int(do_pin), c_int(1))
-        self._dwf.FDwfDigitalOutDividerSet(self._hdwf, c_int(do_pin), c_int(int(hzSys.value/clock_rate/2)))
-        self._dwf.FDwfDigitalOutCounterSet(self._hdwf, c_int(do_pin), c_int(1), c_int(1))
+        divider = int(hzSys.value/clock_rate/2)
+        self._dwf.FDwfDigitalOutEnableSet(self._hdwf, do_pin, 1)
+        self._dwf.FDwfDigitalOutDividerSet(self._hdwf, do_pin, divider)
+        self._dwf.FDwfDigitalOutCounterSet(self._hdwf, do_pin, 1, 1)
         
-        print ("divider = "+str(int(hzSys.value/clock_rate/2)))
+        eventLog.debug("divider = %d", divider)
+
+    # configure the Digital In trigger, call before configureDI_and_DAQ
+    # source: dwfe.trigsrc*, DetectorDigitalIn for the pin detector below, or another instrument
+    #         (trigsrcAnalogIn, trigsrcExternal1..4, trigsrcNone to record immediately)
+    # pattern: {pin: 0 or 1} level condition, all pins must match (pins 24-39)
+    # edges: {pin: dwfe.DwfTriggerSlope*} edge condition, any pin edge triggers when the pattern matches
+    # auto_timeout: seconds to wait for a trigger before recording anyway, 0 waits forever
+    # The number of samples kept from before the trigger is the prefill argument of configureDI_and_DAQ.
+    # Digital In has no trigger holdoff; use the analog in or a counter in the detector if needed.
+    @locked("DigitalIn")
+    def configure_trigger(self, source=dwfe.trigsrcDetectorDigitalIn, pattern={}, edges={}, auto_timeout=0.0):
+        levelLow = levelHigh = edgeRise = edgeFall = 0
+
+        for pin, value in pattern.items():
+            if pin not in range(24, 40):
+                eventLog.error("Pin %d is not a valid pin number.", pin)
+                return False
+            if value:
+                levelHigh |= 1 << (pin - 24)
+            else:
+                levelLow |= 1 << (pin - 24)
+
+        for pin, slope in edges.items():
+            if pin not in range(24, 40):
+                eventLog.error("Pin %d is not a valid pin number.", pin)
+                return False
+            if slope in (dwfe.DwfTriggerSlopeRise, dwfe.DwfTriggerSlopeEither):
+                edgeRise |= 1 << (pin - 24)
+            if slope in (dwfe.DwfTriggerSlopeFall, dwfe.DwfTriggerSlopeEither):
+                edgeFall |= 1 << (pin - 24)
+
+        self._dwf.FDwfDigitalInTriggerSourceSet(self._hdwf, getattr(source, "value", source))
+        self._dwf.FDwfDigitalInTriggerAutoTimeoutSet(self._hdwf, auto_timeout)
+        self._dwf.FDwfDigitalInTriggerSet(self._hdwf, levelLow, levelHigh, edgeRise, edgeFall)
+
+        eventLog.debug("DigitalIn trigger: source %s, low %#06x high %#06x rise %#06x fall %#06x",
+                       source, levelLow, levelHigh, edgeRise, edgeFall)
+        return True
 
     # configure the  Digital Input for data acquisition
-    def configureDI_and_DAQ(self, digilent_dd_sample_rate, samples_to_acquire):
+    # buffer: optional array of samples_to_acquire to record into instead of leasing one from Pool;
+    #         a leased buffer goes back with Pool.release when the caller is done with it
+    # sample_format: bits per sample, 8 (DIO24:31), 16 (DIO24:39) or 32 (DIO24:39 + DIN0:15)
+    # on_status: called after every status poll as on_status(available, lost, corrupted); returning False
+    #            stops the recording early. Counters of the run are left in LastRecord.
+    # prefill: samples to keep from before the trigger set with configure_trigger, the rest are recorded after it
+    @locked("DigitalIn")
+    def configureDI_and_DAQ(self, digilent_dd_sample_rate, samples_to_acquire, buffer=None, sample_format=16, on_status=None, prefill=0):
         hzRecord = int(digilent_dd_sample_rate)
         nRecord = int(samples_to_acquire)
-        rgwRecord = (c_uint16*nRecord)()
+        if not 0 <= prefill <= nRecord:
+            raise ValueError(f"prefill must be between 0 and samples_to_acquire ({nRecord}), got {prefill}")
+        sampleType = SAMPLE_TYPES[sample_format]
+        nBytes = sizeof(sampleType)
+        pool = self.Pool
+        if buffer is not None:
+            rgwRecord = buffer
+        elif pool is not None:
+            # cleared like a new array: an aborted or short record leaves samples unfilled
+            rgwRecord = pool.lease(sampleType, nRecord, zero=True)
+        else:
+            rgwRecord = (sampleType*nRecord)()
         cAvailable = c_int()
         cLost = c_int()
         cCorrupted = c_int()
         iSample = 0
         fLost = 0
         fCorrupted = 0
+        nLost = 0
+        nCorrupted = 0
+        aborted = False
         hzDI = c_double()
         sts = c_ubyte()
 
-
-
+        # status arguments are passed by reference on every poll, build the references once
+        pSts = byref(sts)
+        pAvailable = byref(cAvailable)
+        pLost = byref(cLost)
+        pCorrupted = byref(cCorrupted)
+        dwf = self._dwf
+        hdwf = self._hdwf
+        done = dwfe.DwfStateDone
 
         self._dwf.FDwfDigitalInInternalClockInfo(self._hdwf, byref(hzDI))
-        print("DigitanIn base freq: "+str(hzDI.value))
+        eventLog.debug("DigitalIn base freq: %s", hzDI.value)
 
         # in record mode samples after trigger are acquired only
-        self._dwf.FDwfDigitalInAcquisitionModeSet(self._hdwf, acqmodeRecord)
+        self._dwf.FDwfDigitalInAcquisitionModeSet(self._hdwf, dwfe.acqmodeRecord)
         # sample rate = system frequency / divider
-        self._dwf.FDwfDigitalInDividerSet(self._hdwf, c_int(int(hzDI.value/hzRecord)))
-        # 16bit per sample format
-        self._dwf.FDwfDigitalInSampleFormatSet(self._hdwf, c_int(16))
-        #dwf.FDwfDigitalInSampleFormatSet(hdwf, c_int(32))
+        divider = max(1, int(hzDI.value/hzRecord))
+        self._dwf.FDwfDigitalInDividerSet(self._hdwf, divider)
+        # 8, 16 or 32 bit per sample format
+        self._dwf.FDwfDigitalInSampleFormatSet(self._hdwf, sample_format)
         # number of samples after trigger
-        self._dwf.FDwfDigitalInTriggerPositionSet(self._hdwf, c_int(int(nRecord)))
+        self._dwf.FDwfDigitalInTriggerPositionSet(self._hdwf, nRecord - int(prefill))
         # number of samples before trigger
-        #dwf.FDwfDigitalInTriggerPrefillSet(hdwf, c_int(int(nRecord*1/4)))
+        self._dwf.FDwfDigitalInTriggerPrefillSet(self._hdwf, int(prefill))
         # for Digital Discovery bit order: DIO24:39; with 32 bit sampling [DIO24:39 + DIN0:15]
-        self._dwf.FDwfDigitalInInputOrderSet(self._hdwf, c_int(0))
+        self._dwf.FDwfDigitalInInputOrderSet(self._hdwf, 0)
         # begin acquisition
-        self._dwf.FDwfDigitalInConfigure(self._hdwf, c_int(1), c_int(1))
+        self._dwf.FDwfDigitalInConfigure(self._hdwf, 1, 1)
 
-        print("Recording...")
+        eventLog.debug("Recording...")
+        tStart = time.perf_counter()
 
         while True:
-            self._dwf.FDwfDigitalInStatus(self._hdwf, c_int(1), byref(sts))
-            self._dwf.FDwfDigitalInStatusRecord(self._hdwf, byref(cAvailable), byref(cLost), byref(cCorrupted))
+            dwf.FDwfDigitalInStatus(hdwf, 1, pSts)
+            dwf.FDwfDigitalInStatusRecord(hdwf, pAvailable, pLost, pCorrupted)
             
             iSample += cLost.value
             iSample %= nRecord
             
             if cLost.value :
                 fLost = 1
+                nLost += cLost.value
             if cCorrupted.value :
                 fCorrupted = 1
+                nCorrupted += cCorrupted.value
 
             iBuffer = 0
-            while cAvailable.value>0:
-                cSamples = cAvailable.value
-                if iSample+cAvailable.value > nRecord: # we are using circular sample buffer, prevent overflow
+            available = cAvailable.value
+            while available>0:
+                cSamples = available
+                if iSample+available > nRecord: # we are using circular sample buffer, prevent overflow
                     cSamples = nRecord-iSample
-                self._dwf.FDwfDigitalInStatusData2(self._hdwf, byref(rgwRecord, 2*iSample), c_int(iBuffer), c_int(2*cSamples))
+                dwf.FDwfDigitalInStatusData2(hdwf, byref(rgwRecord, nBytes*iSample), iBuffer, nBytes*cSamples)
                 iBuffer += cSamples
-                cAvailable.value -= cSamples
+                available -= cSamples
                 iSample += cSamples
                 iSample %= nRecord
 
-            if sts.value == DwfStateDone.value :
+            if sts.value == done:
+                break
+
+            if on_status is not None and on_status(cAvailable.value, cLost.value, cCorrupted.value) is False:
+                dwf.FDwfDigitalInConfigure(hdwf, 0, 0)
+                aborted = True
                 break
 
+        elapsed = time.perf_counter() - tStart
+
+        # unroll the circular buffer in place, only the head is copied out
         if iSample != 0 :
-            rgwRecord = rgwRecord[iSample:]+rgwRecord[:iSample]
+            head = (sampleType*iSample)() if pool is None else pool.lease(sampleType, iSample)
+            memmove(head, rgwRecord, nBytes*iSample)
+            memmove(rgwRecord, byref(rgwRecord, nBytes*iSample), nBytes*(nRecord-iSample))
+            memmove(byref(rgwRecord, nBytes*(nRecord-iSample)), head, nBytes*iSample)
+            if pool is not None:
+                pool.release(head)
+
+        self.LastRecord = RecordStatus(hzDI.value/divider, sample_format, nLost, nCorrupted, elapsed, aborted)
 
-        print("  done")
+        eventLog.debug("Recording done")
         if fLost:
-            print("Samples were lost! Reduce sample rate")
+            eventLog.warning("Samples were lost! Reduce sample rate")
         if fCorrupted:
-            print("Samples could be corrupted! Reduce sample rate")
+            eventLog.warning("Samples could be corrupted! Reduce sample rate")
 
         return rgwRecord
 
     @classmethod
     def initialize_dio_pins(cls, hdwf, dwf, output_pins=[0,1,2,3], initial_values=[0,0,0,0]):
         if len(output_pins) != len(initial_values):
-            print("Error: The size of output_pins and initial_values arrays must be equal.")
+            eventLog.error("The size of output_pins and initial_values arrays must be equal.")
             return False
 
         # Translate the physical pin number to the correct DIO index
@@ -127,7 +224,7 @@ class DigitalDiscovery(BaseDigilentDevice):
         output_pin_index = []
         for pin in output_pins:
             if pin not in range(24, 40):
-                print(f"Error: Pin {pin} is not a valid pin number.")
+                eventLog.error("Pin %d is not a valid pin number.", pin)
                 return False
             pin = pin - 24
             output_pin_index.append(pin)
@@ -137,11 +234,11 @@ class DigitalDiscovery(BaseDigilentDevice):
             output_enable_mask = sum(1 << pin for pin in output_pin_index)
             
             # Set DD I/O pins
-            dwf.FDwfDigitalIOOutputEnableSet(hdwf, c_int(output_enable_mask))
-            print(f"Configured pins {output_pin_index} as output pins.")
+            dwf.FDwfDigitalIOOutputEnableSet(hdwf, output_enable_mask)
+            eventLog.debug("Configured pins %s as output pins.", output_pin_index)
             
             # Set DD pin initial values
-            current_mask = c_int()
+            current_mask = c_uint()
             dwf.FDwfDigitalIOOutputGet(hdwf, byref(current_mask))
             new_mask = current_mask.value
             for i in range(len(initial_values)):
@@ -151,7 +248,7 @@ class DigitalDiscovery(BaseDigilentDevice):
                 else:
                     # Set pin low
                     new_mask &= ~(1 << output_pin_index[i])
-            dwf.FDwfDigitalIOOutputSet(hdwf, c_int(new_mask))
+            dwf.FDwfDigitalIOOutputSet(hdwf, new_mask)
             
             # Enable the digital IO
             dwf.FDwfDigitalIOConfigure(hdwf)
@@ -159,14 +256,15 @@ class DigitalDiscovery(BaseDigilentDevice):
             results = []
             for i in range(len(initial_values)):
                 if (pin_status>>output_pins[i])&1 == initial_values[i]:
-                    print(f"Pin {output_pins[i]} initialized to {initial_values[i]}")
+                    eventLog.debug("Pin %d initialized to %d", output_pins[i], initial_values[i])
                     results.append(True)
                 else:
-                    print(f"Error: Pin {output_pins[i]} not initialized to {initial_values[i]}")
+                    eventLog.error("Pin %d not initialized to %d", output_pins[i], initial_values[i])
                     results.append(False)
             return True if all(results) else False
 
         except Exception as e:  
+            eventLog.error("Failed to initialize DIO pins: %s", e)
             return False
 
     @classmethod
@@ -180,16 +278,33 @@ class DigitalDiscovery(BaseDigilentDevice):
         #     "\nDIO-4:", (dwRead.value>>4)&1, "DIO-5:", (dwRead.value>>5)&1, "DIO-6:", (dwRead.value>>6)&1, "DIO-7:", (dwRead.value>>7)&1,
         #     "\nDIO-8:", (dwRead.value>>8)&1, "DIO-9:", (dwRead.value>>9)&1, "DIO-10:", (dwRead.value>>10)&1, "DIO-11:", (dwRead.value>>11)&1,
         #     "\nDIO-12:", (dwRead.value>>12)&1, "DIO-13:", (dwRead.value>>13)&1, "DIO-14:", (dwRead.value>>14)&1, "DIO-15:", (dwRead.value>>15)&1)
-        print("Digital I/O Status (binary):", bin(dwRead.value))
+        eventLog.debug("Digital I/O Status: %#010x", dwRead.value)
 
         return dwRead.value
 
+    # Watch DIO inputs for changes on a background thread instead of polling read_dio_status, see dio_watch.DioWatch
+    # pins: physical pins 24-39, None for all of them; debounce: seconds for all pins or {pin: seconds}
+    # The pin masks of the reported DioChange are DIO indexes, bit 0 is DIO-24.
+    def watch_dio(self, pins=None, interval=0.001, debounce=0.0, on_change=None, on_error=None):
+        from dio_watch import DioWatch
+
+        pins = range(24, 40) if pins is None else pins
+        for pin in list(pins) + (list(debounce) if isinstance(debounce, dict) else []):
+            if pin not in range(24, 40):
+                eventLog.error("Pin %d is not a valid pin number.", pin)
+                return None
+
+        # DIO indexing starts from 0 at DIO-24, see initialize_dio_pins
+        if isinstance(debounce, dict):
+            debounce = {pin - 24: seconds for pin, seconds in debounce.items()}
+        return DioWatch(self, [pin - 24 for pin in pins], interval, debounce, on_change, on_error).start()
+
     @classmethod
     def stop_running_processes(cls, hdwf, dwf):
         dwf.FDwfDigitalIOReset(hdwf)
         dwf.FDwfDigitalIOConfigure(hdwf)
 
-        print("All processes stopped.")
+        eventLog.info("All processes stopped.")
 
     @classmethod
     def set_relay_pin(cls, hdwf, dwf, relay_pin, state, output_pins=[0,1,2,3]):
@@ -199,7 +314,7 @@ class DigitalDiscovery(BaseDigilentDevice):
         output_pin_index = []
         for pin in output_pins:
             if pin not in range(24, 40):
-                print(f"Error: Pin {pin} is not a valid pin number.")
+                eventLog.error("Pin %d is not a valid pin number.", pin)
                 return False
             pin = pin - 24
             output_pin_index.append(pin)
@@ -213,7 +328,7 @@ class DigitalDiscovery(BaseDigilentDevice):
             # dwf.FDwfDigitalIOOutputEnableSet(hdwf, output_enable_mask)\
 
             # Get current IO status
-            current_mask = c_int()
+            current_mask = c_uint()
             dwf.FDwfDigitalIOOutputGet(hdwf, byref(current_mask))
             # dwf.FDwfDigitalIOInputStatus(hdwf, byref(current_mask))
             # print(f"current_mask: {current_mask.value}")
@@ -236,7 +351,7 @@ class DigitalDiscovery(BaseDigilentDevice):
                 new_mask &= ~(1 << relay_pin)
             
             # info = c_uint32()
-            dwf.FDwfDigitalIOOutputSet(hdwf, c_int(new_mask))
+            dwf.FDwfDigitalIOOutputSet(hdwf, new_mask)
             # dwf.FDwfDigitalIOOutputInfo(hdwf, byref(info))
             # dwf.FDwfDigitalIOOutputSet(hdwf, c_int(8000))
             dwf.FDwfDigitalIOConfigure(hdwf)
@@ -245,10 +360,11 @@ class DigitalDiscovery(BaseDigilentDevice):
                 # print(f"Pin {relay_pin} successfully set to {state}")
                 return True
             else:
-                print(f"Error: Pin {relay_pin} not set to {state} (current state: {(pin_status>>relay_pin)&1})")
+                eventLog.error("Pin %d not set to %d (current state: %d)", relay_pin, state, (pin_status>>relay_pin)&1)
                 return False
             
         except Exception as e:
+            eventLog.error("Failed to set relay pin: %s", e)
             return False
     
 if __name__ == "__main__":
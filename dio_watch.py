@@ -0,0 +1,233 @@
+"""
+   Change detection on the static digital I/O pins.
+
+   A background thread polls FDwfDigitalIOStatus/FDwfDigitalIOInputStatus at
+   a fixed interval and compares the pin word with the last one using bit
+   masks, so an unchanged poll costs two library calls and no Python objects.
+   Only changes are reported, with the time they were first seen, to
+   callbacks on the watch thread and to async iterators on an asyncio loop.
+
+   A pin with a debounce time reports a new level only after it has held it
+   for that long; shorter pulses are counted as bounces and dropped.
+
+       watch = DioWatch(dd, pins=[0, 1, 5], debounce={5: 0.01}, on_change=print).start()
+       ...
+       async for change in watch.changes():
+           if change.Falling & (1 << 5):
+               interlock_open()
+
+   Pins are the bit positions of FDwfDigitalIOInputStatus (DIO24 is bit 0 on
+   the Digital Discovery); DigitalDiscovery.watch_dio takes the physical pins
+   24-39 and translates them.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from ctypes import *
+
+from event_log import eventLog
+
+# Time: time.time() when the new level was first seen, Changed/Rising/Falling: pin masks, Value: all watched pins
+DioChange = namedtuple("DioChange", ["Time", "Changed", "Value", "Rising", "Falling"])
+
+
+def _mask(pins) -> int:
+    mask = 0
+    for pin in pins:
+        mask |= 1 << pin
+    return mask
+
+
+class DioWatch():
+    """
+    device: opened BaseDigilentDevice (AnalogDiscovery3, DigitalDiscovery)
+    pins: pins to watch, None watches all 32 bits
+    interval: seconds between polls, the worst case detection latency
+    debounce: seconds a new level has to be stable, one value for all pins or {pin: seconds}
+    on_change: on_change(DioChange), called on the watch thread
+    on_error: on_error(exception), called on the watch thread when a status call fails and the watch stops
+    """
+    def __init__(self, device, pins=None, interval=0.001, debounce=0.0, on_change=None, on_error=None):
+        self._device = device
+        self.Mask = 0xFFFFFFFF if pins is None else _mask(pins)
+        self.Interval = interval
+
+        if isinstance(debounce, dict):
+            self._debounce = {pin: seconds for pin, seconds in debounce.items() if seconds > 0}
+        else:
+            self._debounce = {pin: debounce for pin in range(32) if self.Mask >> pin & 1} if debounce > 0 else {}
+        self._debounceMask = _mask(self._debounce) & self.Mask
+
+        self._callbacks = [] if on_change is None else [on_change]
+        self._onError = on_error
+        self._subscribers = []      # (loop, asyncio.Queue) of running changes() iterators
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.Value = None
+        self.Error = None           # exception that stopped the watch thread, None while it runs
+        self.Polls = 0
+        self.Changes = 0
+        self.Bounces = 0
+
+    #region Lifecycle
+    def start(self):
+        if self._thread is not None:
+            return self
+
+        self._stop.clear()
+        self.Error = None
+        self.Value = self._read() & self.Mask
+        self._thread = threading.Thread(target=self._run, name="DioWatch", daemon=True)
+        self._thread.start()
+        eventLog.info("DIO watch started on %#010x, every %g s", self.Mask, self.Interval)
+        return self
+
+    def stop(self):
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self._thread = None
+        eventLog.info("DIO watch stopped: %d polls, %d changes, %d bounces", self.Polls, self.Changes, self.Bounces)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def Running(self) -> bool:
+        return self._thread is not None
+
+    def stats(self) -> dict:
+        return {"polls": self.Polls, "changes": self.Changes, "bounces": self.Bounces, "error": self.Error}
+    #endregion
+
+    #region Consumers
+    def add_callback(self, on_change):
+        with self._lock:
+            self._callbacks.append(on_change)
+
+    def remove_callback(self, on_change):
+        with self._lock:
+            self._callbacks.remove(on_change)
+
+    async def changes(self, max_queue=1024):
+        """Async iterator of DioChange on the running event loop; changes beyond max_queue unread are dropped."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        changes = asyncio.Queue(maxsize=max_queue)
+        subscriber = (loop, changes)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        try:
+            while True:
+                yield await changes.get()
+        finally:
+            with self._lock:
+                self._subscribers.remove(subscriber)
+    #endregion
+
+    def _read(self):
+        device = self._device
+        dwf = type(device)._dwf
+        word = c_uint32()
+        with device.Locks["DigitalIO"]:
+            dwf.FDwfDigitalIOStatus(device._hdwf)
+            dwf.FDwfDigitalIOInputStatus(device._hdwf, byref(word))
+        return word.value
+
+    def _run(self):
+        device = self._device
+        dwf = type(device)._dwf
+        hdwf = device._hdwf
+        lock = device.Locks["DigitalIO"]
+        word = c_uint32()
+        pWord = byref(word)
+        mask = self.Mask
+        debounceMask = self._debounceMask
+        debounce = self._debounce
+        interval = self.Interval
+
+        stable = self.Value
+        pending = {}        # pin -> (perf_counter, time) its new level was first seen
+
+        while not self._stop.wait(interval):
+            try:
+                with lock:
+                    dwf.FDwfDigitalIOStatus(hdwf)
+                    dwf.FDwfDigitalIOInputStatus(hdwf, pWord)
+            except Exception as e:
+                self._fail(e)
+                return
+
+            self.Polls += 1
+            raw = word.value & mask
+            diff = raw ^ stable
+            if not diff and not pending:
+                continue
+
+            now = time.perf_counter()
+            wall = time.time()
+            changed = diff & ~debounceMask
+            first = wall
+
+            if debounceMask:
+                # a pin back at its stable level before its debounce time ran out was a bounce
+                for pin in list(pending):
+                    if not diff >> pin & 1:
+                        del pending[pin]
+                        self.Bounces += 1
+                waiting = diff & debounceMask
+                while waiting:
+                    pin = (waiting & -waiting).bit_length() - 1
+                    waiting &= waiting - 1
+                    if pin not in pending:
+                        pending[pin] = (now, wall)
+                    t, seen = pending[pin]
+                    if now - t >= debounce[pin]:
+                        del pending[pin]
+                        changed |= 1 << pin
+                        first = min(first, seen)
+
+            if changed:
+                stable ^= changed
+                self.Value = stable
+                self._emit(DioChange(first, changed, stable, changed & stable, changed & ~stable))
+
+    def _fail(self, error):
+        # the watch is over: clear the thread so Running is False and start() can restart it
+        eventLog.error("DIO watch status failed: %s", error)
+        self.Error = error
+        self._thread = None
+        if self._onError is not None:
+            try:
+                self._onError(error)
+            except Exception as e:
+                eventLog.error("DIO watch error callback failed: %s", e)
+
+    def _emit(self, change):
+        self.Changes += 1
+        with self._lock:
+            callbacks = list(self._callbacks)
+            subscribers = list(self._subscribers)
+
+        for callback in callbacks:
+            try:
+                callback(change)
+            except Exception as e:
+                eventLog.error("DIO watch callback failed: %s", e)
+
+        for loop, changes in subscribers:
+            loop.call_soon_threadsafe(self._deliver, changes, change)
+
+    @staticmethod
+    def _deliver(changes, change):
+        if not changes.full():
+            changes.put_nowait(change)
@@ -0,0 +1,132 @@
+"""
+   Lazily resolved DWF constants.
+
+   Drop-in replacement for dwfconstants that does not create any ctypes
+   objects at import time. The legacy dwfconstants names resolve to plain
+   ints on first access; the same values are also available grouped into
+   IntEnum classes, which are only built when asked for by name:
+
+       import dwf_enums as dwfe
+       dwfe.acqmodeRecord          # 3
+       dwfe.AcqMode.Record         # <AcqMode.Record: 3>
+
+   Plain ints can be passed straight to the DWF library and compared with
+   status values without .value.
+"""
+
+# enum name: (legacy dwfconstants prefix, {member: value})
+_GROUPS = {
+    "EnumFilter": ("enumfilter", {"All": 0, "Type": 0x8000000, "USB": 0x0000001, "Network": 0x0000002, "AXI": 0x0000004,
+                                  "Remote": 0x1000000, "Audio": 0x2000000, "Demo": 0x4000000}),
+    "DevId": ("devid", {"EExplorer": 1, "Discovery": 2, "Discovery2": 3, "DDiscovery": 4, "ADP3X50": 6, "ADP5250": 8, "DPS3340": 9,
+                        "Discovery3": 10}),
+    "DevVer": ("devver", {"EExplorerC": 2, "EExplorerE": 4, "EExplorerF": 5, "DiscoveryA": 1, "DiscoveryB": 2, "DiscoveryC": 3}),
+    "TrigSrc": ("trigsrc", {"None": 0, "PC": 1, "DetectorAnalogIn": 2, "DetectorDigitalIn": 3, "AnalogIn": 4, "DigitalIn": 5,
+                            "DigitalOut": 6, "AnalogOut1": 7, "AnalogOut2": 8, "AnalogOut3": 9, "AnalogOut4": 10,
+                            "External1": 11, "External2": 12, "External3": 13, "External4": 14, "High": 15, "Low": 16, "Clock": 17}),
+    "DwfState": ("DwfState", {"Ready": 0, "Config": 4, "Prefill": 5, "Armed": 1, "Wait": 7, "Triggered": 3, "Running": 3,
+                              "NotDone": 6, "Done": 2}),
+    "EnumConfigInfo": ("DECI", {"AnalogInChannelCount": 1, "AnalogOutChannelCount": 2, "AnalogIOChannelCount": 3,
+                                "DigitalInChannelCount": 4, "DigitalOutChannelCount": 5, "DigitalIOChannelCount": 6,
+                                "AnalogInBufferSize": 7, "AnalogOutBufferSize": 8, "DigitalInBufferSize": 9, "DigitalOutBufferSize": 10}),
+    "AcqMode": ("acqmode", {"Single": 0, "ScanShift": 1, "ScanScreen": 2, "Record": 3, "Overs": 4, "Single1": 5}),
+    "Filter": ("filter", {"Decimate": 0, "Average": 1, "MinMax": 2}),
+    "TrigType": ("trigtype", {"Edge": 0, "Pulse": 1, "Transition": 2, "Window": 3}),
+    "TriggerSlope": ("DwfTriggerSlope", {"Rise": 0, "Fall": 1, "Either": 2}),
+    "TrigLen": ("triglen", {"Less": 0, "Timeout": 1, "More": 2}),
+    "Erc": ("dwferc", {"NoErc": 0, "UnknownError": 1, "ApiLockTimeout": 2, "AlreadyOpened": 3, "NotSupported": 4,
+                       "InvalidParameter0": 16, "InvalidParameter1": 17, "InvalidParameter2": 18, "InvalidParameter3": 19,
+                       "InvalidParameter4": 20}),
+    "Func": ("func", {"DC": 0, "Sine": 1, "Square": 2, "Triangle": 3, "RampUp": 4, "RampDown": 5, "Noise": 6, "Pulse": 7,
+                      "Trapezium": 8, "SinePower": 9, "CustomPattern": 28, "PlayPattern": 29, "Custom": 30, "Play": 31}),
+    "AnalogIO": ("analogio", {"Enable": 1, "Voltage": 2, "Current": 3, "Power": 4, "Temperature": 5, "Dmm": 6, "Range": 7,
+                              "Measure": 8, "Time": 9, "Frequency": 10, "Resistance": 11}),
+    "DmmMode": ("DwfDmm", {"Resistance": 1, "Continuity": 2, "Diode": 3, "DCVoltage": 4, "ACVoltage": 5, "DCCurrent": 6,
+                           "ACCurrent": 7, "DCLowCurrent": 8, "ACLowCurrent": 9, "Temperature": 10}),
+    "AnalogOutNode": ("AnalogOutNode", {"Carrier": 0, "FM": 1, "AM": 2}),
+    "AnalogOutIdle": ("DwfAnalogOutIdle", {"Disable": 0, "Offset": 1, "Initial": 2, "Hold": 3}),
+    "DigitalInClockSource": ("DwfDigitalInClockSource", {"Internal": 0, "External": 1}),
+    "DigitalInSampleMode": ("DwfDigitalInSampleMode", {"Simple": 0, "Noise": 1}),
+    "DigitalOutOutput": ("DwfDigitalOutOutput", {"PushPull": 0, "OpenDrain": 1, "OpenSource": 2, "ThreeState": 3}),
+    "DigitalOutType": ("DwfDigitalOutType", {"Pulse": 0, "Custom": 1, "Random": 2, "ROM": 3, "State": 4, "Play": 5}),
+    "DigitalOutIdle": ("DwfDigitalOutIdle", {"Init": 0, "Low": 1, "High": 2, "Zet": 3}),
+    "AnalogImpedance": ("DwfAnalogImpedance", {"Impedance": 0, "ImpedancePhase": 1, "Resistance": 2, "Reactance": 3,
+                                               "Admittance": 4, "AdmittancePhase": 5, "Conductance": 6, "Susceptance": 7,
+                                               "SeriesCapacitance": 8, "ParallelCapacitance": 9, "SeriesInductance": 10,
+                                               "ParallelInductance": 11, "Dissipation": 12, "Quality": 13, "Vrms": 14,
+                                               "Vreal": 15, "Vimag": 16, "Irms": 17, "Ireal": 18, "Iimag": 19}),
+    "Param": ("DwfParam", {"UsbPower": 2, "LedBrightness": 3, "OnClose": 4, "AudioOut": 5, "UsbLimit": 6, "AnalogOut": 7,
+                           "Frequency": 8, "ExtFreq": 9, "ClockMode": 10}),
+    "Window": ("DwfWindow", {"Rectangular": 0, "Triangular": 1, "Hamming": 2, "Hann": 3, "Cosine": 4, "BlackmanHarris": 5,
+                             "FlatTop": 6, "Kaiser": 7, "Blackman": 8}),
+    "AnalogCoupling": ("DwfAnalogCoupling", {"DC": 0, "AC": 1}),
+    "FiirType": ("DwfFiir", {"Window": 0, "Fir": 1, "IirButterworth": 2, "IirChebyshev": 3}),
+    "FiirPass": ("DwfFiir", {"LowPass": 0, "HighPass": 1, "BandPass": 2, "BandStop": 3}),
+    "FiirFilter": ("DwfFiir", {"Raw": 0, "Decimate": 1, "Average": 2}),
+
+    # obsolete
+    "Sts": ("sts", {"Rdy": 0, "Arm": 1, "Done": 2, "Trig": 3, "Cfg": 4, "Prefill": 5, "NotDone": 6, "TrigDly": 7, "Error": 8,
+                    "Busy": 9, "Stop": 10}),
+    "TrigCond": ("trigcond", {"RisingPositive": 0, "FallingNegative": 1}),
+}
+
+# legacy names that are not part of an enum group
+_SCALARS = {
+    "hdwfNone": 0,
+    # use device id
+    "enumfilterEExplorer": 1,
+    "enumfilterDiscovery": 2,
+    "enumfilterDiscovery2": 3,
+    "enumfilterDDiscovery": 4,
+}
+
+_flatIndex = None
+
+
+def _member_name(name):
+    import keyword
+
+    return name + "_" if keyword.iskeyword(name) else name
+
+
+def _build(groupName):
+    from enum import IntEnum
+
+    prefix, members = _GROUPS[groupName]
+    enum = IntEnum(groupName, [(_member_name(name), value) for name, value in members.items()], module=__name__)
+    globals()[groupName] = enum
+
+    return enum
+
+
+def _lookup_flat(name):
+    global _flatIndex
+    if _flatIndex is None:
+        _flatIndex = {
+            prefix + member: value
+            for prefix, members in _GROUPS.values()
+            for member, value in members.items()
+        }
+        _flatIndex.update(_SCALARS)
+
+    return _flatIndex[name]
+
+
+def __getattr__(name):
+    if name in _GROUPS:
+        return _build(name)
+
+    try:
+        value = _lookup_flat(name)
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    names = set(globals()) | set(_GROUPS) | set(_SCALARS)
+    names.update(prefix + member for prefix, members in _GROUPS.values() for member in members)
+
+    return sorted(names)
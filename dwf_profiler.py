@@ -0,0 +1,220 @@
+import math
+import threading
+import time
+from collections import deque
+from ctypes import Array, sizeof, c_int, _SimpleCData
+
+# Functions whose first argument is not a device handle
+_NO_HANDLE_PREFIXES = ("FDwfGet", "FDwfEnum", "FDwfDeviceOpen", "FDwfParam", "FDwfDeviceCloseAll")
+
+
+def _arg_size(arg):
+    """Number of bytes marshalled for a single argument."""
+    if isinstance(arg, (_SimpleCData, Array)):
+        return sizeof(arg)
+    obj = getattr(arg, "_obj", None)  # byref() result
+    if obj is not None:
+        return sizeof(obj)
+    if isinstance(arg, (bytes, bytearray)):
+        return len(arg)
+    if isinstance(arg, (int, float)):
+        return 8
+    return 0
+
+
+def _call_handle(name, args):
+    if not args or name.startswith(_NO_HANDLE_PREFIXES):
+        return None
+    hdwf = args[0]
+    if isinstance(hdwf, c_int):
+        return hdwf.value
+    if isinstance(hdwf, int):
+        return hdwf
+    return None
+
+
+def _percentile(sortedSamples, pct):
+    if not sortedSamples:
+        return 0.0
+    index = min(len(sortedSamples) - 1, max(0, math.ceil(pct / 100 * len(sortedSamples)) - 1))  # nearest rank
+    return sortedSamples[index]
+
+
+class _CallStats():
+    __slots__ = ("count", "total", "min", "max", "argBytes", "samples")
+
+    def __init__(self, maxSamples):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.argBytes = 0
+        self.samples = deque(maxlen=maxSamples)
+
+    def add(self, elapsed, argBytes):
+        self.count += 1
+        self.total += elapsed
+        self.argBytes += argBytes
+        self.samples.append(elapsed)
+        if elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class DwfProfiler():
+    """
+    Proxy around the DWF library object that records per-call statistics.
+
+    Every FDwf* attribute is wrapped once and cached on the proxy, so the
+    cost when profiling is disabled is zero (the proxy is simply not installed)
+    and the cost when enabled is one extra Python call per DWF call.
+
+    max_samples: number of latency samples kept per (function, handle) for percentiles
+    trace: also keep a bounded list of call events for write_chrome_trace()
+    """
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, lib, max_samples=4096, trace=False, max_trace_events=100000):
+        self._lib = lib
+        self._maxSamples = max_samples
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._traceEvents = deque(maxlen=max_trace_events) if trace else None
+        self._t0 = time.perf_counter()
+
+    def __getattr__(self, name):
+        func = getattr(self._lib, name)
+        if not name.startswith("FDwf") or not callable(func):
+            return func
+
+        wrapper = self._wrap(name, func)
+        setattr(self, name, wrapper)
+
+        return wrapper
+
+    def _wrap(self, name, func):
+        perf_counter = time.perf_counter
+
+        def wrapper(*args):
+            start = perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._record(name, args, start, perf_counter() - start)
+
+        wrapper.__name__ = name
+        return wrapper
+
+    def _record(self, name, args, start, elapsed):
+        handle = _call_handle(name, args)
+        argBytes = sum(_arg_size(arg) for arg in args)
+
+        with self._lock:
+            stats = self._stats.get((name, handle))
+            if stats is None:
+                stats = self._stats[(name, handle)] = _CallStats(self._maxSamples)
+            stats.add(elapsed, argBytes)
+
+            if self._traceEvents is not None:
+                self._traceEvents.append((name, handle, start - self._t0, elapsed, threading.get_ident()))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            if self._traceEvents is not None:
+                self._traceEvents.clear()
+            self._t0 = time.perf_counter()
+
+    #region Export
+    def _summarize(self, statsList):
+        count = sum(s.count for s in statsList)
+        total = sum(s.total for s in statsList)
+        samples = sorted(x for s in statsList for x in s.samples)
+
+        summary = {
+            "count": count,
+            "total_s": total,
+            "mean_s": total / count if count else 0.0,
+            "min_s": min(s.min for s in statsList) if count else 0.0,
+            "max_s": max(s.max for s in statsList),
+            "arg_bytes": sum(s.argBytes for s in statsList),
+        }
+        for pct in self.PERCENTILES:
+            summary[f"p{pct}_s"] = _percentile(samples, pct)
+
+        return summary
+
+    def to_dict(self) -> dict:
+        """
+        Returns: {function: {<summary>, "handles": {handle: <summary>}}}
+        """
+        with self._lock:
+            byName = {}
+            for (name, handle), stats in self._stats.items():
+                byName.setdefault(name, {})[handle] = stats
+
+            result = {}
+            for name, handles in sorted(byName.items()):
+                entry = self._summarize(list(handles.values()))
+                entry["handles"] = {handle: self._summarize([stats]) for handle, stats in handles.items()}
+                result[name] = entry
+
+        return result
+
+    def to_prometheus(self, prefix="dwf") -> str:
+        """Prometheus text exposition format, one series per (function, handle)."""
+        lines = [
+            f"# HELP {prefix}_calls_total Number of DWF library calls.",
+            f"# TYPE {prefix}_calls_total counter",
+        ]
+        data = self.to_dict()
+        series = [(name, handle, summary) for name, entry in data.items() for handle, summary in entry["handles"].items()]
+
+        def labels(name, handle, extra=""):
+            handleStr = "" if handle is None else str(handle)
+            return f'{{function="{name}",handle="{handleStr}"{extra}}}'
+
+        for name, handle, summary in series:
+            lines.append(f"{prefix}_calls_total{labels(name, handle)} {summary['count']}")
+
+        lines.append(f"# HELP {prefix}_call_seconds DWF library call latency.")
+        lines.append(f"# TYPE {prefix}_call_seconds summary")
+        for name, handle, summary in series:
+            for pct in self.PERCENTILES:
+                quantile = ',quantile="%g"' % (pct / 100)
+                lines.append(f"{prefix}_call_seconds{labels(name, handle, quantile)} {summary['p%d_s' % pct]:.9f}")
+            lines.append(f"{prefix}_call_seconds_sum{labels(name, handle)} {summary['total_s']:.9f}")
+            lines.append(f"{prefix}_call_seconds_count{labels(name, handle)} {summary['count']}")
+
+        lines.append(f"# HELP {prefix}_call_arg_bytes_total Bytes of arguments passed to DWF library calls.")
+        lines.append(f"# TYPE {prefix}_call_arg_bytes_total counter")
+        for name, handle, summary in series:
+            lines.append(f"{prefix}_call_arg_bytes_total{labels(name, handle)} {summary['arg_bytes']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_chrome_trace(self, path):
+        """Write recorded call events as Chrome trace JSON (chrome://tracing, Perfetto)."""
+        if self._traceEvents is None:
+            raise RuntimeError("Profiler was created without trace=True.")
+
+        with self._lock:
+            events = [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": elapsed * 1e6,
+                    "pid": 0 if handle is None else handle,
+                    "tid": tid,
+                    "args": {"handle": handle},
+                }
+                for name, handle, start, elapsed, tid in self._traceEvents
+            ]
+
+        import json
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    #endregion
@@ -0,0 +1,293 @@
+from ctypes import *
+
+# Declared once when the library is loaded (see BaseDigilentDevice.load_library), so
+# ctypes converts plain Python ints/floats in C instead of guessing at every call.
+# Call sites can pass ints and floats directly; c_int(...) wrappers are not needed.
+
+HDWF = c_int
+STS = c_ubyte
+TRIGSRC = c_ubyte
+FUNC = c_ubyte
+pInt = POINTER(c_int)
+pUInt = POINTER(c_uint)
+pDouble = POINTER(c_double)
+pSts = POINTER(c_ubyte)
+
+# Raw sample/data buffers are c_void_p so that arrays of any element type and
+# byref(array, offset) can be passed without a cast.
+BUFFER = c_void_p
+
+
+class DwfError(RuntimeError):
+    """A DWF library call returned FALSE."""
+    def __init__(self, function: str, code: int, message: str):
+        self.Function = function
+        self.Code = code
+        self.Message = message
+
+        super().__init__(f"{function} failed ({code}): {message}")
+
+
+# name: argtypes. Every FDwf* function returns BOOL (c_int, 0 on failure).
+PROTOTYPES = {
+    #region Global and device
+    "FDwfGetLastError": [pInt],
+    "FDwfGetLastErrorMsg": [c_char_p],
+    "FDwfGetVersion": [c_char_p],
+    "FDwfParamSet": [c_int, c_int],
+    "FDwfParamGet": [c_int, pInt],
+
+    "FDwfEnum": [c_int, pInt],
+    "FDwfEnumDeviceType": [c_int, pInt, pInt],
+    "FDwfEnumDeviceIsOpened": [c_int, pInt],
+    "FDwfEnumUserName": [c_int, c_char_p],
+    "FDwfEnumDeviceName": [c_int, c_char_p],
+    "FDwfEnumSN": [c_int, c_char_p],
+    "FDwfEnumConfig": [c_int, pInt],
+    "FDwfEnumConfigInfo": [c_int, c_int, pInt],
+
+    "FDwfDeviceOpen": [c_int, POINTER(HDWF)],
+    "FDwfDeviceOpenEx": [c_char_p, POINTER(HDWF)],
+    "FDwfDeviceConfigOpen": [c_int, c_int, POINTER(HDWF)],
+    "FDwfDeviceClose": [HDWF],
+    "FDwfDeviceCloseAll": [],
+    "FDwfDeviceAutoConfigureSet": [HDWF, c_int],
+    "FDwfDeviceAutoConfigureGet": [HDWF, pInt],
+    "FDwfDeviceReset": [HDWF],
+    "FDwfDeviceEnableSet": [HDWF, c_int],
+    "FDwfDeviceTriggerInfo": [HDWF, pInt],
+    "FDwfDeviceTriggerSet": [HDWF, c_int, TRIGSRC],
+    "FDwfDeviceTriggerGet": [HDWF, c_int, POINTER(TRIGSRC)],
+    "FDwfDeviceTriggerPC": [HDWF],
+    "FDwfDeviceParamSet": [HDWF, c_int, c_int],
+    "FDwfDeviceParamGet": [HDWF, c_int, pInt],
+    #endregion
+
+    #region AnalogIn
+    "FDwfAnalogInReset": [HDWF],
+    "FDwfAnalogInConfigure": [HDWF, c_int, c_int],
+    "FDwfAnalogInTriggerForce": [HDWF],
+    "FDwfAnalogInStatus": [HDWF, c_int, pSts],
+    "FDwfAnalogInStatusSamplesLeft": [HDWF, pInt],
+    "FDwfAnalogInStatusSamplesValid": [HDWF, pInt],
+    "FDwfAnalogInStatusIndexWrite": [HDWF, pInt],
+    "FDwfAnalogInStatusAutoTriggered": [HDWF, pInt],
+    "FDwfAnalogInStatusData": [HDWF, c_int, BUFFER, c_int],
+    "FDwfAnalogInStatusData2": [HDWF, c_int, BUFFER, c_int, c_int],
+    "FDwfAnalogInStatusData16": [HDWF, c_int, BUFFER, c_int, c_int],
+    "FDwfAnalogInStatusSample": [HDWF, c_int, pDouble],
+    "FDwfAnalogInStatusRecord": [HDWF, pInt, pInt, pInt],
+    "FDwfAnalogInStatusTime": [HDWF, pUInt, pUInt, pUInt],
+    "FDwfAnalogInFrequencyInfo": [HDWF, pDouble, pDouble],
+    "FDwfAnalogInFrequencySet": [HDWF, c_double],
+    "FDwfAnalogInFrequencyGet": [HDWF, pDouble],
+    "FDwfAnalogInBufferSizeInfo": [HDWF, pInt, pInt],
+    "FDwfAnalogInBufferSizeSet": [HDWF, c_int],
+    "FDwfAnalogInBufferSizeGet": [HDWF, pInt],
+    "FDwfAnalogInAcquisitionModeSet": [HDWF, c_int],
+    "FDwfAnalogInChannelCount": [HDWF, pInt],
+    "FDwfAnalogInChannelEnableSet": [HDWF, c_int, c_int],
+    "FDwfAnalogInChannelFilterSet": [HDWF, c_int, c_int],
+    "FDwfAnalogInChannelRangeSet": [HDWF, c_int, c_double],
+    "FDwfAnalogInChannelRangeGet": [HDWF, c_int, pDouble],
+    "FDwfAnalogInChannelOffsetSet": [HDWF, c_int, c_double],
+    "FDwfAnalogInChannelCouplingSet": [HDWF, c_int, c_int],
+    "FDwfAnalogInChannelAttenuationSet": [HDWF, c_int, c_double],
+    "FDwfAnalogInTriggerSourceSet": [HDWF, TRIGSRC],
+    "FDwfAnalogInTriggerPositionSet": [HDWF, c_double],
+    "FDwfAnalogInTriggerPositionGet": [HDWF, pDouble],
+    "FDwfAnalogInTriggerPositionStatus": [HDWF, pDouble],
+    "FDwfAnalogInTriggerAutoTimeoutSet": [HDWF, c_double],
+    "FDwfAnalogInTriggerHoldOffSet": [HDWF, c_double],
+    "FDwfAnalogInTriggerTypeSet": [HDWF, c_int],
+    "FDwfAnalogInTriggerChannelSet": [HDWF, c_int],
+    "FDwfAnalogInTriggerFilterSet": [HDWF, c_int],
+    "FDwfAnalogInTriggerLevelSet": [HDWF, c_double],
+    "FDwfAnalogInTriggerHysteresisSet": [HDWF, c_double],
+    "FDwfAnalogInTriggerConditionSet": [HDWF, c_int],
+    "FDwfAnalogInTriggerLengthSet": [HDWF, c_double],
+    "FDwfAnalogInTriggerLengthConditionSet": [HDWF, c_int],
+    #endregion
+
+    #region AnalogOut
+    "FDwfAnalogOutReset": [HDWF, c_int],
+    "FDwfAnalogOutConfigure": [HDWF, c_int, c_int],
+    "FDwfAnalogOutStatus": [HDWF, c_int, pSts],
+    "FDwfAnalogOutNodeEnableSet": [HDWF, c_int, c_int, c_int],
+    "FDwfAnalogOutNodeFunctionSet": [HDWF, c_int, c_int, FUNC],
+    "FDwfAnalogOutNodeFrequencySet": [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodeAmplitudeSet": [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodeOffsetSet": [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodeSymmetrySet": [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodePhaseSet": [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogOutNodeDataSet": [HDWF, c_int, c_int, BUFFER, c_int],
+    "FDwfAnalogOutRunSet": [HDWF, c_int, c_double],
+    "FDwfAnalogOutWaitSet": [HDWF, c_int, c_double],
+    "FDwfAnalogOutRepeatSet": [HDWF, c_int, c_int],
+    "FDwfAnalogOutTriggerSourceSet": [HDWF, c_int, TRIGSRC],
+    "FDwfAnalogOutIdleSet": [HDWF, c_int, c_int],
+    "FDwfAnalogOutMasterSet": [HDWF, c_int, c_int],
+    #endregion
+
+    #region AnalogIO
+    "FDwfAnalogIOReset": [HDWF],
+    "FDwfAnalogIOConfigure": [HDWF],
+    "FDwfAnalogIOStatus": [HDWF],
+    "FDwfAnalogIOEnableSet": [HDWF, c_int],
+    "FDwfAnalogIOChannelNodeSet": [HDWF, c_int, c_int, c_double],
+    "FDwfAnalogIOChannelNodeGet": [HDWF, c_int, c_int, pDouble],
+    "FDwfAnalogIOChannelNodeStatus": [HDWF, c_int, c_int, pDouble],
+    #endregion
+
+    #region DigitalIO
+    "FDwfDigitalIOReset": [HDWF],
+    "FDwfDigitalIOConfigure": [HDWF],
+    "FDwfDigitalIOStatus": [HDWF],
+    "FDwfDigitalIOOutputEnableInfo": [HDWF, pUInt],
+    "FDwfDigitalIOOutputEnableSet": [HDWF, c_uint],
+    "FDwfDigitalIOOutputEnableGet": [HDWF, pUInt],
+    "FDwfDigitalIOOutputInfo": [HDWF, pUInt],
+    "FDwfDigitalIOOutputSet": [HDWF, c_uint],
+    "FDwfDigitalIOOutputGet": [HDWF, pUInt],
+    "FDwfDigitalIOInputInfo": [HDWF, pUInt],
+    "FDwfDigitalIOInputStatus": [HDWF, pUInt],
+    "FDwfDigitalIOOutputEnableSet64": [HDWF, c_ulonglong],
+    "FDwfDigitalIOOutputSet64": [HDWF, c_ulonglong],
+    "FDwfDigitalIOInputStatus64": [HDWF, POINTER(c_ulonglong)],
+    #endregion
+
+    #region DigitalIn
+    "FDwfDigitalInReset": [HDWF],
+    "FDwfDigitalInConfigure": [HDWF, c_int, c_int],
+    "FDwfDigitalInStatus": [HDWF, c_int, pSts],
+    "FDwfDigitalInStatusSamplesLeft": [HDWF, pInt],
+    "FDwfDigitalInStatusSamplesValid": [HDWF, pInt],
+    "FDwfDigitalInStatusIndexWrite": [HDWF, pInt],
+    "FDwfDigitalInStatusAutoTriggered": [HDWF, pInt],
+    "FDwfDigitalInStatusData": [HDWF, BUFFER, c_int],
+    "FDwfDigitalInStatusData2": [HDWF, BUFFER, c_int, c_int],
+    "FDwfDigitalInStatusNoise2": [HDWF, BUFFER, c_int, c_int],
+    "FDwfDigitalInStatusRecord": [HDWF, pInt, pInt, pInt],
+    "FDwfDigitalInStatusTime": [HDWF, pUInt, pUInt, pUInt],
+    "FDwfDigitalInInternalClockInfo": [HDWF, pDouble],
+    "FDwfDigitalInClockSourceSet": [HDWF, c_int],
+    "FDwfDigitalInDividerInfo": [HDWF, pUInt],
+    "FDwfDigitalInDividerSet": [HDWF, c_uint],
+    "FDwfDigitalInDividerGet": [HDWF, pUInt],
+    "FDwfDigitalInBitsInfo": [HDWF, pInt],
+    "FDwfDigitalInSampleFormatSet": [HDWF, c_int],
+    "FDwfDigitalInInputOrderSet": [HDWF, c_int],
+    "FDwfDigitalInBufferSizeInfo": [HDWF, pInt],
+    "FDwfDigitalInBufferSizeSet": [HDWF, c_int],
+    "FDwfDigitalInSampleModeSet": [HDWF, c_int],
+    "FDwfDigitalInSampleSensibleSet": [HDWF, c_uint],
+    "FDwfDigitalInAcquisitionModeSet": [HDWF, c_int],
+    "FDwfDigitalInTriggerSourceSet": [HDWF, TRIGSRC],
+    "FDwfDigitalInTriggerSlopeSet": [HDWF, c_int],
+    "FDwfDigitalInTriggerPositionSet": [HDWF, c_uint],
+    "FDwfDigitalInTriggerPrefillSet": [HDWF, c_uint],
+    "FDwfDigitalInTriggerAutoTimeoutSet": [HDWF, c_double],
+    "FDwfDigitalInTriggerSet": [HDWF, c_uint, c_uint, c_uint, c_uint],
+    "FDwfDigitalInTriggerResetSet": [HDWF, c_uint, c_uint, c_uint, c_uint],
+    "FDwfDigitalInTriggerCountSet": [HDWF, c_int, c_int],
+    "FDwfDigitalInTriggerLengthSet": [HDWF, c_double, c_double, c_int],
+    "FDwfDigitalInTriggerMatchSet": [HDWF, c_int, c_uint, c_uint, c_int],
+    #endregion
+
+    #region DigitalOut
+    "FDwfDigitalOutReset": [HDWF],
+    "FDwfDigitalOutConfigure": [HDWF, c_int],
+    "FDwfDigitalOutStatus": [HDWF, pSts],
+    "FDwfDigitalOutInternalClockInfo": [HDWF, pDouble],
+    "FDwfDigitalOutEnableSet": [HDWF, c_int, c_int],
+    "FDwfDigitalOutDividerSet": [HDWF, c_int, c_uint],
+    "FDwfDigitalOutCounterSet": [HDWF, c_int, c_uint, c_uint],
+    "FDwfDigitalOutIdleSet": [HDWF, c_int, c_int],
+    "FDwfDigitalOutTypeSet": [HDWF, c_int, c_int],
+    "FDwfDigitalOutOutputSet": [HDWF, c_int, c_int],
+    "FDwfDigitalOutRunSet": [HDWF, c_double],
+    "FDwfDigitalOutWaitSet": [HDWF, c_double],
+    "FDwfDigitalOutRepeatSet": [HDWF, c_uint],
+    "FDwfDigitalOutTriggerSourceSet": [HDWF, TRIGSRC],
+    "FDwfDigitalOutDataSet": [HDWF, c_int, BUFFER, c_uint],
+    #endregion
+
+    #region Protocols
+    "FDwfDigitalI2cReset": [HDWF],
+    "FDwfDigitalI2cClear": [HDWF, pInt],
+    "FDwfDigitalI2cStretchSet": [HDWF, c_int],
+    "FDwfDigitalI2cRateSet": [HDWF, c_double],
+    "FDwfDigitalI2cReadNakSet": [HDWF, c_int],
+    "FDwfDigitalI2cSclSet": [HDWF, c_int],
+    "FDwfDigitalI2cSdaSet": [HDWF, c_int],
+    "FDwfDigitalI2cTimeoutSet": [HDWF, c_double],
+    "FDwfDigitalI2cWriteRead": [HDWF, c_ubyte, BUFFER, c_int, BUFFER, c_int, pInt],
+    "FDwfDigitalI2cRead": [HDWF, c_ubyte, BUFFER, c_int, pInt],
+    "FDwfDigitalI2cWrite": [HDWF, c_ubyte, BUFFER, c_int, pInt],
+    "FDwfDigitalI2cWriteOne": [HDWF, c_ubyte, c_ubyte, pInt],
+    "FDwfDigitalI2cSpyStart": [HDWF],
+    "FDwfDigitalI2cSpyStatus": [HDWF, pInt, pInt, BUFFER, pInt, pInt],
+
+    "FDwfDigitalSpiReset": [HDWF],
+    "FDwfDigitalSpiFrequencySet": [HDWF, c_double],
+    "FDwfDigitalSpiClockSet": [HDWF, c_int],
+    "FDwfDigitalSpiDataSet": [HDWF, c_int, c_int],
+    "FDwfDigitalSpiIdleSet": [HDWF, c_int, c_int],
+    "FDwfDigitalSpiModeSet": [HDWF, c_int],
+    "FDwfDigitalSpiOrderSet": [HDWF, c_int],
+    "FDwfDigitalSpiDelaySet": [HDWF, c_int, c_int, c_int, c_int],
+    "FDwfDigitalSpiSelect": [HDWF, c_int, c_int],
+    "FDwfDigitalSpiSelectSet": [HDWF, c_int, c_int],
+    "FDwfDigitalSpiWriteRead": [HDWF, c_int, c_int, BUFFER, c_int, BUFFER, c_int],
+    "FDwfDigitalSpiWriteRead16": [HDWF, c_int, c_int, BUFFER, c_int, BUFFER, c_int],
+    "FDwfDigitalSpiWriteRead32": [HDWF, c_int, c_int, BUFFER, c_int, BUFFER, c_int],
+    "FDwfDigitalSpiRead": [HDWF, c_int, c_int, BUFFER, c_int],
+    "FDwfDigitalSpiWrite": [HDWF, c_int, c_int, BUFFER, c_int],
+    "FDwfDigitalSpiReadOne": [HDWF, c_int, c_int, pUInt],
+    "FDwfDigitalSpiWriteOne": [HDWF, c_int, c_int, c_uint],
+
+    "FDwfDigitalUartReset": [HDWF],
+    "FDwfDigitalUartRateSet": [HDWF, c_double],
+    "FDwfDigitalUartBitsSet": [HDWF, c_int],
+    "FDwfDigitalUartParitySet": [HDWF, c_int],
+    "FDwfDigitalUartPolaritySet": [HDWF, c_int],
+    "FDwfDigitalUartStopSet": [HDWF, c_double],
+    "FDwfDigitalUartTxSet": [HDWF, c_int],
+    "FDwfDigitalUartRxSet": [HDWF, c_int],
+    "FDwfDigitalUartTx": [HDWF, BUFFER, c_int],
+    "FDwfDigitalUartRx": [HDWF, BUFFER, c_int, pInt, pInt],
+    #endregion
+}
+
+# Functions whose result is not checked, the error reporting functions themselves
+_UNCHECKED = {"FDwfGetLastError", "FDwfGetLastErrorMsg"}
+
+
+def apply_prototypes(lib):
+    """Declare argtypes/restype/errcheck on every FDwf* function in PROTOTYPES that lib exports."""
+    getLastError = getattr(lib, "FDwfGetLastError")
+    getLastErrorMsg = getattr(lib, "FDwfGetLastErrorMsg")
+
+    def check_result(result, func, args):
+        if result:
+            return result
+
+        code = c_int()
+        message = create_string_buffer(512)
+        getLastError(byref(code))
+        getLastErrorMsg(message)
+
+        raise DwfError(func.__name__, code.value, message.value.decode(errors="replace").strip())
+
+    for name, argtypes in PROTOTYPES.items():
+        try:
+            func = getattr(lib, name)
+        except AttributeError:
+            continue  # not exported by this DWF version
+
+        func.argtypes = argtypes
+        func.restype = c_int
+        if name not in _UNCHECKED:
+            func.errcheck = check_result
+
+    return lib
@@ -0,0 +1,366 @@
+"""
+   Record DWF library calls to a trace file and replay them without hardware.
+
+   DwfRecorder is a proxy around the DWF library, like DwfProfiler: every
+   FDwf* call is logged with its scalar arguments, the bytes the library
+   wrote into output arguments (status bytes, counters, sample buffers),
+   the result or DWF error and its timing. DwfReplayer stands in for the
+   library and answers each call from the trace: recorded outputs are
+   copied into the caller's arguments, so AnalogDiscovery3/DigitalDiscovery
+   code runs offline exactly as it did on the device, at the recorded pace
+   or as fast as possible.
+
+       BaseDigilentDevice.enable_tracing("session.dwftrace")
+       ... open devices, capture ...
+       BaseDigilentDevice.disable_tracing()
+
+       BaseDigilentDevice.replay_trace("session.dwftrace", speed=None)
+       ... the same code, no device attached ...
+
+   Installing on BaseDigilentDevice covers every device class and the
+   enumeration in device_enum. Calls are answered in recorded order per
+   function, so threads driving different instruments replay independently.
+
+   Trace format: b"DWFTRC1\\n" followed by one zlib stream of records, each a
+   <I length and a marshal tuple (name, args, outputs, result, error, start,
+   elapsed, thread), error being None or (exception type, DWF error code,
+   message). The first record is a header dict.
+"""
+
+import marshal
+import math
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from ctypes import Array, ArgumentError, _Pointer, _SimpleCData, addressof, c_char_p, c_void_p, cast, memmove, sizeof, string_at
+
+from dwf_prototypes import DwfError, PROTOTYPES
+from event_log import eventLog
+
+MAGIC = b"DWFTRC1\n"
+_LENGTH = struct.Struct("<I")
+
+# Raw buffer arguments: name -> ((buffer index, count index, bytes per counted item, written by the library), ...)
+# A count passed by reference is read after the call (number of items actually returned).
+_BUFFERS = {
+    "FDwfAnalogInStatusData": ((2, 3, 8, True),),
+    "FDwfAnalogInStatusData2": ((2, 4, 8, True),),
+    "FDwfAnalogInStatusData16": ((2, 4, 2, True),),
+    "FDwfAnalogOutNodeDataSet": ((3, 4, 8, False),),
+    "FDwfDigitalInStatusData": ((1, 2, 1, True),),
+    "FDwfDigitalInStatusData2": ((1, 3, 1, True),),
+    "FDwfDigitalInStatusNoise2": ((1, 3, 1, True),),
+    "FDwfDigitalOutDataSet": ((2, 3, 1 / 8, False),),
+    "FDwfDigitalI2cWriteRead": ((2, 3, 1, False), (4, 5, 1, True)),
+    "FDwfDigitalI2cRead": ((2, 3, 1, True),),
+    "FDwfDigitalI2cWrite": ((2, 3, 1, False),),
+    "FDwfDigitalI2cSpyStatus": ((3, 4, 4, True),),
+    "FDwfDigitalSpiWriteRead": ((3, 4, 1, False), (5, 6, 1, True)),
+    "FDwfDigitalSpiWriteRead16": ((3, 4, 2, False), (5, 6, 2, True)),
+    "FDwfDigitalSpiWriteRead32": ((3, 4, 4, False), (5, 6, 4, True)),
+    "FDwfDigitalSpiRead": ((3, 4, 1, True),),
+    "FDwfDigitalSpiWrite": ((3, 4, 1, False),),
+    "FDwfDigitalUartTx": ((1, 2, 1, False),),
+    "FDwfDigitalUartRx": ((1, 3, 1, True),),
+}
+
+
+class TraceMismatch(RuntimeError):
+    """The replayed code made a call the trace does not have (or, when strict, with other arguments)."""
+
+
+def _target(arg):
+    """(object, byte offset) behind a by-reference argument, None for values"""
+    obj = getattr(arg, "_obj", None)  # byref() result
+    if obj is not None:
+        # byref(obj, offset) converts to a pointer like any other argument, its address gives the offset
+        return obj, cast(arg, c_void_p).value - addressof(obj)
+    if isinstance(arg, (Array, _Pointer)):
+        return arg, 0
+    return None
+
+
+def _int(arg):
+    if isinstance(arg, int):
+        return arg
+    obj = getattr(arg, "_obj", arg)
+    return obj.value
+
+
+def _value(arg):
+    """Recorded form of a value argument"""
+    if isinstance(arg, _SimpleCData):
+        return arg.value
+    if isinstance(arg, (bytearray, memoryview)):
+        return bytes(arg)
+    return arg
+
+
+def _pointer_size(argtype):
+    return sizeof(argtype._type_) if isinstance(argtype, type) and issubclass(argtype, _Pointer) else None
+
+
+class _Layout():
+    """Where the library reads and writes memory for the arguments of one function"""
+    def __init__(self, name):
+        self.ArgTypes = PROTOTYPES.get(name, ())
+        self.Buffers = {index: (count, size, output) for index, count, size, output in _BUFFERS.get(name, ())}
+
+    def extent(self, index, args, obj, offset):
+        """Bytes at obj+offset used by argument index"""
+        argtype = self.ArgTypes[index] if index < len(self.ArgTypes) else None
+        buffer = self.Buffers.get(index)
+        if buffer is not None:
+            count, size, output = buffer
+            return min(math.ceil(max(0, _int(args[count])) * size), sizeof(obj) - offset)
+        pointerSize = _pointer_size(argtype)
+        if pointerSize is not None:
+            return pointerSize
+        if argtype is c_char_p:
+            # string buffer, up to and including the terminator
+            return min(len(string_at(addressof(obj) + offset)) + 1, sizeof(obj) - offset)
+        return sizeof(obj) - offset
+
+    def is_output(self, index, arg):
+        buffer = self.Buffers.get(index)
+        if buffer is not None:
+            return buffer[2]
+        argtype = self.ArgTypes[index] if index < len(self.ArgTypes) else None
+        return _pointer_size(argtype) is not None or argtype is c_char_p
+
+    def targets(self, args):
+        """[(index, object, offset)] of the arguments passed by reference, c_int instances for POINTER arguments included"""
+        targets = []
+        for index, arg in enumerate(args):
+            target = _target(arg)
+            if target is None and isinstance(arg, _SimpleCData) and index < len(self.ArgTypes) \
+                    and _pointer_size(self.ArgTypes[index]) is not None:
+                target = (arg, 0)
+            if target is not None:
+                targets.append((index, *target))
+        return targets
+
+
+class DwfRecorder():
+    """
+    Proxy around the DWF library that writes every FDwf* call to a trace file.
+
+    lib: the DWF library (or another proxy)
+    path: trace file, overwritten
+    level: zlib compression level
+    flush_interval: seconds between flushes of the compressed stream to the file, what a recording that
+                    was never closed (crash, kill) loses at most
+    """
+    def __init__(self, lib, path, level=6, flush_interval=1.0):
+        self._lib = lib
+        self.Path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._compressor = zlib.compressobj(level)
+        self._lock = threading.Lock()
+        self._layouts = {}
+        self._t0 = time.perf_counter()
+        self.FlushInterval = flush_interval
+        self._flushedAt = self._t0
+        self.Calls = 0
+
+        self._write({"version": 2, "created": time.time()})
+
+    def __getattr__(self, name):
+        func = getattr(self._lib, name)
+        if not name.startswith("FDwf") or not callable(func):
+            return func
+
+        wrapper = self._wrap(name, func)
+        setattr(self, name, wrapper)
+
+        return wrapper
+
+    def _wrap(self, name, func):
+        perf_counter = time.perf_counter
+        layout = self._layouts[name] = _Layout(name)
+
+        def wrapper(*args):
+            targets = layout.targets(args)
+            byRef = {index for index, obj, offset in targets}
+            values = []
+            for index, arg in enumerate(args):
+                if index not in byRef:
+                    values.append(_value(arg))
+                elif layout.is_output(index, arg):
+                    values.append(None)
+                else:
+                    values.append(self._read(layout, index, args, targets))
+
+            result = None
+            error = None
+            called = True
+            start = perf_counter()
+            try:
+                result = func(*args)
+                return result
+            except DwfError as e:
+                result = 0
+                error = ("DwfError", e.Code, e.Message)
+                raise
+            except Exception as e:
+                # e.g. ctypes.ArgumentError: the library was not called, there are no outputs
+                called = False
+                error = (type(e).__name__, None, str(e))
+                raise
+            finally:
+                elapsed = perf_counter() - start
+                outputs = tuple((index, string_at(addressof(obj) + offset, layout.extent(index, args, obj, offset)))
+                                for index, obj, offset in targets if called and layout.is_output(index, args[index]))
+                self._write((name, tuple(values), outputs, result, error, start - self._t0, elapsed, threading.get_ident()))
+
+        wrapper.__name__ = name
+        return wrapper
+
+    def _read(self, layout, index, args, targets):
+        for i, obj, offset in targets:
+            if i == index:
+                return string_at(addressof(obj) + offset, layout.extent(index, args, obj, offset))
+
+    def _write(self, record):
+        try:
+            data = marshal.dumps(record)
+        except ValueError:
+            # arguments of a call ctypes rejected can be any object, keep their repr
+            record = (record[0], tuple(repr(value) for value in record[1])) + record[2:]
+            data = marshal.dumps(record)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(self._compressor.compress(_LENGTH.pack(len(data)) + data))
+            self.Calls += 1
+
+            now = time.perf_counter()
+            if now - self._flushedAt >= self.FlushInterval:
+                # a sync flush ends a deflate block, read_trace can decompress everything up to here
+                self._file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+                self._file.flush()
+                self._flushedAt = now
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(self._compressor.flush())
+            self._file.close()
+            self._file = None
+        eventLog.info("DWF trace %s: %d calls recorded", self.Path, self.Calls - 1)
+
+
+def read_trace(path):
+    """Header dict and the list of call records of a trace file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a DWF trace")
+        # a recording that was not closed still decompresses up to its last sync flush (DwfRecorder flush_interval)
+        data = zlib.decompressobj().decompress(f.read())
+
+    records = []
+    position = 0
+    while position + _LENGTH.size <= len(data):
+        (length,) = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        if position + length > len(data):
+            break
+        records.append(marshal.loads(data[position:position + length]))
+        position += length
+
+    if not records:
+        raise ValueError(f"{path} has no trace header")
+    return records[0], records[1:]
+
+
+class DwfReplayer():
+    """
+    Stand-in for the DWF library that answers calls from a trace.
+
+    speed: 1.0 replays at the recorded pace (call start times and durations), 2.0 twice as fast, None as fast as possible
+    strict: also compare the value arguments of every call with the recording and raise TraceMismatch on a difference
+    """
+    def __init__(self, path, speed=1.0, strict=False):
+        self.Path = path
+        self.Speed = speed
+        self.Strict = strict
+        self.Header, records = read_trace(path)
+
+        self._queues = {}
+        for record in records:
+            self._queues.setdefault(record[0], deque()).append(record)
+        self.Total = len(records)
+        self.Replayed = 0
+
+        self._lock = threading.Lock()
+        self._layouts = {}
+        self._t0 = None
+
+        # library object the replayer replaced, restored by BaseDigilentDevice.disable_tracing
+        self._previous = None
+
+    def __getattr__(self, name):
+        if not name.startswith("FDwf"):
+            raise AttributeError(name)
+
+        wrapper = self._wrap(name)
+        setattr(self, name, wrapper)
+
+        return wrapper
+
+    def _wrap(self, name):
+        layout = self._layouts[name] = _Layout(name)
+        perf_counter = time.perf_counter
+
+        def wrapper(*args):
+            with self._lock:
+                calls = self._queues.get(name)
+                if not calls:
+                    raise TraceMismatch(f"{name} called more often than recorded")
+                _, values, outputs, result, error, start, elapsed, thread = calls.popleft()
+                self.Replayed += 1
+                if self._t0 is None:
+                    self._t0 = perf_counter() - start / self.Speed if self.Speed else 0.0
+
+            if self.Strict:
+                self._compare(name, layout, args, values)
+
+            if self.Speed:
+                delay = self._t0 + (start + elapsed) / self.Speed - perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            targets = {index: (obj, offset) for index, obj, offset in layout.targets(args)}
+            for index, data in outputs:
+                obj, offset = targets[index]
+                memmove(addressof(obj) + offset, data, min(len(data), sizeof(obj) - offset))
+
+            if error is not None:
+                kind, code, message = error
+                if kind == "DwfError":
+                    raise DwfError(name, code, message)
+                if kind == "ArgumentError":
+                    raise ArgumentError(message)
+                raise RuntimeError(f"{name} raised {kind} when recorded: {message}")
+            return result
+
+        wrapper.__name__ = name
+        return wrapper
+
+    def _compare(self, name, layout, args, values):
+        byRef = {index for index, obj, offset in layout.targets(args)}
+        for index, (arg, recorded) in enumerate(zip(args, values)):
+            if index in byRef or recorded is None:
+                continue
+            value = _value(arg)
+            if value != recorded:
+                raise TraceMismatch(f"{name} argument {index}: {value!r}, recorded {recorded!r}")
+
+    def remaining(self) -> dict:
+        """Calls left in the trace per function"""
+        with self._lock:
+            return {name: len(calls) for name, calls in self._queues.items() if calls}
@@ -0,0 +1,169 @@
+import atexit
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+_LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class EventLog():
+    """
+    Structured, level-filtered event log held in a bounded in-memory ring.
+
+    Logging a record is a level compare plus a deque append; formatting and all
+    file/terminal I/O happen on a background flush thread, so device loops never
+    block on the console. With level=OFF every call returns after the compare.
+
+    capacity: number of records kept in memory, oldest records are dropped first
+    level: records below this level are discarded
+    path: file the flush thread appends to, None to keep records in memory only
+    echo_level: records at or above this level are also written to stderr, None to disable
+    flush_interval: seconds between background flushes
+    """
+    def __init__(self, capacity=4096, level=INFO, path=None, echo_level=WARNING, flush_interval=0.5):
+        self._ring = deque(maxlen=capacity)
+        self._level = level
+        self._echoLevel = OFF if echo_level is None else echo_level
+        self._flushInterval = flush_interval
+
+        self._seq = itertools.count(1)
+        self._flushedSeq = 0
+        self.Dropped = 0
+
+        self._file = None
+        self._lock = threading.Lock()
+        self._wake = None
+        self._thread = None
+
+        if path is not None:
+            self.open(path)
+
+        atexit.register(self.close)
+
+    #region Level
+    @property
+    def Level(self) -> int:
+        return self._level
+
+    @Level.setter
+    def Level(self, level: int):
+        self._level = level
+    #endregion
+
+    def is_enabled(self, level) -> bool:
+        return level >= self._level
+
+    def log(self, level, msg, *args, **fields):
+        if level < self._level:
+            return
+
+        ring = self._ring
+        if len(ring) == ring.maxlen:
+            self.Dropped += 1
+
+        ring.append((next(self._seq), time.time(), level, msg, args, fields))
+
+        if self._thread is None and (self._file is not None or level >= self._echoLevel):
+            self._start()
+
+    def debug(self, msg, *args, **fields):
+        if DEBUG >= self._level:
+            self.log(DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        if INFO >= self._level:
+            self.log(INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        if WARNING >= self._level:
+            self.log(WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        if ERROR >= self._level:
+            self.log(ERROR, msg, *args, **fields)
+
+    #region Output
+    @staticmethod
+    def format(record) -> str:
+        seq, timestamp, level, msg, args, fields = record
+        text = msg % args if args else msg
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+        return f"{stamp}.{int(timestamp % 1 * 1000):03d} {_LEVEL_NAMES.get(level, level)} {text}"
+
+    def records(self, level=DEBUG) -> list:
+        """Records currently held in the ring as (timestamp, level, text, fields) tuples."""
+        return [
+            (record[1], record[2], record[3] % record[4] if record[4] else record[3], record[5])
+            for record in list(self._ring) if record[2] >= level
+        ]
+
+    def open(self, path):
+        """Append records to path from the background flush thread."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(path, "a", buffering=1 << 16)
+        self._start()
+
+    def flush(self):
+        """Write all records not yet flushed. Normally called from the flush thread."""
+        with self._lock:
+            pending = [record for record in list(self._ring) if record[0] > self._flushedSeq]
+            if not pending:
+                return
+            self._flushedSeq = max(record[0] for record in pending)
+
+            for record in pending:
+                if self._file is None and record[2] < self._echoLevel:
+                    continue
+                line = self.format(record)
+                if self._file is not None:
+                    self._file.write(line + "\n")
+                if record[2] >= self._echoLevel:
+                    sys.stderr.write(line + "\n")
+
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        thread = self._thread
+        self._thread = None
+        if thread is not None:
+            self._wake.set()
+            thread.join()
+
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    #endregion
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._wake,), name="EventLogFlush", daemon=True)
+            self._thread.start()
+
+    def _run(self, wake):
+        thread = threading.current_thread()
+        while self._thread is thread:
+            wake.wait(self._flushInterval)
+            self.flush()
+
+
+# Shared log used by all device classes
+eventLog = EventLog()
@@ -0,0 +1,211 @@
+"""
+   Register map cache in front of the AnalogDiscovery3 I2C master.
+
+   Values of registers marked CACHED are kept per (device address, register):
+   writes of the value such a register already holds are skipped and its
+   reads are served from the cache. In write-back mode writes to them only
+   mark registers dirty; flush() sends them as one auto-increment Write burst
+   per run of consecutive registers. VOLATILE registers (status, commands,
+   self-clearing bits) are never cached, every read and write goes to the
+   device.
+
+       regs = I2CRegisterCache(ad3.I2C, mode="write_back")
+       regs.set_policy(0x90, range(0x00, 0x20), CACHED)   # configuration block
+       regs.write(0x90, 0x01, 0x3C)
+       regs.write(0x90, 0x02, [0x00, 0x80])
+       regs.flush()                                        # one burst 0x01..0x03
+       regs.read(0x90, 0x01)                               # served from the cache
+
+   Registers are assumed to be one byte wide and the device to auto-increment
+   the register address within a burst.
+"""
+
+import threading
+
+from event_log import eventLog
+
+# Register policies
+VOLATILE = "volatile"       # always read from the device (status, data, counters)
+CACHED = "cached"           # reads are served from the cache once the value is known
+
+MODES = ("write_through", "write_back")
+
+
+class I2CRegisterCache():
+    """
+    i2c: analog_discovery_3.I2C
+    mode: "write_through" sends every changed write immediately, "write_back" holds them until flush()
+    default_policy: policy of registers without an explicit one
+    max_burst: longest Write burst in data bytes
+    """
+    def __init__(self, i2c, mode="write_through", default_policy=VOLATILE, max_burst=32):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+
+        self._i2c = i2c
+        self.Mode = mode
+        self.DefaultPolicy = default_policy
+        self.MaxBurst = max_burst
+
+        self._values = {}      # (address, register) -> value
+        self._dirty = {}       # address -> set of registers
+        self._policies = {}    # (address, register) -> policy
+        self._lock = threading.RLock()
+
+        self.reset_stats()
+
+    #region Policies
+    def set_policy(self, address, registers, policy):
+        if isinstance(registers, int):
+            registers = (registers,)
+        with self._lock:
+            for register in registers:
+                self._policies[(address, register)] = policy
+                if policy != CACHED and register not in self._dirty.get(address, ()):
+                    self._values.pop((address, register), None)
+
+    def policy(self, address, register):
+        return self._policies.get((address, register), self.DefaultPolicy)
+    #endregion
+
+    #region Statistics
+    def reset_stats(self):
+        self.Hits = 0
+        self.Misses = 0
+        self.Writes = 0
+        self.SkippedWrites = 0
+        self.Bursts = 0
+
+    def stats(self) -> dict:
+        lookups = self.Hits + self.Misses
+        return {
+            "hits": self.Hits,
+            "misses": self.Misses,
+            "hit_rate": self.Hits / lookups if lookups else 0.0,
+            "writes": self.Writes,
+            "skipped_writes": self.SkippedWrites,
+            "bursts": self.Bursts,
+            "dirty": sum(len(registers) for registers in self._dirty.values()),
+        }
+    #endregion
+
+    def write(self, address: int, register: int, values: int | list[int]):
+        """
+        Write one register or consecutive registers starting at register. Returns False on NAK.
+
+        Only CACHED registers are skipped when unchanged and held back in write_back mode; VOLATILE ones
+        (commands, self-clearing bits) are always sent, after any pending writes to the device.
+        """
+        if isinstance(values, int):
+            values = [values]
+
+        with self._lock:
+            send = []
+            deferred = []
+            for i, value in enumerate(values):
+                key = (address, register + i)
+                if self.policy(*key) != CACHED:
+                    send.append((register + i, value))
+                elif self._values.get(key) == value:
+                    self.SkippedWrites += 1
+                elif self.Mode == "write_back":
+                    deferred.append((register + i, value))
+                else:
+                    send.append((register + i, value))
+
+            if deferred:
+                dirty = self._dirty.setdefault(address, set())
+                for reg, value in deferred:
+                    self._values[(address, reg)] = value
+                    dirty.add(reg)
+            if not send:
+                return True
+
+            # registers written before a command have to reach the device first
+            ok = True
+            if self._dirty.get(address):
+                ok = self.flush(address)
+            for start, run in self._runs(send):
+                ok = self._send(address, start, run) and ok
+            return ok
+
+    def read(self, address: int, register: int, count=1):
+        """I2cMessage for count registers from register, from the cache when they are all CACHED and known."""
+        I2cMessage = self._i2c.I2cMessage
+
+        with self._lock:
+            keys = [(address, register + i) for i in range(count)]
+            if all(key in self._values and self.policy(*key) == CACHED for key in keys):
+                self.Hits += 1
+                readback = [self._values[key] for key in keys]
+                return I2cMessage(True, readback, f"0x{address:02x}[R]:0x{register:02x} (cached)")
+
+            self.Misses += 1
+            # pending writes to these registers go out before the device is read
+            dirty = self._dirty.get(address)
+            if dirty and any(register + i in dirty for i in range(count)):
+                self.flush(address)
+
+            msg = self._i2c.Read(address, register, count)
+            if msg.ACK:
+                for key, value in zip(keys, msg.Readback):
+                    if self.policy(*key) == CACHED and key[1] not in self._dirty.get(address, ()):
+                        self._values[key] = value
+            return msg
+
+    def flush(self, address=None) -> bool:
+        """Send dirty registers of one device (or all) in coalesced bursts. Registers that NAK stay dirty."""
+        ok = True
+        with self._lock:
+            addresses = list(self._dirty) if address is None else [address]
+            for addr in addresses:
+                dirty = self._dirty.get(addr)
+                if not dirty:
+                    continue
+                pending = [(reg, self._values[(addr, reg)]) for reg in sorted(dirty)]
+                for start, run in self._runs(pending):
+                    if self._send(addr, start, run):
+                        dirty.difference_update(range(start, start + len(run)))
+                    else:
+                        ok = False
+                if not dirty:
+                    del self._dirty[addr]
+        return ok
+
+    def invalidate(self, address=None, register=None):
+        """Forget cached values (not dirty ones) of a register, a device or everything."""
+        with self._lock:
+            for key in list(self._values):
+                if (address is None or key[0] == address) and (register is None or key[1] == register):
+                    if key[1] not in self._dirty.get(key[0], ()):
+                        del self._values[key]
+
+    def _runs(self, items):
+        """Split sorted (register, value) pairs into runs of consecutive registers no longer than max_burst."""
+        start = None
+        run = []
+        for reg, value in items:
+            if run and (reg != start + len(run) or len(run) >= self.MaxBurst):
+                yield start, run
+                run = []
+            if not run:
+                start = reg
+            run.append(value)
+        if run:
+            yield start, run
+
+    def _send(self, address, start, values):
+        msg = self._i2c.Write(address, start, values if len(values) > 1 else values[0])
+        self.Bursts += 1
+        self.Writes += len(values)
+
+        if msg.ACK:
+            for i, value in enumerate(values):
+                if self.policy(address, start + i) == CACHED:
+                    self._values[(address, start + i)] = value
+        else:
+            eventLog.warning("I2C register cache: NAK writing 0x%02x:0x%02x", address, start)
+            if self.Mode == "write_through":
+                for i in range(len(values)):
+                    self._values.pop((address, start + i), None)
+        return msg.ACK
@@ -0,0 +1,234 @@
+"""
+   Passive I2C bus monitor on the AnalogDiscovery3 (DWF I2C spy).
+
+   A background thread polls FDwfDigitalI2cSpyStatus and assembles
+   transactions from start to stop. Address and register filters are byte
+   lookup tables applied to the raw bytes, so transactions that are filtered
+   out never become Python objects. Kept transactions either go to a bounded
+   queue (dropped and counted when the consumer falls behind) or are appended
+   to a compact binary file.
+
+       ad3.I2C.Configure(sclPin=0, sdaPin=1, clockFreq=400e3, enClkStretch=True)
+       spy = I2CSpy(ad3.I2C, addresses=[0x48], path="bus.i2cspy").start()
+       ...
+       spy.stop()
+       for t in read_spy_file("bus.i2cspy"):
+           print(t)
+
+   File format: b"I2CSPY2\\n", then per transaction the record header
+   <d (host time) B (address byte with R/W bit) B (flags) i (NAK index) H (length)
+   followed by length data bytes.
+"""
+
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+from ctypes import *
+
+from event_log import eventLog
+
+I2cSpyTransaction = namedtuple("I2cSpyTransaction", ["Time", "Address", "Read", "Data", "Nak", "Restart"])
+
+MAGIC = b"I2CSPY2\n"
+_RECORD = struct.Struct("<dBBiH")
+_RESTART = 0x01
+
+
+def _table(values, bits):
+    """256 entry lookup: 1 where the byte passes the filter, None allows everything"""
+    if values is None:
+        return None
+    table = bytearray(256)
+    for value in values:
+        table[(value << bits) & 0xFF if bits else value] = 1
+        if bits:
+            table[((value << bits) | 1) & 0xFF] = 1
+    return bytes(table)
+
+
+class I2CSpy():
+    """
+    i2c: analog_discovery_3.I2C with SCL/SDA configured
+    addresses: 7-bit addresses to keep, None keeps all
+    registers: first written byte (register) to keep for write transactions, None keeps all
+    path: append transactions to this file instead of the queue
+    queue_size: bound of the transaction queue
+    """
+    def __init__(self, i2c, addresses=None, registers=None, path=None, queue_size=65536, poll_interval=0.0005, chunk=4096):
+        self._i2c = i2c
+        self._addressTable = _table(addresses, 1)
+        self._registerTable = _table(registers, 0)
+        self._path = path
+        self._file = None
+        self._pollInterval = poll_interval
+        self._chunk = chunk
+
+        self.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.Transactions = 0
+        self.Filtered = 0
+        self.Dropped = 0
+        self.Bytes = 0
+
+    #region Lifecycle
+    def start(self):
+        if self._thread is not None:
+            return self
+
+        if self._path is not None:
+            self._file = open(self._path, "ab", buffering=1 << 20)
+            if self._file.tell() == 0:
+                self._file.write(MAGIC)
+            else:
+                # only append to a spy file of this format, anything else would be unreadable afterwards
+                with open(self._path, "rb") as f:
+                    header = f.read(len(MAGIC))
+                if header != MAGIC:
+                    self._file.close()
+                    self._file = None
+                    raise ValueError(f"{self._path} is not an I2C spy file of this version")
+
+        self._stop.clear()
+        ad3 = self._i2c._ad3
+        with ad3.Locks["I2C"]:
+            type(ad3)._dwf.FDwfDigitalI2cSpyStart(ad3._hdwf)
+
+        self._thread = threading.Thread(target=self._run, name="I2CSpy", daemon=True)
+        self._thread.start()
+        eventLog.info("I2C spy started")
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        eventLog.info("I2C spy stopped: %d transactions, %d filtered, %d dropped", self.Transactions, self.Filtered, self.Dropped)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        return {"transactions": self.Transactions, "filtered": self.Filtered, "dropped": self.Dropped,
+                "bytes": self.Bytes, "queued": self.Queue.qsize()}
+    #endregion
+
+    def _run(self):
+        ad3 = self._i2c._ad3
+        dwf = type(ad3)._dwf
+        hdwf = ad3._hdwf
+        lock = ad3.Locks["I2C"]
+
+        fStart = c_int()
+        fStop = c_int()
+        cData = c_int()
+        iNak = c_int()
+        rgData = (c_int * self._chunk)()
+        pStart = byref(fStart)
+        pStop = byref(fStop)
+        pData = byref(cData)
+        pNak = byref(iNak)
+        # the low byte of every little-endian int, without a Python loop
+        lowBytes = memoryview(rgData).cast("B")
+
+        addressTable = self._addressTable
+        current = bytearray()
+        active = False
+        skip = False
+        restart = False
+        nak = 0
+        tStart = 0.0
+
+        while not self._stop.is_set():
+            cData.value = self._chunk
+            try:
+                with lock:
+                    dwf.FDwfDigitalI2cSpyStatus(hdwf, pStart, pStop, rgData, pData, pNak)
+            except Exception as e:
+                eventLog.error("I2C spy status failed: %s", e)
+                break
+
+            n = cData.value
+            if fStart.value:
+                # a repeated start ends the previous segment; the read after a filtered register write is dropped too
+                skipPrevious = skip
+                if active and not skip and current:
+                    skipPrevious = not self._finish(tStart, current, nak, restart)
+                restart = fStart.value == 2
+                current = bytearray()
+                skip = restart and active and skipPrevious
+                active = True
+                nak = 0
+                tStart = time.time()
+
+            if n and active and not skip:
+                if not current and addressTable is not None and not addressTable[lowBytes[0]]:
+                    skip = True
+                    self.Filtered += 1
+                else:
+                    current += lowBytes[0:4 * n:4].tobytes()
+                    if iNak.value and not nak:
+                        nak = iNak.value
+
+            if fStop.value and active:
+                active = False
+                if not skip and current:
+                    self._finish(tStart, current, nak, restart)
+
+            if not n and not fStart.value and not fStop.value:
+                time.sleep(self._pollInterval)
+
+    def _finish(self, t, raw, nak, restart):
+        registerTable = self._registerTable
+        if registerTable is not None and not raw[0] & 1 and (len(raw) < 2 or not registerTable[raw[1]]):
+            self.Filtered += 1
+            return False
+
+        self._emit(t, raw, nak, restart)
+        return True
+
+    def _emit(self, t, raw, nak, restart):
+        self.Transactions += 1
+        self.Bytes += len(raw)
+
+        if self._file is not None:
+            try:
+                header = _RECORD.pack(t, raw[0], _RESTART if restart else 0, nak, min(len(raw) - 1, 0xFFFF))
+            except struct.error as e:
+                # a bad record is dropped, the capture goes on
+                eventLog.error("I2C spy: transaction not recorded: %s", e)
+                self.Dropped += 1
+                return
+            self._file.write(header)
+            self._file.write(memoryview(raw)[1:0x10000])
+            return
+
+        try:
+            self.Queue.put_nowait(I2cSpyTransaction(t, raw[0] >> 1, bool(raw[0] & 1), bytes(raw[1:]), nak, restart))
+        except queue.Full:
+            self.Dropped += 1
+
+
+def read_spy_file(path):
+    """Yield the I2cSpyTransaction records of a spy file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an I2C spy file")
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            t, address, flags, nak, length = _RECORD.unpack(header)
+            yield I2cSpyTransaction(t, address >> 1, bool(address & 1), f.read(length), nak, bool(flags & _RESTART))
@@ -0,0 +1,197 @@
+"""
+   Synchronized mixed-signal capture with an Analog Discovery 3 and a Digital Discovery.
+
+   One instrument (the leader) triggers on its own detector and drives the
+   event onto one of its trigger pins; the other (the follower) triggers on
+   the matching trigsrcExternal* line. Both captures then share the trigger
+   instant as time zero, and the sample times of either instrument follow from
+   its sample rate and trigger position. Wire the leader's trigger pin to the
+   follower's trigger input (T1 to T1 by default).
+
+   Both status loops run at the same time: the Digital Discovery record loop on
+   a worker thread, the scope on the calling thread.
+
+       ad3.AI.configure_scope_single(-1, 10e6, n_samples=8192)
+       ad3.AI.configure_trigger(level=1.0, position=0.0)
+       capture = MixedSignalCapture(ad3, dd, leader="analog")
+       data = capture.capture(100e6, 100_000, dd_prefill=50_000)
+       data.digital_at(data.analog_time(4096))
+"""
+
+import threading
+import time
+from ctypes import *
+
+import dwf_enums as dwfe
+from event_log import eventLog
+
+
+class MixedSignalData():
+    """
+    Time-aligned result of a MixedSignalCapture. Time 0 is the shared trigger.
+
+    Analog: list of c_double arrays, one per captured channel
+    Digital: Digital Discovery samples, bit 0 is DIO24
+    """
+    def __init__(self, analog, analog_rate, analog_start, digital, digital_rate, digital_start):
+        self.Analog = analog
+        self.AnalogRate = analog_rate
+        self.AnalogStart = analog_start      # time of the first analog sample, seconds
+        self.Digital = digital
+        self.DigitalRate = digital_rate
+        self.DigitalStart = digital_start    # time of the first digital sample, seconds
+
+    def analog_time(self, index) -> float:
+        return self.AnalogStart + index / self.AnalogRate
+
+    def digital_time(self, index) -> float:
+        return self.DigitalStart + index / self.DigitalRate
+
+    def analog_index(self, t) -> int:
+        """Analog sample at time t, None when outside the capture."""
+        index = round((t - self.AnalogStart) * self.AnalogRate)
+        return index if 0 <= index < len(self.Analog[0]) else None
+
+    def digital_index(self, t) -> int:
+        """Digital sample at time t, None when outside the capture."""
+        index = round((t - self.DigitalStart) * self.DigitalRate)
+        return index if 0 <= index < len(self.Digital) else None
+
+    def digital_at(self, t) -> int:
+        index = self.digital_index(t)
+        return None if index is None else self.Digital[index]
+
+    def pin(self, pin, t) -> int:
+        """Level of Digital Discovery pin (24-39) at time t."""
+        value = self.digital_at(t)
+        return None if value is None else (value >> (pin - 24)) & 1
+
+    def overlap(self) -> tuple:
+        """(start, end) in seconds of the window covered by both captures."""
+        start = max(self.AnalogStart, self.DigitalStart)
+        end = min(self.analog_time(len(self.Analog[0])), self.digital_time(len(self.Digital)))
+        return start, end
+
+
+class MixedSignalCapture():
+    """
+    leader: "analog" - configure the scope trigger with AI.configure_trigger, the Digital Discovery follows
+            "digital" - configure the Digital In trigger with DigitalDiscovery.configure_trigger, the scope follows
+    trigger_pin: leader trigger pin driven with the event (0 = T1)
+    trigger_line: follower trigger source wired to that pin
+    follower_delay: seconds the follower triggers after the leader (cabling/propagation), used for alignment
+    """
+    def __init__(self, ad3, dd, leader="analog", trigger_pin=0, trigger_line=dwfe.trigsrcExternal1, follower_delay=0.0):
+        if leader not in ("analog", "digital"):
+            raise ValueError(f"Unknown leader: {leader}")
+
+        self._ad3 = ad3
+        self._dd = dd
+        self.Leader = leader
+        self.TriggerPin = trigger_pin
+        self.TriggerLine = trigger_line
+        self.FollowerDelay = follower_delay
+
+    def _route_trigger(self):
+        ad3 = self._ad3
+        dd = self._dd
+
+        if self.Leader == "analog":
+            ad3.set_trigger_pin(self.TriggerPin, dwfe.trigsrcAnalogIn)
+            dd.configure_trigger(source=self.TriggerLine)
+        else:
+            dd.set_trigger_pin(self.TriggerPin, dwfe.trigsrcDigitalIn)
+            # keep the scope's position, holdoff and timeout, only switch the source
+            with ad3.Locks["AnalogIn"]:
+                type(ad3)._dwf.FDwfAnalogInTriggerSourceSet(ad3._hdwf, getattr(self.TriggerLine, "value", self.TriggerLine))
+
+    def _wait_scope_armed(self, timeout):
+        dwf = type(self._ad3)._dwf
+        sts = c_ubyte()
+        armed = dwfe.DwfStateArmed
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            with self._ad3.Locks["AnalogIn"]:
+                dwf.FDwfAnalogInStatus(self._ad3._hdwf, 0, byref(sts))
+            if sts.value == armed:
+                return True
+            time.sleep(0.001)
+
+        return False
+
+    def capture(self, dd_sample_rate, dd_samples, dd_prefill=0, channels=(0, 1), poll_interval=0.001,
+                arm_timeout=5.0, dd_sample_format=16) -> MixedSignalData:
+        """
+        Arm both instruments and capture one triggered event.
+
+        channels: scope channels to read, the scope must be configured for them
+        poll_interval: scope status poll interval in seconds
+        """
+        ad3 = self._ad3
+        ai = ad3.AI
+        dd = self._dd
+        ddArmed = threading.Event()
+        ddResult = {}
+
+        self._route_trigger()
+
+        def on_status(available, lost, corrupted):
+            ddArmed.set()
+            return True
+
+        def record():
+            try:
+                ddResult["samples"] = dd.configureDI_and_DAQ(dd_sample_rate, dd_samples, sample_format=dd_sample_format,
+                                                            on_status=on_status, prefill=dd_prefill)
+            except Exception as e:
+                ddResult["error"] = e
+            finally:
+                ddArmed.set()
+
+        ddThread = threading.Thread(target=record, name="MixedSignalDD", daemon=True)
+
+        # the follower has to be armed before the leader can trigger
+        if self.Leader == "analog":
+            ddThread.start()
+            if not ddArmed.wait(arm_timeout):
+                raise TimeoutError("Digital Discovery did not arm")
+            if "error" in ddResult:
+                raise ddResult["error"]
+            # the record buffer fills its prefill before it accepts the trigger
+            time.sleep(dd_prefill / dd_sample_rate)
+            ai.start_scope()
+        else:
+            ai.start_scope()
+            if not self._wait_scope_armed(arm_timeout):
+                ai.stop_scope()
+                raise TimeoutError("Scope did not arm")
+            ddThread.start()
+
+        if len(channels) == 2:
+            analog = list(ai.read_single_scope_2ch(poll_interval=poll_interval))
+        else:
+            analog = [ai.read_single_scope_1ch(channels[0], poll_interval=poll_interval)]
+
+        ddThread.join()
+        if "error" in ddResult:
+            raise ddResult["error"]
+
+        analogRate = c_double()
+        type(ad3)._dwf.FDwfAnalogInFrequencyGet(ad3._hdwf, byref(analogRate))
+        n = len(analog[0])
+        analogStart = ai._triggerPosition - n / 2 / analogRate.value
+
+        status = dd.LastRecord
+        digitalStart = -dd_prefill / status.Rate
+
+        # time 0 is the leader's trigger
+        if self.Leader == "analog":
+            digitalStart += self.FollowerDelay
+        else:
+            analogStart += self.FollowerDelay
+
+        if status.Lost or status.Corrupted:
+            eventLog.warning("Mixed-signal capture: %d digital samples lost, %d corrupted", status.Lost, status.Corrupted)
+
+        return MixedSignalData(analog, analogRate.value, analogStart, ddResult["samples"], status.Rate, digitalStart)
@@ -0,0 +1,123 @@
+"""
+   Adaptive record rate for the Digital Discovery.
+
+   In record mode the device streams samples over USB while it captures; when
+   the requested rate is more than the link sustains, samples are lost and the
+   run is wasted. RecordRateController watches the lost/corrupted counters of
+   every status poll, stops the run as soon as samples go missing, and retries
+   with a narrower sample format (16 -> 8 bit, when allowed) or a lower rate
+   derived from the throughput actually measured before the loss.
+
+   The highest clean rate found for a device is stored per host and serial
+   number, so the next run starts there instead of probing again.
+
+       controller = RecordRateController(dd)
+       samples = controller.record(100e6, 1_000_000, allow_8bit=True)
+       print(dd.LastRecord)
+"""
+
+import json
+import os
+import socket
+import threading
+
+from event_log import eventLog
+
+DEFAULT_STORE = os.path.join(os.path.expanduser("~"), ".dwf_record_rates.json")
+
+
+class RecordRateController():
+    """
+    dd: opened DigitalDiscovery
+    store_path: JSON file with the maximum clean rate per host/serial, None disables persistence
+    backoff: fraction of the measured throughput to use for the retry
+    """
+    def __init__(self, dd, store_path=DEFAULT_STORE, backoff=0.8):
+        self._dd = dd
+        self._storePath = store_path
+        self._backoff = backoff
+        self._lock = threading.Lock()
+
+        self.Key = f"{socket.gethostname()}/{dd.SerialNumber}"
+
+    #region Persistence
+    def _load(self) -> dict:
+        if self._storePath is None or not os.path.exists(self._storePath):
+            return {}
+        try:
+            with open(self._storePath) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            eventLog.warning("Could not read record rate store %s: %s", self._storePath, e)
+            return {}
+
+    def max_rate(self, sample_format=16):
+        """Highest rate recorded without loss for this device and sample format, None if unknown."""
+        entry = self._load().get(self.Key, {})
+        return entry.get(str(sample_format))
+
+    def _save(self, sample_format, rate, clean):
+        if self._storePath is None:
+            return
+
+        with self._lock:
+            store = self._load()
+            entry = store.setdefault(self.Key, {})
+            known = entry.get(str(sample_format))
+            # a clean run raises the limit, a lossy run at or below it lowers it
+            if clean and (known is None or rate > known) or not clean and known is not None and rate <= known:
+                entry[str(sample_format)] = rate if clean else rate * self._backoff
+
+                tmp = self._storePath + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump(store, f, indent=2)
+                os.replace(tmp, self._storePath)
+    #endregion
+
+    def record(self, sample_rate, n_samples, sample_format=16, allow_8bit=False, max_attempts=5):
+        """
+        Record n_samples, lowering the rate or narrowing the format until a run completes without loss.
+
+        allow_8bit: DIO32:39 are not needed, so the 8 bit format may be used to halve the USB traffic
+        Returns the samples; dd.LastRecord holds the rate and format used.
+        """
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+
+        rate = sample_rate
+        known = self.max_rate(sample_format)
+        if known is not None and rate > known:
+            eventLog.info("Starting at the known maximum record rate %g Hz instead of %g Hz", known, rate)
+            rate = known
+
+        for attempt in range(max_attempts):
+            transferred = [0]
+
+            def on_status(available, lost, corrupted):
+                transferred[0] += available
+                return not (lost or corrupted)
+
+            samples = self._dd.configureDI_and_DAQ(rate, n_samples, sample_format=sample_format, on_status=on_status)
+            status = self._dd.LastRecord
+            clean = not (status.Lost or status.Corrupted)
+            self._save(sample_format, status.Rate, clean)
+
+            if clean:
+                return samples
+
+            if allow_8bit and sample_format > 8:
+                eventLog.warning("Samples lost at %g Hz, %d bit; retrying with 8 bit samples", status.Rate, sample_format)
+                sample_format = 8
+                known = self.max_rate(sample_format)
+                if known is not None:
+                    rate = min(rate, known)
+                continue
+
+            # samples per second the link kept up with before the loss
+            sustained = transferred[0] / status.Duration if status.Duration > 0 else 0
+            rate = min(status.Rate, sustained) * self._backoff if sustained else status.Rate * self._backoff
+            eventLog.warning("Samples lost at %g Hz (sustained %g samples/s); retrying at %g Hz",
+                             status.Rate, sustained, rate)
+
+        eventLog.error("No clean record after %d attempts, last rate %g Hz", max_attempts, status.Rate)
+        return samples
@@ -0,0 +1,60 @@
+import os
+import sys
+import threading
+from ctypes import CFUNCTYPE, c_char_p, c_int, c_void_p, cast
+
+import pytest
+
+# the modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dwf_prototypes
+from base_digilent import BaseDigilentDevice
+
+
+class StubDwf():
+    """
+    Stand-in for libdwf built from ctypes callbacks, so calls go through the real prototypes.
+
+    impl: {name: func(*args)} for the functions a test drives, every other function returns TRUE.
+    Calls counts the calls per function.
+    """
+    def __init__(self, impl=None):
+        self.Calls = {}
+        self._impl = dict(impl or {})
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+        for name, argtypes in dwf_prototypes.PROTOTYPES.items():
+            # strings are written by the library, a c_char_p callback argument would be an immutable copy
+            argtypes = [c_void_p if argtype is c_char_p else argtype for argtype in argtypes]
+            callback = CFUNCTYPE(c_int, *argtypes)(self._dispatch(name))
+            func = CFUNCTYPE(c_int)(cast(callback, c_void_p).value)
+            func.__name__ = name
+            self._callbacks.append(callback)
+            setattr(self, name, func)
+
+    def _dispatch(self, name):
+        def call(*args):
+            with self._lock:
+                self.Calls[name] = self.Calls.get(name, 0) + 1
+            impl = self._impl.get(name)
+            result = None if impl is None else impl(*args)
+            return 1 if result is None else result
+        return call
+
+    def set(self, name, impl):
+        self._impl[name] = impl
+
+
+@pytest.fixture
+def stub_dwf():
+    """Install a StubDwf as the library of every device class, restored after the test."""
+    saved = vars(BaseDigilentDevice)["_dwf"], BaseDigilentDevice._lib, BaseDigilentDevice.LibraryLoaded
+
+    lib = dwf_prototypes.apply_prototypes(StubDwf())
+    BaseDigilentDevice._dwf = BaseDigilentDevice._lib = lib
+    BaseDigilentDevice.LibraryLoaded = True
+    yield lib
+
+    BaseDigilentDevice._dwf, BaseDigilentDevice._lib, BaseDigilentDevice.LibraryLoaded = saved
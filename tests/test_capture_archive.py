@@ -0,0 +1,60 @@
+import time
+from ctypes import c_double, c_uint16
+
+import pytest
+
+from capture_archive import ArchiveReader, CaptureArchive, _TRAILER
+
+
+def _drop_index(path):
+    """Cut the index and trailer off a closed archive, as if the writer had stopped before close()"""
+    with open(path, "r+b") as f:
+        f.seek(-_TRAILER.size, 2)
+        indexOffset, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        f.truncate(indexOffset)
+
+
+def test_read_back(tmp_path):
+    path = str(tmp_path / "run.dwfcap")
+    samples = (c_uint16 * 100)(*range(100))
+    with CaptureArchive(path, chunk_samples=16) as archive:
+        stream = archive.begin_capture({"rate": 1000.0, "start": 0.0})
+        archive.append(stream, samples, 60)
+        archive.append(stream, memoryview(samples)[60:])
+
+    with ArchiveReader(path) as reader:
+        assert reader.samples(stream) == 100
+        assert list(reader.read(stream)) == list(range(100))
+        assert list(reader.read(stream, 30, 50)) == list(range(30, 50))
+        assert list(reader.read_time(stream, 0.010, 0.013)) == [10, 11, 12]
+
+
+@pytest.mark.parametrize("delay", [0.0, 0.1])
+def test_recover_without_index(tmp_path, delay):
+    path = str(tmp_path / "run.dwfcap")
+    samples = (c_double * 10)(*[i / 4 for i in range(10)])
+    archive = CaptureArchive(path, chunk_samples=4)
+    stream = archive.begin_capture({"rate": 1e6})
+    # give the writer time to write the first metadata record before the format is known
+    time.sleep(delay)
+    archive.append(stream, samples)
+    archive.close()
+    _drop_index(path)
+
+    with ArchiveReader(path) as reader:
+        assert reader._captures[stream]["format"] == "d"
+        assert reader.metadata(stream) == {"rate": 1e6}
+        assert reader.samples(stream) == 10
+        assert list(reader.read(stream)) == list(samples)
+
+
+def test_recover_without_metadata(tmp_path):
+    path = str(tmp_path / "run.dwfcap")
+    archive = CaptureArchive(path, chunk_samples=4)
+    stream = archive.begin_capture()
+    archive.append(stream, (c_uint16 * 6)(1, 2, 3, 4, 5, 6))
+    archive.close()
+    _drop_index(path)
+
+    with ArchiveReader(path) as reader:
+        assert list(reader.read(stream)) == [1, 2, 3, 4, 5, 6]
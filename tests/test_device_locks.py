@@ -0,0 +1,83 @@
+import threading
+import time
+from ctypes import c_int
+
+from analog_discovery_3 import AnalogDiscovery3
+from device_locks import DeviceLocks, TimedLock
+
+
+def test_contention_is_counted():
+    lock = TimedLock("AnalogIn")
+    held = threading.Event()
+
+    def hold():
+        with lock:
+            held.set()
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    with lock:
+        pass
+    thread.join()
+
+    stats = lock.stats()
+    assert stats["acquisitions"] == 2
+    assert stats["contended"] == 1
+    assert stats["wait_time"] > 0.01
+
+
+def test_released_gives_up_every_level():
+    lock = TimedLock("UART")
+    taken = threading.Event()
+
+    def take():
+        with lock:
+            taken.set()
+
+    with lock:
+        with lock:
+            thread = threading.Thread(target=take)
+            thread.start()
+            with lock.released():
+                thread.join(2)
+            assert taken.is_set()
+            assert lock._depth == 2
+        assert lock._depth == 1
+    assert lock._depth == 0
+
+
+def test_all_takes_every_lock():
+    locks = DeviceLocks()
+    with locks.all():
+        assert all(locks[name]._depth == 1 for name in ("AnalogIn", "I2C", "UART"))
+    assert locks["AnalogIn"]._depth == 0
+
+
+def test_subsystem_calls_are_not_interleaved(stub_dwf):
+    ad3 = AnalogDiscovery3()
+    ad3._hdwf = c_int(1)
+    calls = []
+
+    def record(name):
+        def call(*args):
+            calls.append((threading.get_ident(), name))
+            time.sleep(0.001)
+        return call
+
+    for name in ("FDwfAnalogInFrequencySet", "FDwfAnalogInBufferSizeSet", "FDwfAnalogInChannelEnableSet",
+                 "FDwfAnalogInChannelRangeSet", "FDwfAnalogInChannelFilterSet"):
+        stub_dwf.set(name, record(name))
+
+    threads = [threading.Thread(target=ad3.AI.configure_scope_single, args=(0, 1e6)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # each configure_scope_single is five calls in a row from one thread
+    assert len(calls) == 20
+    for start in range(0, 20, 5):
+        assert len({ident for ident, name in calls[start:start + 5]}) == 1
+    assert ad3.Locks["AnalogIn"].stats()["acquisitions"] == 4
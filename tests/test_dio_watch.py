@@ -0,0 +1,95 @@
+import threading
+import time
+from ctypes import c_int
+
+import pytest
+
+from digital_discovery import DigitalDiscovery
+
+
+@pytest.fixture
+def dd(stub_dwf):
+    device = DigitalDiscovery()
+    device._hdwf = c_int(1)
+    return device
+
+
+@pytest.fixture
+def pins(stub_dwf):
+    """Input word returned by FDwfDigitalIOInputStatus, bit 0 is DIO-24"""
+    word = {"value": 0}
+
+    def input_status(hdwf, pWord):
+        pWord[0] = word["value"]
+    stub_dwf.set("FDwfDigitalIOInputStatus", input_status)
+    return word
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+def test_changes_of_watched_pins(dd, pins):
+    changes = []
+    watch = dd.watch_dio(pins=[24, 29], on_change=changes.append)
+    try:
+        pins["value"] = 0b1
+        assert _wait(lambda: len(changes) == 1)
+        pins["value"] = 0b100001 | 0b10     # DIO-25 is not watched
+        assert _wait(lambda: len(changes) == 2)
+        pins["value"] = 0b100000
+        assert _wait(lambda: len(changes) == 3)
+    finally:
+        watch.stop()
+
+    assert [(change.Changed, change.Rising, change.Falling) for change in changes] == [
+        (0b1, 0b1, 0), (0b100000, 0b100000, 0), (0b1, 0, 0b1)]
+    assert watch.Value == 0b100000
+
+
+def test_short_pulse_is_a_bounce(dd, pins):
+    changes = []
+    watch = dd.watch_dio(pins=[24], debounce={24: 0.05}, on_change=changes.append)
+    try:
+        pins["value"] = 1
+        time.sleep(0.01)
+        pins["value"] = 0
+        assert _wait(lambda: watch.Bounces == 1)
+        pins["value"] = 1
+        assert _wait(lambda: len(changes) == 1)
+    finally:
+        watch.stop()
+
+    assert changes[0].Rising == 1
+
+
+def test_invalid_pin_is_rejected(dd):
+    assert dd.watch_dio(pins=[5]) is None
+    assert dd.watch_dio(pins=[24], debounce={40: 0.01}) is None
+
+
+def test_status_failure_stops_the_watch(dd, pins, stub_dwf):
+    errors = []
+    failing = threading.Event()
+
+    def status(hdwf):
+        return 0 if failing.is_set() else 1
+    stub_dwf.set("FDwfDigitalIOStatus", status)
+
+    watch = dd.watch_dio(pins=[24], on_error=errors.append)
+    assert watch.Running
+    failing.set()
+    assert _wait(lambda: not watch.Running)
+
+    assert watch.Error is not None
+    assert errors == [watch.Error]
+    watch.stop()
+
+    failing.clear()
+    watch.start()
+    assert watch.Running and watch.Error is None
+    watch.stop()
+    assert not watch.Running
@@ -0,0 +1,126 @@
+import threading
+import time
+from ctypes import POINTER, c_int, memmove, string_at
+
+import pytest
+
+from analog_discovery_3 import AnalogDiscovery3
+
+
+@pytest.fixture
+def ad3(stub_dwf):
+    device = AnalogDiscovery3()
+    device._hdwf = c_int(1)
+    return device
+
+
+def _uart_rx(*replies):
+    """FDwfDigitalUartRx answering each poll with the next reply, then nothing"""
+    replies = list(replies)
+
+    def rx(hdwf, buffer, size, pCount, pParity):
+        data = replies.pop(0) if replies and size else b""
+        memmove(buffer, data, len(data))
+        pCount[0] = len(data)
+        pParity[0] = 0
+    return rx
+
+
+def test_spi_flush_frames_each_transaction(ad3, stub_dwf):
+    calls = []
+    stub_dwf.set("FDwfDigitalSpiSelect", lambda hdwf, pin, level: calls.append(("CS", level)))
+
+    def write_read(hdwf, dq, bits, tx, nTx, rx, nRx):
+        data = string_at(tx, nTx)
+        calls.append(("WR", data))
+        memmove(rx, bytes(0xFF - byte for byte in data), nRx)
+    stub_dwf.set("FDwfDigitalSpiWriteRead", write_read)
+
+    ad3.SPI.Configure(0, 1, 2, 3, 1e6)
+    calls.clear()
+    assert ad3.SPI.Queue(b"\x9f", 2) == 0
+    assert ad3.SPI.Queue(b"\x05", 1) == 1
+    results = ad3.SPI.Flush()
+
+    assert [bytes(result) for result in results] == [b"\xff\xff", b"\xff"]
+    assert calls == [("CS", 0), ("WR", b"\x9f\x00\x00"), ("CS", 1), ("CS", 0), ("WR", b"\x05\x00"), ("CS", 1)]
+    assert ad3.SPI.Flush() == []
+
+
+def test_spi_queue_from_threads_loses_nothing(ad3, stub_dwf):
+    ad3.SPI.Configure(0, 1, 2, 3, 1e6)
+    flushed = []
+    done = threading.Event()
+
+    def queue(n):
+        for i in range(n):
+            ad3.SPI.Queue(b"\x01", 1)
+
+    def flush():
+        while not done.is_set():
+            flushed.extend(ad3.SPI.Flush())
+        flushed.extend(ad3.SPI.Flush())
+
+    flusher = threading.Thread(target=flush)
+    flusher.start()
+    threads = [threading.Thread(target=queue, args=(500,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    flusher.join()
+
+    assert len(flushed) == 2000
+    assert stub_dwf.Calls["FDwfDigitalSpiWriteRead"] == 2000
+
+
+def test_uart_stream_delivers_chunks(ad3, stub_dwf):
+    stub_dwf.set("FDwfDigitalUartRx", _uart_rx(b"hello ", b"world"))
+    ad3.UART.Configure(4, 5, 115200)
+    received = bytearray()
+
+    ad3.UART.StartStream(received.extend)
+    deadline = time.monotonic() + 2
+    while len(received) < 11 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    ad3.UART.StopStream()
+
+    assert bytes(received) == b"hello world"
+
+
+@pytest.mark.parametrize("method", ["Configure", "Reset"])
+def test_uart_configure_stops_a_running_stream(ad3, stub_dwf, method):
+    def rx(hdwf, buffer, size, pCount, pParity):
+        # slow poll with data, so the stream thread is usually waiting for the UART lock
+        time.sleep(0.001)
+        pCount[0] = 1 if size else 0
+        pParity[0] = 0
+    stub_dwf.set("FDwfDigitalUartRx", rx)
+    ad3.UART.Configure(4, 5, 9600)
+
+    for _ in range(10):
+        ad3.UART.StartStream(lambda chunk: None, poll_interval=0)
+        time.sleep(0.005)
+        args = (4, 5, 9600) if method == "Configure" else ()
+        thread = threading.Thread(target=getattr(ad3.UART, method), args=args, daemon=True)
+        thread.start()
+        thread.join(2)
+        assert not thread.is_alive(), f"UART.{method} deadlocked with the stream thread"
+        assert ad3.UART._streamThread is None
+
+    assert ad3.Locks["UART"]._depth == 0
+
+
+def test_uart_stream_stopped_from_its_callback(ad3, stub_dwf):
+    stub_dwf.set("FDwfDigitalUartRx", _uart_rx(b"x", b"y"))
+    ad3.UART.Configure(4, 5, 9600)
+    stopped = threading.Event()
+
+    def on_data(chunk):
+        ad3.UART.StopStream()
+        stopped.set()
+
+    ad3.UART.StartStream(on_data)
+    assert stopped.wait(2)
+    assert ad3.UART._streamThread is None